@@ -1,25 +1,55 @@
+import logging
+import os
 from flask import Flask
-from flask_sqlalchemy import SQLAlchemy
 from flask_jwt_extended import JWTManager
 from flask_migrate import Migrate
+from app.config import profiles
+from app.database import Database
 
-db = SQLAlchemy()
+db = Database()
 jwt = JWTManager()
 migrate = Migrate()
 
+logger = logging.getLogger(__name__)
 
-def create_app():
+
+def create_app(config_name=None, overrides=None):
     app = Flask(__name__)
 
-    # Load the app configuration
-    app.config.from_object('app.config.Config')
+    # Load the app configuration; APP_CONFIG picks the profile
+    app.config.from_object(profiles[config_name or os.environ.get('APP_CONFIG', 'development')])
+    # Per-instance settings (e.g. a benchmark's database), applied before any extension reads them
+    if overrides:
+        app.config.update(overrides)
+
+    # Logging first, so extension setup is captured too
+    from services.logs import structured_logging
+    structured_logging.init_app(app)
+
+    # jsonify() goes through orjson when it is installed
+    from services.serialization import FastJSONEncoder
+    app.json_encoder = FastJSONEncoder
 
     # Initialize extensions
     db.init_app(app)
     jwt.init_app(app)
-    migrate.init_app(app, db)
+    # SQLite can't ALTER constraints in place; batch mode rebuilds the table instead
+    migrate.init_app(app, db, render_as_batch=True)
+
+    from services.cache import product_cache
+    from services.payments import payment_pipeline
+    from services.passwords import password_hasher
+    from services.cart_store import cart_store
+    from services.metrics import metrics
+    from services.query_inspector import query_inspector
+    product_cache.init_app(app)
+    payment_pipeline.init_app(app)
+    password_hasher.init_app(app)
+    cart_store.init_app(app)
+    metrics.init_app(app)
+    query_inspector.init_app(app)
 
-    print("JWT Manager initialized")  # Debug print
+    logger.debug('Extensions initialized')
 
     # Register blueprints
     from resources.auth import bp as auth_bp
@@ -27,11 +57,13 @@ def create_app():
     from resources.cart import bp as cart_bp
     from resources.order import bp as order_bp
     from resources.admin import bp as admin_bp
+    from resources.payment import bp as payment_bp
 
     app.register_blueprint(auth_bp)
     app.register_blueprint(product_bp)
     app.register_blueprint(cart_bp)
     app.register_blueprint(order_bp)
     app.register_blueprint(admin_bp)
+    app.register_blueprint(payment_bp)
 
     return app
@@ -1,7 +1,85 @@
+import os
+
+
+def _env(name, default, cast=str):
+    """Read a setting from the environment, falling back to `default`"""
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    if cast is bool:
+        return value.lower() in ('1', 'true', 'yes', 'on')
+    return cast(value)
+
+
 class Config:
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///ecommerce.db'
+    SQLALCHEMY_DATABASE_URI = _env('DATABASE_URL', 'sqlite:///ecommerce.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    SECRET_KEY = 'your_secret_key_here'
-    JWT_SECRET_KEY = 'your_jwt_secret_key_here'
+    SECRET_KEY = _env('SECRET_KEY', 'your_secret_key_here')
+    JWT_SECRET_KEY = _env('JWT_SECRET_KEY', 'your_jwt_secret_key_here')
     JWT_ACCESS_TOKEN_EXPIRES = False  # Add this for testing (tokens won't expire)
+    DB_POOL_SIZE = _env('DB_POOL_SIZE', 5, int)  # Connections kept open per process
+    DB_MAX_OVERFLOW = _env('DB_MAX_OVERFLOW', 10, int)  # Extra connections allowed under load
+    DB_POOL_TIMEOUT = _env('DB_POOL_TIMEOUT', 30, int)  # Seconds to wait for a free connection
+    DB_POOL_RECYCLE = _env('DB_POOL_RECYCLE', 1800, int)  # Seconds before a connection is replaced
+    DB_POOL_PRE_PING = _env('DB_POOL_PRE_PING', True, bool)  # Check connections before handing them out
+    SQLITE_JOURNAL_MODE = _env('SQLITE_JOURNAL_MODE', 'WAL')  # WAL lets readers run alongside a writer
+    SQLITE_SYNCHRONOUS = _env('SQLITE_SYNCHRONOUS', 'NORMAL')  # Safe with WAL; FULL syncs every commit
+    SQLITE_MMAP_SIZE = _env('SQLITE_MMAP_SIZE', 256 * 1024 * 1024, int)  # Bytes of the file read through mmap
+    SQLITE_BUSY_TIMEOUT = _env('SQLITE_BUSY_TIMEOUT', 5000, int)  # Milliseconds to wait on a locked database
+    ADMIN_STATUS_TTL = 60  # Seconds before an admin token's role is re-checked against the database
+    PASSWORD_HASH_METHOD = 'pbkdf2:sha256'
+    PASSWORD_HASH_ITERATIONS = 260000  # Changing the method or cost rehashes each password at its next login
+    PASSWORD_HASH_WORKERS = _env('PASSWORD_HASH_WORKERS', 2, int)  # Processes computing password hashes; 0 hashes inline
+    PASSWORD_HASH_MAX_PENDING = 64  # Hashes queued or running before new logins wait
+    PASSWORD_HASH_QUEUE_TIMEOUT = 5  # Seconds a login waits for a slot before getting a 503
+    FACET_CACHE_TTL = 60  # Seconds before category counts are recomputed
+    PRODUCT_CACHE_ENABLED = True
+    PRODUCT_CACHE_SIZE = 1024  # Entries kept for single products and for listings
+    PRODUCT_CACHE_TTL = 300  # Seconds before a cached response is rebuilt
+    STOCK_RESERVATIONS_ENABLED = _env('STOCK_RESERVATIONS_ENABLED', False, bool)  # Hold stock from add-to-cart until checkout
+    STOCK_RESERVATION_TTL = 900  # Seconds before an unpurchased reservation is released
+    CART_BACKEND = _env('CART_BACKEND', 'sql')  # 'sql' (cart_item rows) or 'memory' (Redis hashes)
+    CART_REDIS_URL = _env('CART_REDIS_URL', None)  # Redis for the memory backend; unset keeps carts in-process
+    CART_TTL = _env('CART_TTL', 7 * 24 * 3600, int)  # Seconds a memory-backed cart lives after its last change
+    CART_WRITE_BEHIND_INTERVAL = _env('CART_WRITE_BEHIND_INTERVAL', 0, float)  # Seconds between copies of changed carts to the database; 0 disables
+    PAYMENT_PROVIDER = _env('PAYMENT_PROVIDER', 'fake')  # 'stripe', or 'fake' for offline and load testing
+    STRIPE_WEBHOOK_SECRET = _env('STRIPE_WEBHOOK_SECRET', None)  # Required with the Stripe provider; webhooks are verified against it
+    PAYMENT_CURRENCY = 'eur'
+    PAYMENT_WORKERS = _env('PAYMENT_WORKERS', 4, int)  # Background threads creating payment intents
+    PAYMENT_TIMEOUT = 10  # Seconds per provider call
+    PAYMENT_MAX_RETRIES = 3
+    PAYMENT_RETRY_BACKOFF = 0.5  # Seconds, doubled after each failed attempt
+    PAYMENT_FAKE_LATENCY = 0.0  # Simulated provider latency for the fake provider
+    PAYMENT_FAKE_FAILURE_RATE = 0.0  # Fraction of fake provider calls that fail
+    LOG_LEVEL = _env('LOG_LEVEL', 'INFO')
+    LOG_FORMAT = _env('LOG_FORMAT', 'json')  # 'json' (one object per line) or 'text' for a terminal
+    LOG_DEBUG_SAMPLE_RATE = _env('LOG_DEBUG_SAMPLE_RATE', 0.01, float)  # Fraction of requests whose DEBUG records are kept
+    LOG_QUEUE_SIZE = 10000  # Records waiting for the writer thread before new ones are dropped
+    METRICS_ENABLED = _env('METRICS_ENABLED', True, bool)  # Per-endpoint latency and SQL metrics
+    METRICS_PATH = '/metrics'  # Prometheus scrape endpoint; keep it off the public load balancer
+    METRICS_SERVER_TIMING = _env('METRICS_SERVER_TIMING', True, bool)  # Add app and db timings to every response
+    QUERY_INSPECTOR_ENABLED = _env('QUERY_INSPECTOR_ENABLED', None, bool)  # Log N+1 and slow queries; unset follows debug mode
+    QUERY_INSPECTOR_REPEAT_THRESHOLD = 5  # Runs of one statement in a request that count as an N+1
+    QUERY_INSPECTOR_SLOW_MS = 100  # Statements slower than this are logged with their plan
+
+
+class TestingConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = _env('DATABASE_URL', 'sqlite://')
+    PASSWORD_HASH_WORKERS = 0
+    PASSWORD_HASH_ITERATIONS = 1000  # Fast hashes; never use this profile with real accounts
+    PAYMENT_PROVIDER = 'fake'
+
+
+class ProductionConfig(Config):
+    PAYMENT_PROVIDER = _env('PAYMENT_PROVIDER', 'stripe')
+    DB_POOL_SIZE = _env('DB_POOL_SIZE', 10, int)
+    DB_MAX_OVERFLOW = _env('DB_MAX_OVERFLOW', 20, int)
+
 
+# Selected with the APP_CONFIG environment variable
+profiles = {
+    'development': Config,
+    'testing': TestingConfig,
+    'production': ProductionConfig
+}
@@ -0,0 +1,69 @@
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.pool import NullPool, QueuePool
+
+
+def _is_memory(url):
+    return url.database in (None, '', ':memory:')
+
+
+class Database(SQLAlchemy):
+    """
+    Flask-SQLAlchemy with engine settings taken from the DB_* and SQLITE_* config keys.
+
+    Options are applied when the engine is created, so they always match the URI
+    actually in use; SQLALCHEMY_ENGINE_OPTIONS still overrides any of them.
+    """
+
+    def apply_driver_hacks(self, app, sa_url, options):
+        sa_url, options = super().apply_driver_hacks(app, sa_url, options)
+        config = app.config
+
+        # In-memory SQLite lives in one connection that Flask-SQLAlchemy pins with
+        # a StaticPool, so pool sizing doesn't apply
+        if sa_url.get_backend_name() == 'sqlite' and _is_memory(sa_url):
+            return sa_url, options
+        # A pool class chosen in SQLALCHEMY_ENGINE_OPTIONS brings its own sizing
+        if 'poolclass' in (config.get('SQLALCHEMY_ENGINE_OPTIONS') or {}):
+            return sa_url, options
+
+        if sa_url.get_backend_name() == 'sqlite':
+            # Flask-SQLAlchemy would reopen the file (and re-run the PRAGMAs) for every
+            # request; pooled connections move between request threads, so pysqlite's
+            # same-thread check has to go
+            if options.get('poolclass') is NullPool:
+                options['poolclass'] = QueuePool
+            connect_args = options.setdefault('connect_args', {})
+            connect_args.setdefault('check_same_thread', False)
+
+        options.setdefault('pool_size', config['DB_POOL_SIZE'])
+        options.setdefault('max_overflow', config['DB_MAX_OVERFLOW'])
+        options.setdefault('pool_timeout', config['DB_POOL_TIMEOUT'])
+        options.setdefault('pool_recycle', config['DB_POOL_RECYCLE'])
+        options.setdefault('pool_pre_ping', config['DB_POOL_PRE_PING'])
+        return sa_url, options
+
+    def create_engine(self, sa_url, engine_opts):
+        engine = super().create_engine(sa_url, engine_opts)
+        if engine.dialect.name == 'sqlite':
+            _register_sqlite_pragmas(engine, self.get_app().config)
+        return engine
+
+
+def _register_sqlite_pragmas(engine, config):
+    """Apply the SQLITE_* settings to every new connection"""
+    pragmas = [
+        f"PRAGMA busy_timeout = {int(config['SQLITE_BUSY_TIMEOUT'])}",
+        f"PRAGMA synchronous = {config['SQLITE_SYNCHRONOUS']}",
+        f"PRAGMA mmap_size = {int(config['SQLITE_MMAP_SIZE'])}",
+    ]
+    if not _is_memory(engine.url):
+        # The journal mode is stored in the database file; in-memory databases can't use WAL
+        pragmas.insert(0, f"PRAGMA journal_mode = {config['SQLITE_JOURNAL_MODE']}")
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
@@ -0,0 +1,79 @@
+"""
+Compare two benchmarks.endpoints result files.
+
+Prints one JSON object per endpoint with the baseline and candidate figures and
+their relative change, and exits with status 1 if any endpoint regressed: p95
+latency or throughput worse by more than --threshold, or more SQL statements.
+
+    python -m benchmarks.compare baseline.json candidate.json --threshold 0.15
+"""
+import argparse
+import json
+import sys
+
+FIELDS = ('throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms', 'sql_mean')
+
+
+def _change(before, after):
+    if before in (None, 0) or after is None:
+        return None
+    return round((after - before) / before, 3)
+
+
+def compare(baseline, candidate, threshold):
+    """(rows, regressed endpoint names) for endpoints present in both runs"""
+    before = {result["endpoint"]: result for result in baseline["results"]}
+    rows = []
+    regressed = []
+    for result in candidate["results"]:
+        name = result["endpoint"]
+        if name not in before:
+            continue
+        row = {"endpoint": name}
+        for field in FIELDS:
+            row[field] = [before[name].get(field), result.get(field)]
+            row[f'{field}_change'] = _change(before[name].get(field), result.get(field))
+
+        reasons = []
+        if (row["p95_ms_change"] or 0) > threshold:
+            reasons.append('p95 latency')
+        if (row["throughput_rps_change"] or 0) < -threshold:
+            reasons.append('throughput')
+        if (result.get("sql_mean") or 0) > (before[name].get("sql_mean") or 0):
+            reasons.append('SQL statements')
+        if result.get("errors", 0) > before[name].get("errors", 0):
+            reasons.append('errors')
+        row["regressions"] = reasons
+        if reasons:
+            regressed.append(name)
+        rows.append(row)
+    return rows, regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    parser.add_argument('--threshold', type=float, default=0.15, help='Allowed relative slowdown')
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+    for run in (baseline, candidate):
+        if run.get("benchmark") != 'endpoints':
+            parser.error('both files must come from benchmarks.endpoints')
+    if (baseline.get("scale"), baseline.get("mode")) != (candidate.get("scale"), candidate.get("mode")):
+        print('warning: runs differ in scale or mode', file=sys.stderr)
+
+    rows, regressed = compare(baseline, candidate, args.threshold)
+    for row in rows:
+        print(json.dumps(row))
+    if regressed:
+        print(f'Regressed: {", ".join(regressed)}', file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
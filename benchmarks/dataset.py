@@ -0,0 +1,107 @@
+"""
+Seeded SQLite databases for the benchmarks, at a few fixed catalog sizes.
+
+Each scale is built once per seed and kept under the data directory; runs copy
+it so they always start from the same data. Building one ahead of time:
+
+    python -m benchmarks.dataset --scale 100k
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from app import create_app, db
+from services import analytics
+from services import search as search_index
+from services import seeding
+from services.seeding import WORDS
+
+SCALES = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+
+# Every seeded user logs in with this password
+PASSWORD = 'benchmark-password'
+
+# Part of the file name; bump it when the schema changes so older databases are rebuilt
+SCHEMA_VERSION = 2
+
+
+def default_data_dir():
+    return os.path.join(tempfile.gettempdir(), 'ecommerce-benchmarks')
+
+
+def sizes(products):
+    """Row counts for a catalog of `products`"""
+    users = max(100, products // 20)
+    return {
+        "products": products,
+        "users": users,
+        "carts": users // 5,
+        "orders": products // 2,
+    }
+
+
+def build(path, products, seed=42):
+    """Create a seeded database file at `path`; returns the row counts"""
+    counts = sizes(products)
+    app = create_app('production', {'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}', 'PAYMENT_PROVIDER': 'fake'})
+    with app.app_context():
+        db.create_all()
+        search_index.create_index()
+        seeding.seed(counts["users"], counts["products"], counts["carts"], counts["orders"],
+                     seed=seed, password=PASSWORD)
+        search_index.rebuild_index()
+        analytics.backfill()
+        db.session.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        db.session.remove()
+        db.engine.dispose()
+    return counts
+
+
+def ensure(scale, seed=42, data_dir=None):
+    """Path of the seeded database for a scale, building it first if needed"""
+    data_dir = data_dir or default_data_dir()
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, f'{scale}-seed{seed}-v{SCHEMA_VERSION}.db')
+    if not os.path.exists(path):
+        partial = path + '.building'
+        if os.path.exists(partial):
+            os.remove(partial)
+        build(partial, SCALES[scale], seed)
+        os.replace(partial, path)
+    return path
+
+
+def working_copy(path):
+    """A throwaway copy of a seeded database, so every run starts from the same data"""
+    copy = os.path.join(tempfile.mkdtemp(prefix='bench-run-'), os.path.basename(path))
+    shutil.copyfile(path, copy)
+    return copy
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scale', choices=list(SCALES), default='10k')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--data-dir', default=None)
+    parser.add_argument('--rebuild', action='store_true', help='Replace an existing database for this scale')
+    args = parser.parse_args()
+
+    data_dir = args.data_dir or default_data_dir()
+    path = os.path.join(data_dir, f'{args.scale}-seed{args.seed}.db')
+    if args.rebuild and os.path.exists(path):
+        os.remove(path)
+    started = time.perf_counter()
+    path = ensure(args.scale, args.seed, data_dir)
+    print(json.dumps({
+        "scale": args.scale,
+        "seed": args.seed,
+        "path": path,
+        "counts": sizes(SCALES[args.scale]),
+        "seconds": round(time.perf_counter() - started, 1)
+    }))
+
+
+if __name__ == '__main__':
+    main()
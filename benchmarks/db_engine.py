@@ -0,0 +1,153 @@
+"""
+Concurrent read/write throughput of the database engine settings.
+
+Runs reader threads (catalog page queries) alongside writer threads (single-row
+stock updates, one commit each) against a fresh SQLite file, once with SQLite's
+stock settings and no connection pool ("before") and once with the configured
+profile ("after"). Prints one JSON object per run.
+
+    python -m benchmarks.db_engine --seconds 10 --readers 8 --writers 2
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from sqlalchemy import bindparam
+from sqlalchemy.pool import NullPool
+from app import create_app, db
+from models.product import Product
+from benchmarks.stats import percentile
+
+# SQLite's defaults, and Flask-SQLAlchemy's unpooled file connections
+BEFORE = {
+    'SQLITE_JOURNAL_MODE': 'DELETE',
+    'SQLITE_SYNCHRONOUS': 'FULL',
+    'SQLITE_MMAP_SIZE': 0,
+    'SQLALCHEMY_ENGINE_OPTIONS': {'poolclass': NullPool}
+}
+
+CATEGORIES = ['books', 'electronics', 'garden', 'toys', 'tools', 'sports', 'music', 'food']
+
+products = Product.__table__
+_bump = products.update().where(products.c.id == bindparam('product_id')).values(stock=products.c.stock + 1)
+
+
+def _seed(count):
+    db.create_all()
+    rng = random.Random(42)
+    db.session.execute(products.insert(), [
+        {
+            "name": f"Product {i:06d}",
+            "description": "Benchmark product",
+            "price": round(rng.uniform(1, 500), 2),
+            "stock": rng.randint(0, 100),
+            "category": rng.choice(CATEGORIES)
+        }
+        for i in range(count)
+    ])
+    db.session.commit()
+
+
+def run(label, overrides, args):
+    path = os.path.join(tempfile.mkdtemp(prefix='bench-db-'), 'bench.db')
+    # Payments are never exercised, so skip the Stripe provider and its webhook secret
+    app = create_app(args.profile, {'PAYMENT_PROVIDER': 'fake'})
+    app.config.update(overrides)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+
+    with app.app_context():
+        _seed(args.products)
+
+    deadline = time.monotonic() + args.seconds
+    results = {"read": [], "write": [], "errors": 0}
+    lock = threading.Lock()
+
+    def reader():
+        rng = random.Random()
+        latencies = []
+        errors = 0
+        with app.app_context():
+            while time.monotonic() < deadline:
+                started = time.perf_counter()
+                try:
+                    Product.query.filter(
+                        Product.category == rng.choice(CATEGORIES)
+                    ).order_by(Product.price, Product.id).limit(20).all()
+                    latencies.append(time.perf_counter() - started)
+                except Exception:
+                    errors += 1
+                finally:
+                    db.session.remove()
+        with lock:
+            results["read"] += latencies
+            results["errors"] += errors
+
+    def writer():
+        rng = random.Random()
+        latencies = []
+        errors = 0
+        with app.app_context():
+            while time.monotonic() < deadline:
+                started = time.perf_counter()
+                try:
+                    db.session.execute(_bump, {"product_id": rng.randint(1, args.products)})
+                    db.session.commit()
+                    latencies.append(time.perf_counter() - started)
+                except Exception:
+                    db.session.rollback()
+                    errors += 1
+                finally:
+                    db.session.remove()
+        with lock:
+            results["write"] += latencies
+            results["errors"] += errors
+
+    threads = [threading.Thread(target=reader) for _ in range(args.readers)]
+    threads += [threading.Thread(target=writer) for _ in range(args.writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with app.app_context():
+        journal_mode = db.session.execute('PRAGMA journal_mode').scalar()
+        db.session.remove()
+        db.engine.dispose()
+
+    return {
+        "run": label,
+        "journal_mode": journal_mode,
+        "seconds": args.seconds,
+        "readers": args.readers,
+        "writers": args.writers,
+        "reads_per_second": round(len(results["read"]) / args.seconds, 1),
+        "writes_per_second": round(len(results["write"]) / args.seconds, 1),
+        "read_p50_ms": percentile(results["read"], 0.5),
+        "read_p99_ms": percentile(results["read"], 0.99),
+        "write_p50_ms": percentile(results["write"], 0.5),
+        "write_p99_ms": percentile(results["write"], 0.99),
+        "errors": results["errors"]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--products', type=int, default=10000)
+    parser.add_argument('--profile', default='production', help="APP_CONFIG profile for the 'after' run")
+    parser.add_argument('--only', choices=['before', 'after'])
+    args = parser.parse_args()
+
+    for label, overrides in (('before', BEFORE), ('after', {})):
+        if args.only and args.only != label:
+            continue
+        print(json.dumps(run(label, overrides, args)), flush=True)
+
+
+if __name__ == '__main__':
+    main()
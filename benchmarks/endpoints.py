@@ -0,0 +1,446 @@
+"""
+Throughput, latency percentiles and SQL counts for every API endpoint.
+
+Builds the app with create_app() on a fresh copy of a seeded database (see
+benchmarks/dataset.py) and drives each endpoint through the Flask test client,
+or over HTTP against a local WSGI server with --server. Prints one JSON document
+(also written to --output); compare two runs with benchmarks/compare.py.
+
+    python -m benchmarks.endpoints --scale 100k --requests 300 --concurrency 4 --output run.json
+"""
+import argparse
+import http.client
+import itertools
+import json
+import platform
+import random
+import subprocess
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from sqlalchemy import event, select
+from werkzeug.serving import make_server
+from app import create_app, db
+from benchmarks import dataset
+from benchmarks.stats import latency_summary
+from models.order import Order
+from models.product import Product
+from models.user import User
+from services.authorization import create_user_token
+
+SQL_HEADER = 'X-Benchmark-SQL-Count'
+
+
+class Context:
+    """Ids and tokens from the seeded data that scenarios pick their requests from"""
+
+    def __init__(self, seed):
+        self.seed = seed
+        self.emails = itertools.count()
+        self._tokens = {}
+
+        admin = User.query.filter_by(is_admin=True).order_by(User.id).first()
+        self.admin = {'Authorization': f'Bearer {create_user_token(admin)}'}
+
+        rng = random.Random(seed)
+        user_count = db.session.query(User.id).count()
+        sample = rng.sample(range(2, user_count + 1), min(200, user_count - 1))
+        self.customers = [
+            (user.id, user.email)
+            for user in User.query.filter(User.id.in_(sample), User.is_admin.is_(False)).order_by(User.id)
+        ]
+        for user in User.query.filter(User.id.in_([user_id for user_id, _ in self.customers])):
+            self._tokens[user.id] = create_user_token(user)
+
+        orders = Order.__table__
+        self.orders = [
+            (row.id, row.user_id)
+            for row in db.session.execute(
+                select(orders.c.id, orders.c.user_id).where(
+                    orders.c.user_id.in_(list(self._tokens))
+                ).order_by(orders.c.id)
+            )
+        ]
+        self.product_count = db.session.query(Product.id).count()
+        products = Product.__table__
+        self.in_stock = [
+            row.id
+            for row in db.session.execute(
+                select(products.c.id).where(products.c.stock >= 100).order_by(products.c.id).limit(2000)
+            )
+        ]
+        self.categories = [category for (category,) in db.session.query(Product.category).distinct()]
+
+    def headers(self, user_id):
+        return {'Authorization': f'Bearer {self._tokens[user_id]}'}
+
+    def customer(self, rng):
+        user_id, email = rng.choice(self.customers)
+        return user_id, email, self.headers(user_id)
+
+    def order(self, rng):
+        order_id, user_id = rng.choice(self.orders)
+        return order_id, self.headers(user_id)
+
+
+# Each scenario returns the request to time as (method, path, json body, headers).
+# `call` makes untimed setup requests first where an endpoint needs some state.
+
+def _login(ctx, rng, call):
+    _, email, _ = ctx.customer(rng)
+    return 'POST', '/auth/login', {"email": email, "password": dataset.PASSWORD}, {}
+
+
+def _register(ctx, rng, call):
+    n = next(ctx.emails)
+    return 'POST', '/auth/register', {
+        "username": f'bench-new-{ctx.seed}-{n}',
+        "email": f'bench-new-{ctx.seed}-{n}@bench.example.com',
+        "password": dataset.PASSWORD
+    }, {}
+
+
+def _product_page(ctx, rng, call):
+    return 'GET', '/products?limit=20', None, {}
+
+
+def _product_filtered(ctx, rng, call):
+    category = rng.choice(ctx.categories)
+    return 'GET', f'/products?category={category}&sort=price&order=desc&min_price=10&limit=20', None, {}
+
+
+def _product_search(ctx, rng, call):
+    return 'GET', f'/products?search={rng.choice(dataset.WORDS)}&sort=relevance', None, {}
+
+
+def _product_get(ctx, rng, call):
+    return 'GET', f'/products/{rng.randint(1, ctx.product_count)}', None, {}
+
+
+def _facets(ctx, rng, call):
+    return 'GET', '/products/facets', None, {}
+
+
+def _cart_get(ctx, rng, call):
+    return 'GET', '/cart', None, ctx.customer(rng)[2]
+
+
+def _cart_add(ctx, rng, call):
+    return 'POST', '/cart', {"product_id": rng.choice(ctx.in_stock), "quantity": 1}, ctx.customer(rng)[2]
+
+
+def _cart_patch(ctx, rng, call):
+    first, second, third = rng.sample(ctx.in_stock, 3)
+    return 'PATCH', '/cart', {"operations": [
+        {"op": "add", "product_id": first, "quantity": 1},
+        {"op": "set", "product_id": second, "quantity": 2},
+        {"op": "remove", "product_id": third}
+    ]}, ctx.customer(rng)[2]
+
+
+def _checkout(ctx, rng, call):
+    _, _, headers = ctx.customer(rng)
+    call('PATCH', '/cart', {"operations": [
+        {"op": "set", "product_id": product_id, "quantity": 1}
+        for product_id in rng.sample(ctx.in_stock, 2)
+    ]}, headers)
+    return 'POST', '/cart/checkout', None, headers
+
+
+def _order_lines(ctx, rng):
+    return [{"product_id": product_id, "quantity": rng.randint(1, 3)} for product_id in rng.sample(ctx.in_stock, 2)]
+
+
+def _orders_summary(ctx, rng, call):
+    return 'GET', '/orders?expand=', None, ctx.customer(rng)[2]
+
+
+def _orders_full(ctx, rng, call):
+    return 'GET', '/orders', None, ctx.customer(rng)[2]
+
+
+def _order_get(ctx, rng, call):
+    order_id, headers = ctx.order(rng)
+    return 'GET', f'/orders/{order_id}', None, headers
+
+
+def _order_create(ctx, rng, call):
+    return 'POST', '/orders/?expand=', {"items": _order_lines(ctx, rng)}, ctx.customer(rng)[2]
+
+
+def _order_batch(ctx, rng, call):
+    return 'POST', '/orders/?expand=', {
+        "orders": [{"items": _order_lines(ctx, rng)} for _ in range(50)]
+    }, ctx.customer(rng)[2]
+
+
+def _order_cancel(ctx, rng, call):
+    _, _, headers = ctx.customer(rng)
+    order = call('POST', '/orders/?expand=', {"items": _order_lines(ctx, rng)}, headers)
+    return 'POST', f'/orders/{order["id"]}/cancel', None, headers
+
+
+def _admin_orders(ctx, rng, call):
+    return 'GET', '/admin/orders', None, ctx.admin
+
+
+def _admin_orders_filtered(ctx, rng, call):
+    return 'GET', '/admin/orders?status=paid&expand=', None, ctx.admin
+
+
+def _admin_analytics(ctx, rng, call):
+    return 'GET', '/admin/analytics?dimension=category', None, ctx.admin
+
+
+def _admin_order_status(ctx, rng, call):
+    order_id, _ = ctx.order(rng)
+    return 'PUT', f'/admin/orders/{order_id}/status', {"status": "shipped"}, ctx.admin
+
+
+def _admin_stock(ctx, rng, call):
+    return 'PUT', f'/admin/products/{rng.choice(ctx.in_stock)}/stock', {"stock": rng.randint(100, 500)}, ctx.admin
+
+
+def _payment_webhook(ctx, rng, call):
+    order_id, _ = ctx.order(rng)
+    return 'POST', '/payments/webhook', {
+        "type": "payment_intent.succeeded",
+        "data": {"object": {"id": f'pi_bench_{order_id}', "metadata": {"order_id": str(order_id)}}}
+    }, {}
+
+
+SCENARIOS = {
+    'auth.login': _login,
+    'auth.register': _register,
+    'product.list': _product_page,
+    'product.list_filtered': _product_filtered,
+    'product.search': _product_search,
+    'product.get': _product_get,
+    'product.facets': _facets,
+    'cart.get': _cart_get,
+    'cart.add': _cart_add,
+    'cart.patch': _cart_patch,
+    'cart.checkout': _checkout,
+    'order.list_summary': _orders_summary,
+    'order.list': _orders_full,
+    'order.get': _order_get,
+    'order.create': _order_create,
+    'order.create_batch': _order_batch,
+    'order.cancel': _order_cancel,
+    'admin.orders': _admin_orders,
+    'admin.orders_filtered': _admin_orders_filtered,
+    'admin.analytics': _admin_analytics,
+    'admin.order_status': _admin_order_status,
+    'admin.product_stock': _admin_stock,
+    'payment.webhook': _payment_webhook,
+}
+
+
+def _count_queries(app):
+    """Report each request's SQL statement count in a response header"""
+    local = threading.local()
+
+    @event.listens_for(db.engine, 'before_cursor_execute')
+    def count(conn, cursor, statement, parameters, context, executemany):
+        local.count = getattr(local, 'count', 0) + 1
+
+    @app.before_request
+    def reset():
+        local.count = 0
+
+    @app.after_request
+    def report(response):
+        response.headers[SQL_HEADER] = str(getattr(local, 'count', 0))
+        return response
+
+
+class TestClient:
+    """Requests through Flask's test client, in the calling thread"""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, body, headers):
+        response = self.client.open(path, method=method, json=body, headers=headers)
+        payload = response.get_data()
+        return response.status_code, response.headers.get(SQL_HEADER), payload
+
+
+class HTTPClient:
+    """Requests over a keep-alive HTTP connection to the local server"""
+
+    def __init__(self, port):
+        self.port = port
+        self.connection = http.client.HTTPConnection('127.0.0.1', port)
+
+    def request(self, method, path, body, headers):
+        headers = dict(headers)
+        payload = None
+        if body is not None:
+            payload = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        try:
+            self.connection.request(method, path, payload, headers)
+            response = self.connection.getresponse()
+        except (http.client.HTTPException, ConnectionError):
+            self.connection.close()
+            self.connection = http.client.HTTPConnection('127.0.0.1', self.port)
+            self.connection.request(method, path, payload, headers)
+            response = self.connection.getresponse()
+        data = response.read()
+        if response.getheader('Connection', '').lower() == 'close':
+            self.connection.close()
+        return response.status, response.getheader(SQL_HEADER), data
+
+
+def run_scenario(name, scenario, ctx, new_client, args):
+    """Time `args.requests` requests split across `args.concurrency` threads"""
+    per_thread = max(1, args.requests // args.concurrency)
+    latencies = []
+    statuses = Counter()
+    queries = []
+    setup_failures = [0]
+    lock = threading.Lock()
+    start_barrier = threading.Barrier(args.concurrency + 1)
+
+    def worker(index):
+        rng = random.Random(f'{args.seed}-{name}-{index}')
+        client = new_client()
+
+        def call(method, path, body, headers):
+            status, _, data = client.request(method, path, body, headers)
+            if status >= 400:
+                raise RuntimeError(f'{name}: setup request {method} {path} failed with {status}')
+            return json.loads(data)
+
+        for _ in range(args.warmup):
+            try:
+                client.request(*scenario(ctx, rng, call))
+            except Exception:
+                pass
+
+        mine, my_statuses, my_queries = [], Counter(), []
+        failed = 0
+        start_barrier.wait()
+        for _ in range(per_thread):
+            try:
+                method, path, body, headers = scenario(ctx, rng, call)
+            except Exception:
+                failed += 1
+                continue
+            started = time.perf_counter()
+            status, sql_count, _ = client.request(method, path, body, headers)
+            mine.append(time.perf_counter() - started)
+            my_statuses[status] += 1
+            if sql_count is not None:
+                my_queries.append(int(sql_count))
+        with lock:
+            latencies.extend(mine)
+            statuses.update(my_statuses)
+            queries.extend(my_queries)
+            setup_failures[0] += failed
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    start_barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    return {
+        "endpoint": name,
+        "requests": len(latencies),
+        "errors": sum(count for status, count in statuses.items() if status >= 500),
+        "setup_failures": setup_failures[0],
+        "status_codes": {str(status): count for status, count in sorted(statuses.items())},
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else None,
+        **latency_summary(latencies),
+        "sql_mean": round(sum(queries) / len(queries), 2) if queries else None,
+        "sql_max": max(queries) if queries else None
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scale', choices=list(dataset.SCALES), default='10k')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--data-dir', default=None)
+    parser.add_argument('--requests', type=int, default=200, help='Timed requests per endpoint')
+    parser.add_argument('--warmup', type=int, default=5, help='Untimed requests per endpoint and thread')
+    parser.add_argument('--concurrency', type=int, default=1, help='Threads sending requests')
+    parser.add_argument('--server', action='store_true', help='Go through a local threaded WSGI server')
+    parser.add_argument('--profile', default='production', help='APP_CONFIG profile')
+    parser.add_argument('--no-cache', action='store_true', help='Disable the product response cache')
+    parser.add_argument('--only', nargs='*', help='Endpoint names (or prefixes like "cart.") to run')
+    parser.add_argument('--output', help='Also write the results to this file')
+    args = parser.parse_args()
+
+    path = dataset.working_copy(dataset.ensure(args.scale, args.seed, args.data_dir))
+    app = create_app(args.profile, {
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}',
+        # Never call a real payment provider from a benchmark
+        'PAYMENT_PROVIDER': 'fake',
+        'PRODUCT_CACHE_ENABLED': not args.no_cache
+    })
+
+    server = None
+    with app.app_context():
+        _count_queries(app)
+        ctx = Context(args.seed)
+        if args.server:
+            server = make_server('127.0.0.1', 0, app, threaded=True)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            new_client = lambda: HTTPClient(server.server_port)
+        else:
+            new_client = lambda: TestClient(app)
+
+        selected = [
+            name for name in SCENARIOS
+            if not args.only or any(name == only or name.startswith(only) for only in args.only)
+        ]
+        results = []
+        for name in selected:
+            results.append(run_scenario(name, SCENARIOS[name], ctx, new_client, args))
+            db.session.remove()
+
+    if server:
+        server.shutdown()
+
+    report = {
+        "benchmark": "endpoints",
+        "started_at": datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "scale": args.scale,
+        "seed": args.seed,
+        "counts": dataset.sizes(dataset.SCALES[args.scale]),
+        "mode": 'server' if args.server else 'test-client',
+        "profile": args.profile,
+        "product_cache": not args.no_cache,
+        "metrics": app.config['METRICS_ENABLED'],
+        "concurrency": args.concurrency,
+        "results": results
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+"""
+Catalog latency during a login storm, with password hashing inline or in the pool.
+
+Starts a local threaded WSGI server on a fresh SQLite file, then runs login
+clients (POST /auth/login with valid credentials, back to back) alongside catalog
+clients (GET /products?limit=20) for a fixed time. This is run once with hashing
+on the request threads ("inline", PASSWORD_HASH_WORKERS=0) and once in the
+process pool ("pool"). Prints one JSON object per run with throughput, status
+codes and latency for each kind of client. The 503s are logins shed once
+PASSWORD_HASH_MAX_PENDING hashes are queued for PASSWORD_HASH_QUEUE_TIMEOUT.
+
+    python -m benchmarks.login_storm --seconds 10 --login-clients 32 --catalog-clients 4
+    python -m benchmarks.login_storm --only pool --max-pending 8 --queue-timeout 0.5
+"""
+import argparse
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import Counter
+from werkzeug.serving import make_server
+from app import create_app, db
+from benchmarks.endpoints import HTTPClient
+from benchmarks.stats import latency_summary
+from services import search as search_index
+from services import seeding
+from services.passwords import password_hasher
+
+PASSWORD = 'benchmark-password'
+
+
+def _seed(users, products):
+    db.create_all()
+    search_index.create_index()
+    # Hashed once with the configured cost, so every login pays the full price
+    seeding.seed(users, products, 0, 0, admin_count=0, password=PASSWORD)
+
+
+def run(label, workers, args):
+    path = os.path.join(tempfile.mkdtemp(prefix='bench-login-'), 'bench.db')
+    app = create_app(args.profile, {
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}',
+        # Never call a real payment provider from a benchmark
+        'PAYMENT_PROVIDER': 'fake',
+        'PASSWORD_HASH_WORKERS': workers,
+        'PASSWORD_HASH_ITERATIONS': args.iterations,
+        'PASSWORD_HASH_MAX_PENDING': args.max_pending,
+        'PASSWORD_HASH_QUEUE_TIMEOUT': args.queue_timeout,
+        # Shed logins are the point of the run, not something to log per request
+        'LOG_LEVEL': 'ERROR'
+    })
+    # The dev server logs every request at INFO on its own logger
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    with app.app_context():
+        _seed(args.users, args.products)
+        db.session.remove()
+    if workers:
+        # Start the pool's processes before the clock starts
+        password_hasher.hash(PASSWORD)
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    start = threading.Barrier(args.login_clients + args.catalog_clients + 1)
+    results = {"login": ([], Counter()), "catalog": ([], Counter())}
+    lock = threading.Lock()
+
+    def client(kind, index):
+        http = HTTPClient(server.server_port)
+        if kind == 'login':
+            request = ('POST', '/auth/login', {"email": f'user{index % args.users + 1}@example.com', "password": PASSWORD})
+        else:
+            request = ('GET', '/products?limit=20', None)
+        latencies, statuses = [], Counter()
+        start.wait()
+        deadline = time.monotonic() + args.seconds
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                status, _, _ = http.request(*request, {})
+            except OSError:
+                status = 'error'
+            if status == 200:
+                latencies.append(time.perf_counter() - started)
+            statuses[status] += 1
+        with lock:
+            results[kind][0].extend(latencies)
+            results[kind][1].update(statuses)
+
+    threads = [threading.Thread(target=client, args=('login', i)) for i in range(args.login_clients)]
+    threads += [threading.Thread(target=client, args=('catalog', i)) for i in range(args.catalog_clients)]
+    for thread in threads:
+        thread.start()
+    start.wait()
+    for thread in threads:
+        thread.join()
+    server.shutdown()
+
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+    report = {
+        "run": label,
+        "password_hash_workers": workers,
+        "iterations": args.iterations,
+        "seconds": args.seconds,
+        "cpus": os.cpu_count(),
+    }
+    for kind, (latencies, statuses) in results.items():
+        # Latencies are of successful requests; shed logins only show in the statuses
+        report[kind] = {
+            "clients": args.login_clients if kind == 'login' else args.catalog_clients,
+            "requests": sum(statuses.values()),
+            "ok_per_second": round(len(latencies) / args.seconds, 1),
+            "statuses": {str(status): count for status, count in sorted(statuses.items(), key=str)},
+            **latency_summary(latencies)
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--login-clients', type=int, default=32)
+    parser.add_argument('--catalog-clients', type=int, default=4)
+    parser.add_argument('--workers', type=int, default=2, help="PASSWORD_HASH_WORKERS for the 'pool' run")
+    parser.add_argument('--max-pending', type=int, default=64, help='PASSWORD_HASH_MAX_PENDING')
+    parser.add_argument('--queue-timeout', type=float, default=5, help='PASSWORD_HASH_QUEUE_TIMEOUT')
+    parser.add_argument('--iterations', type=int, default=260000, help='PASSWORD_HASH_ITERATIONS')
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--products', type=int, default=10000)
+    parser.add_argument('--profile', default='production', help='APP_CONFIG profile')
+    parser.add_argument('--only', choices=['inline', 'pool'])
+    args = parser.parse_args()
+
+    for label, workers in (('inline', 0), ('pool', args.workers)):
+        if args.only and args.only != label:
+            continue
+        print(json.dumps(run(label, workers, args)), flush=True)
+
+
+if __name__ == '__main__':
+    main()
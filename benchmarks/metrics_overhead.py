@@ -0,0 +1,127 @@
+"""
+Cost of the request metrics (services/metrics.py).
+
+Times the recording primitives and the request hooks on a bare Flask app, then
+runs benchmarks.endpoints with METRICS_ENABLED off and on, alternating rounds in
+fresh processes so engine listeners from one run never leak into the other.
+Prints one JSON document with the fixed costs and, per endpoint, the median p50
+and throughput of each mode.
+
+    python -m benchmarks.metrics_overhead --rounds 3 --requests 300
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from flask import Flask
+from services.metrics import Counter, Histogram, LATENCY_BUCKETS, Metrics
+
+# Cheap endpoints show the overhead most clearly; the rest put it in context
+DEFAULT_ENDPOINTS = ['product.get', 'cart.get', 'order.list_summary', 'order.list', 'admin.orders']
+
+
+def _per_call(fn, calls):
+    started = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return round((time.perf_counter() - started) / calls * 1e9)
+
+
+def primitives(calls=200_000):
+    """Nanoseconds per recording call"""
+    counter = Counter('c', '', ('endpoint', 'method', 'status'))
+    histogram = Histogram('h', '', ('endpoint', 'method'), LATENCY_BUCKETS)
+    counter_key = ('product.get_product', 'GET', '200')
+    histogram_key = ('product.get_product', 'GET')
+    return {
+        "counter_inc_ns": _per_call(lambda: counter.inc(counter_key), calls),
+        "histogram_observe_ns": _per_call(lambda: histogram.observe(histogram_key, 0.0042), calls),
+    }
+
+
+def request_hooks(batches=20, batch=1000):
+    """
+    Microseconds the hooks add to a request that does nothing else. Batches for
+    the two apps alternate and the fastest of each is kept, to shed scheduler noise.
+    """
+    clients = {}
+    for enabled in (False, True):
+        app = Flask(__name__)
+        app.add_url_rule('/ping', 'ping', lambda: 'pong')
+        if enabled:
+            Metrics().init_app(app)
+        clients[enabled] = app.test_client()
+    timings = {False: [], True: []}
+    for _ in range(batches):
+        for enabled, client in clients.items():
+            started = time.perf_counter()
+            for _ in range(batch):
+                client.get('/ping')
+            timings[enabled].append((time.perf_counter() - started) / batch * 1e6)
+    bare, instrumented = min(timings[False]), min(timings[True])
+    return {
+        "bare_request_us": round(bare, 1),
+        "instrumented_request_us": round(instrumented, 1),
+        "overhead_us": round(instrumented - bare, 1)
+    }
+
+
+def _run_endpoints(enabled, args, output):
+    command = [
+        sys.executable, '-m', 'benchmarks.endpoints',
+        '--scale', args.scale, '--seed', str(args.seed),
+        '--requests', str(args.requests), '--warmup', str(args.warmup),
+        '--output', output, '--only', *args.only
+    ]
+    if args.data_dir:
+        command += ['--data-dir', args.data_dir]
+    env = dict(os.environ, METRICS_ENABLED='1' if enabled else '0')
+    subprocess.run(command, env=env, check=True, stdout=subprocess.DEVNULL)
+    with open(output) as f:
+        return {result["endpoint"]: result for result in json.load(f)["results"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scale', default='10k')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--data-dir', default=None)
+    parser.add_argument('--requests', type=int, default=300, help='Timed requests per endpoint and run')
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--rounds', type=int, default=3, help='Runs of each mode, alternating')
+    parser.add_argument('--only', nargs='*', default=DEFAULT_ENDPOINTS)
+    args = parser.parse_args()
+
+    runs = {False: [], True: []}
+    output = os.path.join(tempfile.mkdtemp(prefix='bench-metrics-'), 'run.json')
+    for _ in range(args.rounds):
+        for enabled in (False, True):
+            runs[enabled].append(_run_endpoints(enabled, args, output))
+
+    endpoints = []
+    for name in runs[True][0]:
+        row = {"endpoint": name}
+        for enabled, label in ((False, 'off'), (True, 'on')):
+            row[f'p50_ms_{label}'] = statistics.median(run[name]["p50_ms"] for run in runs[enabled])
+            row[f'throughput_rps_{label}'] = statistics.median(run[name]["throughput_rps"] for run in runs[enabled])
+        row["p50_overhead_ms"] = round(row["p50_ms_on"] - row["p50_ms_off"], 3)
+        row["throughput_change"] = round(row["throughput_rps_on"] / row["throughput_rps_off"] - 1, 3)
+        endpoints.append(row)
+
+    print(json.dumps({
+        "benchmark": "metrics_overhead",
+        "scale": args.scale,
+        "rounds": args.rounds,
+        "requests": args.requests,
+        "primitives": primitives(),
+        "request_hooks": request_hooks(),
+        "endpoints": endpoints
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
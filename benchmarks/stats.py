@@ -0,0 +1,18 @@
+"""Latency summaries shared by the benchmark scripts"""
+
+
+def percentile(samples, fraction):
+    """The `fraction` percentile of latencies in seconds, in milliseconds"""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] * 1000, 2)
+
+
+def latency_summary(samples):
+    return {
+        "p50_ms": percentile(samples, 0.5),
+        "p95_ms": percentile(samples, 0.95),
+        "p99_ms": percentile(samples, 0.99),
+        "max_ms": round(max(samples) * 1000, 2) if samples else None
+    }
@@ -2,3 +2,5 @@ from models.user import User
 from models.product import Product
 from models.cart import CartItem
 from models.order import Order, OrderItem
+from models.reservation import StockReservation
+from models.analytics import SalesRollup
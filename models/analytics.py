@@ -0,0 +1,16 @@
+from app import db
+
+class SalesRollup(db.Model):
+    """Daily sales totals per product, category or overall, split by order status"""
+    id = db.Column(db.Integer, primary_key=True)
+    dimension = db.Column(db.String(20), nullable=False)  # 'product', 'category' or 'total'
+    day = db.Column(db.Date, nullable=False)
+    key = db.Column(db.String(100), nullable=False, default='')
+    status = db.Column(db.String(20), nullable=False)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint('dimension', 'day', 'key', 'status', name='uq_sales_rollup_bucket'),
+    )
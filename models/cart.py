@@ -8,3 +8,8 @@ class CartItem(db.Model):
     
     user = db.relationship('User', backref='cart_items')
     product = db.relationship('Product')
+
+    # One row per product in a cart; the leading user_id also serves cart lookups
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'product_id', name='uq_cart_item_user_product'),
+    )
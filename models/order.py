@@ -7,15 +7,28 @@ class Order(db.Model):
     status = db.Column(db.String(20), default='pending')
     total_amount = db.Column(db.Float, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    payment_intent_id = db.Column(db.String(100), index=True)
     
     user = db.relationship('User', backref='orders')
-    items = db.relationship('OrderItem', backref='order', lazy='joined')
+    # Loaded lazily unless a query asks otherwise; endpoints pick their own
+    # loader options (see services/projection.py)
+    items = db.relationship('OrderItem', backref='order')
+
+    # Back a user's order history, the admin listing's status filter and the
+    # (created_at, id) keyset ordering
+    __table_args__ = (
+        db.Index('ix_order_user_id_created_at_id', 'user_id', 'created_at', 'id'),
+        db.Index('ix_order_created_at_id', 'created_at', 'id'),
+        db.Index('ix_order_status_created_at_id', 'status', 'created_at', 'id'),
+    )
 
 class OrderItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False)
+    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False, index=True)
     product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
     quantity = db.Column(db.Integer, nullable=False)
     price = db.Column(db.Float, nullable=False)
+    # The product's category when it was ordered, so sales rollups don't move with recategorizations
+    category = db.Column(db.String(50))
     
-    product = db.relationship('Product', lazy='joined')
+    product = db.relationship('Product')
@@ -1,4 +1,11 @@
 from app import db
+from sqlalchemy.dialects import sqlite
+
+# SQLite's CURRENT_TIMESTAMP has no fractional seconds, so bound values must use the
+# same text format or keyset comparisons on created_at miss rows with equal timestamps
+SQLITE_TIMESTAMP = sqlite.DATETIME(
+    storage_format="%(year)04d-%(month)02d-%(day)02d %(hour)02d:%(minute)02d:%(second)02d"
+)
 
 class Product(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -8,4 +15,12 @@ class Product(db.Model):
     stock = db.Column(db.Integer, nullable=False, default=0)
     image_url = db.Column(db.String(200))
     category = db.Column(db.String(50))
-    created_at = db.Column(db.DateTime, server_default=db.func.now())
+    created_at = db.Column(db.DateTime().with_variant(SQLITE_TIMESTAMP, 'sqlite'), server_default=db.func.now())
+
+    # Category filters and facet counts, plus one index per keyset sort order
+    __table_args__ = (
+        db.Index('ix_product_category', 'category'),
+        db.Index('ix_product_name_id', 'name', 'id'),
+        db.Index('ix_product_price_id', 'price', 'id'),
+        db.Index('ix_product_created_at_id', 'created_at', 'id'),
+    )
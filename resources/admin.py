@@ -1,133 +1,213 @@
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
+import logging
+from datetime import datetime, time, timedelta
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 from marshmallow import ValidationError
 from app import db
-from models.user import User
 from models.product import Product
 from models.order import Order
-from schemas import product_schema, order_schema, orders_schema
+from schemas import product_schema
+from serializers import product_serializer, order_serializer
+from services import serialization
+from services import search as search_index
+from services.facets import category_facets
+from services.authorization import admin_required
+from services.cache import product_cache
+from services import inventory
+from services import catalog
+from services import analytics
+from services.pagination import keyset_page, iter_chunks, InvalidCursor
+from services.projection import OrderProjection, InvalidProjection, order_options
+
+logger = logging.getLogger(__name__)
 
 bp = Blueprint('admin', __name__, url_prefix='/admin')
 
-def is_admin():
-    """Helper function to check if current user is admin"""
-    current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
-    return user and user.is_admin
+IMPORT_BATCH_SIZE = 1000
+EXPORT_BATCH_SIZE = 1000
+STOCK_BATCH_SIZE = 1000
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+VALID_STATUSES = ['pending', 'paid', 'shipped', 'delivered', 'cancelled']
+ANALYTICS_DIMENSIONS = ['total', 'product', 'category']
+
+def _parse_datetime(value):
+    """Parse an optional ISO 8601 date or datetime query parameter"""
+    if not value:
+        return None
+    return datetime.fromisoformat(value)
+
+def _end_day(value):
+    """Exclusive rollup day for a `to` bound: a plain date leaves that day out, a time of day keeps it in"""
+    if value.time() == time.min:
+        return value.date()
+    return value.date() + timedelta(days=1)
 
 @bp.route('/orders', methods=['GET'])
-@jwt_required()
+@admin_required
 def get_all_orders():
     try:
-        if not is_admin():
-            return jsonify({"message": "Admin access required"}), 403
-            
         # Optional query parameters for filtering
         status = request.args.get('status')
         user_id = request.args.get('user_id')
+        order = request.args.get('order', 'desc')
+        format = request.args.get('format', 'json')
+        limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+        cursor = request.args.get('cursor')
+        
+        try:
+            created_from = _parse_datetime(request.args.get('from'))
+            created_to = _parse_datetime(request.args.get('to'))
+        except ValueError:
+            return jsonify({"message": "Dates must be in ISO 8601 format"}), 400
+            
+        if status and status not in VALID_STATUSES:
+            return jsonify({"message": f"Invalid status. Must be one of: {', '.join(VALID_STATUSES)}"}), 400
+        if order not in ['asc', 'desc']:
+            return jsonify({"message": "Order must be 'asc' or 'desc'"}), 400
+        if format not in ['json', 'ndjson']:
+            return jsonify({"message": "Format must be 'json' or 'ndjson'"}), 400
+        if limit < 1 or limit > MAX_PAGE_SIZE:
+            return jsonify({"message": f"Limit must be between 1 and {MAX_PAGE_SIZE}"}), 400
+        projection = OrderProjection.from_args(request.args)
         
-        # Start with base query
-        query = Order.query
+        # Start with base query, loading only what the projection dumps
+        query = Order.query.options(*projection.options())
         
         # Apply filters if provided
         if status:
             query = query.filter_by(status=status)
         if user_id:
             query = query.filter_by(user_id=user_id)
+        if created_from:
+            query = query.filter(Order.created_at >= created_from)
+        if created_to:
+            query = query.filter(Order.created_at < created_to)
+            
+        descending = order == 'desc'
+        
+        # Stream every matching order as NDJSON, one fixed-size chunk at a time
+        if format == 'ndjson':
+            def generate():
+                for orders in iter_chunks(query, Order.created_at, Order.id, descending, EXPORT_BATCH_SIZE):
+                    yield ''.join(serialization.dumps(row) + '\n' for row in projection.dump(orders, many=True))
+                    # Drop the chunk from the session so memory stays flat
+                    db.session.expunge_all()
+                    
+            return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
             
-        # Order by creation date (newest first)
-        orders = query.order_by(Order.created_at.desc()).all()
+        # Otherwise return one page, newest first by default
+        orders, next_cursor, prev_cursor = keyset_page(
+            query,
+            Order.created_at,
+            Order.id,
+            descending=descending,
+            limit=limit,
+            cursor=cursor,
+            scope=f"orders:{order}"
+        )
         
         return jsonify({
-            "total": len(orders),
-            "orders": orders_schema.dump(orders)
+            "orders": projection.dump(orders, many=True),
+            "count": len(orders),
+            "limit": limit,
+            "next_cursor": next_cursor,
+            "prev_cursor": prev_cursor
         })
-    except Exception as e:
-        print(f"Error: {str(e)}")
+    except (InvalidCursor, InvalidProjection) as err:
+        return jsonify({"message": str(err)}), 400
+    except Exception:
+        logger.exception('Failed to list orders')
         return jsonify({"message": "An error occurred"}), 500
 
 @bp.route('/orders/<int:id>/status', methods=['PUT'])
-@jwt_required()
+@admin_required
 def update_order_status(id):
     try:
-        if not is_admin():
-            return jsonify({"message": "Admin access required"}), 403
-            
-        order = Order.query.get_or_404(id)
+        # The response embeds items and products, and a cancel restocks from them
+        order = Order.query.options(*order_options()).get_or_404(id)
         data = request.get_json()
         
         if 'status' not in data:
             return jsonify({"message": "Status is required"}), 400
             
-        valid_statuses = ['pending', 'paid', 'shipped', 'delivered', 'cancelled']
-        if data['status'] not in valid_statuses:
-            return jsonify({"message": f"Invalid status. Must be one of: {', '.join(valid_statuses)}"}), 400
+        if data['status'] not in VALID_STATUSES:
+            return jsonify({"message": f"Invalid status. Must be one of: {', '.join(VALID_STATUSES)}"}), 400
             
         # If cancelling order, return items to stock
+        restocked = False
+        restocked_ids = []
         if data['status'] == 'cancelled' and order.status != 'cancelled':
-            for item in order.items:
-                if item.product:
-                    item.product.stock += item.quantity
-        
-        order.status = data['status']
+            restocked = any(item.product and item.product.stock <= 0 for item in order.items)
+            restocked_ids = [item.product_id for item in order.items]
+            # Conditional on the status we just read, so concurrent cancels restock once
+            if not inventory.cancel_order(order, order.status):
+                db.session.rollback()
+                return jsonify({"message": "Order status changed concurrently, please retry"}), 409
+        else:
+            # Conditional like the cancel, so a concurrent change is not overwritten or double-counted
+            updated = Order.query.filter(
+                Order.id == order.id,
+                Order.status == order.status
+            ).update({"status": data['status']}, synchronize_session=False)
+            if updated != 1:
+                db.session.rollback()
+                return jsonify({"message": "Order status changed concurrently, please retry"}), 409
+            analytics.record_transition(order.id, order.status, data['status'])
         db.session.commit()
+        if restocked:
+            category_facets.invalidate()
+        if restocked_ids:
+            product_cache.invalidate(*restocked_ids)
         
         return jsonify({
             "message": "Order status updated successfully",
-            "order": order_schema.dump(order)
+            "order": order_serializer.dump(order)
         })
-    except Exception as e:
-        print(f"Error: {str(e)}")
+    except Exception:
+        logger.exception('Failed to update order status')
         return jsonify({"message": "An error occurred"}), 500
 
 @bp.route('/products', methods=['POST'])
-@jwt_required()
+@admin_required
 def create_product():
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
-        
-        if not user or not user.is_admin:
-            return jsonify({"message": "Unauthorized"}), 403
-            
         data = product_schema.load(request.get_json())
         product = Product(**data)
         
         db.session.add(product)
+        db.session.flush()
+        search_index.index_product(product)
         db.session.commit()
+        category_facets.invalidate()
+        product_cache.invalidate()
         
-        return jsonify(product_schema.dump(product)), 201
+        return jsonify(product_serializer.dump(product)), 201
     except ValidationError as err:
         return jsonify(err.messages), 400
 
 @bp.route('/products/<int:id>', methods=['PUT'])
-@jwt_required()
+@admin_required
 def update_product(id):
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
-        
-        if not user or not user.is_admin:
-            return jsonify({"message": "Unauthorized"}), 403
-            
         product = Product.query.get_or_404(id)
         data = product_schema.load(request.get_json(), partial=True)
         
         for key, value in data.items():
             setattr(product, key, value)
             
+        search_index.index_product(product)
         db.session.commit()
-        return jsonify(product_schema.dump(product))
+        category_facets.invalidate()
+        product_cache.invalidate(id)
+        return jsonify(product_serializer.dump(product))
     except ValidationError as err:
         return jsonify(err.messages), 400
 
 @bp.route('/products/<int:id>/stock', methods=['PUT'])
-@jwt_required()
+@admin_required
 def update_product_stock(id):
     try:
-        if not is_admin():
-            return jsonify({"message": "Admin access required"}), 403
-            
         product = Product.query.get_or_404(id)
         data = request.get_json()
         
@@ -137,13 +217,135 @@ def update_product_stock(id):
         if not isinstance(data['stock'], int) or data['stock'] < 0:
             return jsonify({"message": "Stock must be a positive integer"}), 400
             
+        previous_stock = product.stock
         product.stock = data['stock']
         db.session.commit()
+        category_facets.stock_changed(previous_stock, data['stock'])
+        product_cache.invalidate(id)
         
         return jsonify({
             "message": "Stock updated successfully",
-            "product": product_schema.dump(product)
+            "product": product_serializer.dump(product)
+        })
+    except Exception:
+        logger.exception('Failed to update product stock')
+        return jsonify({"message": "An error occurred"}), 500
+
+@bp.route('/cache', methods=['GET'])
+@admin_required
+def get_cache_stats():
+    try:
+        return jsonify({"product_cache": product_cache.stats()})
+    except Exception:
+        logger.exception('Failed to read cache stats')
+        return jsonify({"message": "An error occurred"}), 500
+
+@bp.route('/products/import', methods=['POST'])
+@admin_required
+def import_products():
+    try:
+        format = request.args.get('format')
+        if not format:
+            format = 'csv' if request.mimetype == 'text/csv' else 'ndjson'
+        if format not in ['ndjson', 'csv']:
+            return jsonify({"message": "Format must be 'ndjson' or 'csv'"}), 400
+            
+        batch_size = request.args.get('batch_size', IMPORT_BATCH_SIZE, type=int)
+        if batch_size < 1 or batch_size > IMPORT_BATCH_SIZE:
+            return jsonify({"message": f"Batch size must be between 1 and {IMPORT_BATCH_SIZE}"}), 400
+            
+        report = catalog.import_products(catalog.iter_rows(request.stream, format), batch_size)
+        
+        category_facets.invalidate()
+        product_cache.clear()
+        
+        return jsonify(report)
+    except UnicodeDecodeError:
+        db.session.rollback()
+        return jsonify({"message": "Import must be UTF-8 encoded"}), 400
+    except Exception:
+        logger.exception('Product import failed')
+        db.session.rollback()
+        return jsonify({"message": "An error occurred during import"}), 500
+
+@bp.route('/products/export', methods=['GET'])
+@admin_required
+def export_products():
+    try:
+        format = request.args.get('format', 'ndjson')
+        if format not in ['ndjson', 'csv']:
+            return jsonify({"message": "Format must be 'ndjson' or 'csv'"}), 400
+            
+        mimetype = 'text/csv' if format == 'csv' else 'application/x-ndjson'
+        return Response(
+            stream_with_context(catalog.export_products(format, EXPORT_BATCH_SIZE)),
+            mimetype=mimetype,
+            headers={"Content-Disposition": f"attachment; filename=products.{format}"}
+        )
+    except Exception:
+        logger.exception('Product export failed')
+        return jsonify({"message": "An error occurred"}), 500
+
+@bp.route('/products/stock', methods=['PATCH'])
+@admin_required
+def bulk_update_stock():
+    try:
+        data = request.get_json()
+        if not data or not isinstance(data.get('items'), list):
+            return jsonify({"message": "A list of stock changes is required in 'items'"}), 400
+            
+        report = inventory.adjust_stock(data['items'], STOCK_BATCH_SIZE)
+        
+        if report.pop("stock_crossed"):
+            category_facets.invalidate()
+        updated_ids = report.pop("updated_ids")
+        if updated_ids:
+            product_cache.invalidate(*updated_ids)
+        
+        return jsonify(report)
+    except Exception:
+        logger.exception('Bulk stock update failed')
+        db.session.rollback()
+        return jsonify({"message": "An error occurred"}), 500
+
+@bp.route('/analytics', methods=['GET'])
+@admin_required
+def get_analytics():
+    try:
+        dimension = request.args.get('dimension', 'total')
+        interval = request.args.get('interval')
+        statuses = [status for status in request.args.get('status', '').split(',') if status]
+        limit = request.args.get('limit', MAX_PAGE_SIZE, type=int)
+        
+        try:
+            date_from = _parse_datetime(request.args.get('from'))
+            date_to = _parse_datetime(request.args.get('to'))
+        except ValueError:
+            return jsonify({"message": "Dates must be in ISO 8601 format"}), 400
+            
+        if dimension not in ANALYTICS_DIMENSIONS:
+            return jsonify({"message": f"Invalid dimension. Must be one of: {', '.join(ANALYTICS_DIMENSIONS)}"}), 400
+        if interval not in [None, 'day']:
+            return jsonify({"message": "Interval must be 'day' or omitted"}), 400
+        if any(status not in VALID_STATUSES for status in statuses):
+            return jsonify({"message": f"Invalid status. Must be one of: {', '.join(VALID_STATUSES)}"}), 400
+        if limit < 1 or limit > MAX_PAGE_SIZE:
+            return jsonify({"message": f"Limit must be between 1 and {MAX_PAGE_SIZE}"}), 400
+            
+        results = analytics.query(
+            dimension,
+            date_from=date_from.date() if date_from else None,
+            date_to=_end_day(date_to) if date_to else None,
+            statuses=statuses,
+            interval=interval,
+            limit=limit
+        )
+        
+        return jsonify({
+            "dimension": dimension,
+            "interval": interval,
+            "results": results
         })
-    except Exception as e:
-        print(f"Error: {str(e)}")
+    except Exception:
+        logger.exception('Failed to load analytics')
         return jsonify({"message": "An error occurred"}), 500
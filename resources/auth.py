@@ -1,9 +1,14 @@
+import logging
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import create_access_token
 from marshmallow import ValidationError
 from app import db
 from models.user import User
 from schemas import user_schema
+from serializers import user_serializer
+from services.authorization import create_user_token
+from services.passwords import HasherBusy
+
+logger = logging.getLogger(__name__)
 
 bp = Blueprint('auth', __name__, url_prefix='/auth')
 
@@ -13,18 +18,30 @@ def login():
         data = user_schema.load(request.get_json(), partial=('username',))
         user = User.query.filter_by(email=data['email']).first()
         
-        print(f"User found: {user}")  # Debug print
+        # Sampled like all debug records; never log the email or password
+        logger.debug('Login attempt', extra={"user_id": user.id if user else None})
+
+        # Hand the connection back to the pool while the slow hash check runs;
+        # the detached user keeps its loaded columns
+        db.session.close()
         
         if user and user.check_password(data['password']):
-            access_token = create_access_token(identity=str(user.id))
+            # Upgrade hashes made with an older method or cost while we have the password
+            if user.password_needs_rehash():
+                db.session.add(user)
+                user.set_password(data['password'])
+                db.session.commit()
+            access_token = create_user_token(user)
             return jsonify({
                 "access_token": access_token,
-                "user": user_schema.dump(user)
+                "user": user_serializer.dump(user)
             })
         
         return jsonify({"message": "Invalid credentials"}), 401
     except ValidationError as err:
         return jsonify(err.messages), 400
+    except HasherBusy:
+        return jsonify({"message": "Too many sign-ins in progress, please retry shortly"}), 503, {"Retry-After": "1"}
 
 @bp.route('/register', methods=['POST'])
 def register():
@@ -34,20 +51,23 @@ def register():
         if User.query.filter_by(email=data['email']).first():
             return jsonify({"message": "User already exists!"}), 400
 
+        # Admins are made with `flask create-admin`; a client-sent is_admin is ignored
         user = User(
             username=data['username'],
             email=data['email'],
-            is_admin=data.get('is_admin', False)
+            is_admin=False
         )
         user.set_password(data['password'])
         
         db.session.add(user)
         db.session.commit()
         
-        access_token = create_access_token(identity=str(user.id))
+        access_token = create_user_token(user)
         return jsonify({
             "access_token": access_token,
-            "user": user_schema.dump(user)
+            "user": user_serializer.dump(user)
         }), 201
     except ValidationError as err:
-        return jsonify(err.messages), 400
\ No newline at end of file
+        return jsonify(err.messages), 400
+    except HasherBusy:
+        return jsonify({"message": "Too many sign-ins in progress, please retry shortly"}), 503, {"Retry-After": "1"}
\ No newline at end of file
@@ -1,13 +1,23 @@
-from flask import Blueprint, request, jsonify
+import logging
+from collections import defaultdict
+from flask import Blueprint, request, jsonify, url_for
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from marshmallow import ValidationError
 from app import db
-from models.cart import CartItem
 from models.order import Order, OrderItem
 from models.product import Product
-from schemas import cart_item_schema, cart_items_schema, order_schema
+from schemas import cart_item_schema, cart_batch_schema
+from serializers import cart_item_serializer, cart_items_serializer, order_serializer
+from services.projection import order_options
 from sqlalchemy.exc import IntegrityError
-from resources.stripe import create_payment_intent
+from services.facets import category_facets
+from services.cache import product_cache
+from services import analytics
+from services import inventory
+from services.payments import payment_pipeline
+from services.cart_store import cart_store
+
+logger = logging.getLogger(__name__)
 
 bp = Blueprint('cart', __name__, url_prefix='/cart')
 
@@ -16,7 +26,7 @@ bp = Blueprint('cart', __name__, url_prefix='/cart')
 def get_cart():
     try:
         user_id = get_jwt_identity()
-        cart_items = CartItem.query.filter_by(user_id=user_id).all()
+        cart_items = cart_store.lines(user_id)
         
         if not cart_items:
             return jsonify({
@@ -24,9 +34,9 @@ def get_cart():
                 "cart_items": []
             })
             
-        return jsonify(cart_items_schema.dump(cart_items))
-    except Exception as e:
-        print(f"Error: {str(e)}")
+        return jsonify(cart_items_serializer.dump(cart_items))
+    except Exception:
+        logger.exception('Failed to fetch cart')
         return jsonify({"message": "An error occurred while fetching your cart"}), 500
 
 @bp.route('', methods=['POST'])
@@ -55,36 +65,39 @@ def add_to_cart():
                 "message": f"Not enough stock available. Only {product.stock} items left"
             }), 400
         
-        # Check if item already exists in cart
-        existing_item = CartItem.query.filter_by(
-            user_id=user_id,
-            product_id=data['product_id']
-        ).first()
+        reserving = inventory.reservations_enabled()
+        if reserving:
+            inventory.release_expired()
         
-        if existing_item:
-            # Update quantity of existing item
-            new_quantity = existing_item.quantity + data['quantity']
-            if new_quantity > product.stock:
-                return jsonify({
-                    "message": f"Cannot add {data['quantity']} more items. Only {product.stock - existing_item.quantity} more available"
-                }), 400
-                
-            existing_item.quantity = new_quantity
-            cart_item = existing_item
-        else:
-            # Create new cart item
-            cart_item = CartItem(
-                user_id=user_id,
-                product_id=data['product_id'],
-                quantity=data['quantity']
-            )
-            db.session.add(cart_item)
+        # Check if the product is already in the cart
+        in_cart = cart_store.quantities(user_id, [data['product_id']]).get(data['product_id'], 0)
+        
+        new_quantity = in_cart + data['quantity']
+        # Reserved units are already out of product.stock, so only check without reservations
+        if in_cart and not reserving and new_quantity > product.stock:
+            return jsonify({
+                "message": f"Cannot add {data['quantity']} more items. Only {product.stock - in_cart} more available"
+            }), 400
+        cart_store.write(user_id, {data['product_id']: new_quantity})
+        
+        # Read before the commit expires the product; the reservation takes stock from here
+        previous_stock = product.stock
+        # Hold the units for this cart until the reservation expires
+        if reserving and not inventory.reserve(user_id, data['product_id'], data['quantity']):
+            db.session.rollback()
+            return jsonify({
+                "message": "Not enough stock available"
+            }), 400
         
         db.session.commit()
+        if reserving:
+            category_facets.stock_changed(previous_stock, previous_stock - data['quantity'])
+            product_cache.invalidate(data['product_id'])
         
+        cart_item = cart_store.lines(user_id, [data['product_id']])[0]
         return jsonify({
             "message": "Item added to cart successfully",
-            "cart_item": cart_item_schema.dump(cart_item)
+            "cart_item": cart_item_serializer.dump(cart_item)
         }), 201
         
     except ValidationError as err:
@@ -92,8 +105,8 @@ def add_to_cart():
     except IntegrityError:
         db.session.rollback()
         return jsonify({"message": "Database integrity error. Please try again"}), 400
-    except Exception as e:
-        print(f"Error: {str(e)}")
+    except Exception:
+        logger.exception('Failed to add item to cart')
         db.session.rollback()
         return jsonify({"message": "An error occurred while adding item to cart"}), 500
 
@@ -104,13 +117,14 @@ def update_cart_item(item_id):
         user_id = get_jwt_identity()
         
         # Check if cart item exists and belongs to user
-        cart_item = CartItem.query.filter_by(id=item_id, user_id=user_id).first()
-        if not cart_item:
+        product_id = cart_store.find(user_id, item_id)
+        if product_id is None:
             return jsonify({
                 "message": f"Cart item with ID {item_id} not found in your cart"
             }), 404
         
         data = cart_item_schema.load(request.get_json(), partial=True)
+        reserved_product_id = None
         
         if 'quantity' in data:
             # Validate quantity
@@ -120,29 +134,45 @@ def update_cart_item(item_id):
                 }), 400
                 
             # Check stock availability
-            product = Product.query.get(cart_item.product_id)
+            product = Product.query.get(product_id)
             if not product:
                 return jsonify({
                     "message": "Product no longer exists"
                 }), 400
                 
-            if data['quantity'] > product.stock:
+            if inventory.reservations_enabled():
+                # Only the difference needs reserving or releasing
+                change = data['quantity'] - cart_store.quantities(user_id, [product_id]).get(product_id, 0)
+                if change > 0 and not inventory.reserve(user_id, product.id, change):
+                    db.session.rollback()
+                    return jsonify({
+                        "message": f"Not enough stock available. Only {product.stock} more items available"
+                    }), 400
+                if change < 0:
+                    inventory.release(user_id, product.id, -change)
+                if change:
+                    reserved_product_id = product.id
+            elif data['quantity'] > product.stock:
                 return jsonify({
                     "message": f"Not enough stock available. Only {product.stock} items available"
                 }), 400
                 
-            cart_item.quantity = data['quantity']
+            cart_store.write(user_id, {product_id: data['quantity']})
             
         db.session.commit()
+        if reserved_product_id:
+            category_facets.invalidate()
+            product_cache.invalidate(reserved_product_id)
+        cart_item = cart_store.lines(user_id, [product_id])[0]
         return jsonify({
             "message": "Cart item updated successfully",
-            "cart_item": cart_item_schema.dump(cart_item)
+            "cart_item": cart_item_serializer.dump(cart_item)
         })
         
     except ValidationError as err:
         return jsonify({"message": "Validation error", "errors": err.messages}), 400
-    except Exception as e:
-        print(f"Error: {str(e)}")
+    except Exception:
+        logger.exception('Failed to update cart item')
         db.session.rollback()
         return jsonify({"message": "An error occurred while updating cart item"}), 500
 
@@ -153,102 +183,239 @@ def remove_from_cart(item_id):
         user_id = get_jwt_identity()
         
         # Check if cart item exists and belongs to user
-        cart_item = CartItem.query.filter_by(id=item_id, user_id=user_id).first()
-        if not cart_item:
+        product_id = cart_store.find(user_id, item_id)
+        if product_id is None:
             return jsonify({
                 "message": f"Cart item with ID {item_id} not found in your cart"
             }), 404
         
-        db.session.delete(cart_item)
+        reserving = inventory.reservations_enabled()
+        if reserving:
+            inventory.release(user_id, product_id)
+        cart_store.write(user_id, {product_id: 0})
         db.session.commit()
+        if reserving:
+            category_facets.invalidate()
+            product_cache.invalidate(product_id)
         
         return jsonify({
             "message": "Item removed from cart successfully"
         }), 200
         
-    except Exception as e:
-        print(f"Error: {str(e)}")
+    except Exception:
+        logger.exception('Failed to remove item from cart')
         db.session.rollback()
         return jsonify({"message": "An error occurred while removing item from cart"}), 500
 
+def _plan_cart_operations(operations, quantities, products, reserving):
+    """
+    Work out a cart's {product_id: quantity} after applying `operations` in order.
+
+    Each operation is checked against the quantities the earlier ones left; one that
+    fails changes nothing and the rest still apply. Returns the new quantities and
+    one result per operation.
+    """
+    original = quantities
+    quantities = dict(quantities)
+    results = []
+    for index, operation in enumerate(operations):
+        product_id = operation['product_id']
+        current = quantities.get(product_id, 0)
+        result = {"index": index, "op": operation['op'], "product_id": product_id}
+        
+        if operation['op'] == 'remove':
+            if not current:
+                results.append({**result, "status": "error", "message": "Product is not in your cart"})
+                continue
+            new_quantity = 0
+        else:
+            product = products.get(product_id)
+            if not product:
+                results.append({**result, "status": "error", "message": f"Product with ID {product_id} does not exist"})
+                continue
+            if operation['op'] == 'add':
+                new_quantity = current + operation['quantity']
+            else:
+                new_quantity = operation['quantity']
+            # With reservations the cart's original units are already out of product.stock
+            available = product.stock + (original.get(product_id, 0) if reserving else 0)
+            if new_quantity > available:
+                results.append({**result, "status": "error", "message": f"Not enough stock available. Only {available} items available"})
+                continue
+        
+        quantities[product_id] = new_quantity
+        results.append({**result, "status": "ok", "quantity": new_quantity})
+    return quantities, results
+
+@bp.route('', methods=['PATCH'])
+@jwt_required()
+def update_cart():
+    try:
+        user_id = get_jwt_identity()
+        data = cart_batch_schema.load(request.get_json())
+        operations = data['operations']
+        
+        reserving = inventory.reservations_enabled()
+        if reserving:
+            inventory.release_expired()
+        
+        product_ids = {operation['product_id'] for operation in operations}
+        # One query checks stock for every product the batch touches
+        products = {
+            product.id: product
+            for product in Product.query.filter(Product.id.in_(product_ids)).all()
+        }
+        
+        before = cart_store.quantities(user_id)
+        after, results = _plan_cart_operations(operations, before, products, reserving)
+        if data['atomic'] and any(result["status"] == "error" for result in results):
+            db.session.rollback()
+            return jsonify({
+                "message": "No changes were made because some operations failed",
+                "results": results
+            }), 400
+        
+        changes = {
+            product_id: after.get(product_id, 0) - before.get(product_id, 0)
+            for product_id in product_ids
+            if after.get(product_id, 0) != before.get(product_id, 0)
+        }
+        if reserving and changes and not inventory.change_reservations(user_id, changes):
+            db.session.rollback()
+            return jsonify({
+                "message": "Stock changed while updating your cart, please retry"
+            }), 409
+        
+        if changes:
+            cart_store.write(user_id, {product_id: after.get(product_id, 0) for product_id in changes})
+        
+        # Every change in the batch lands in one transaction
+        db.session.commit()
+        if reserving and changes:
+            category_facets.invalidate()
+            product_cache.invalidate(*changes)
+        
+        return jsonify({
+            "cart_items": cart_items_serializer.dump(cart_store.lines(user_id)),
+            "results": results
+        })
+        
+    except ValidationError as err:
+        return jsonify({"message": "Validation error", "errors": err.messages}), 400
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({"message": "Database integrity error. Please try again"}), 400
+    except Exception:
+        logger.exception('Failed to apply cart operations')
+        db.session.rollback()
+        return jsonify({"message": "An error occurred while updating your cart"}), 500
+
 @bp.route('/checkout', methods=['POST'])
 @jwt_required()
 def checkout():
     try:
         user_id = get_jwt_identity()
         
-        # Get all cart items for the user
-        cart_items = CartItem.query.filter_by(user_id=user_id).all()
+        # Get the user's cart from the configured backend
+        cart = cart_store.quantities(user_id)
         
-        if not cart_items:
+        if not cart:
             return jsonify({"message": "Cart is empty"}), 400
             
+        # Load every product in the cart with a single query
+        product_ids = list(cart)
+        products = {
+            product.id: product
+            for product in Product.query.filter(Product.id.in_(product_ids)).all()
+        }
+        
+        # Units already reserved for this cart have left product.stock
+        reserved = {}
+        if inventory.reservations_enabled():
+            reserved = inventory.consume_reservations(user_id, product_ids)
+        
         # Calculate total amount
         total_amount = 0
         order_items_data = []
+        quantities = defaultdict(int)
         
-        for cart_item in cart_items:
-            product = Product.query.get(cart_item.product_id)
+        for product_id, quantity in cart.items():
+            product = products.get(product_id)
             if not product:
-                return jsonify({"message": f"Product {cart_item.product_id} not found"}), 400
+                db.session.rollback()
+                return jsonify({"message": f"Product {product_id} not found"}), 400
                 
-            if product.stock < cart_item.quantity:
-                return jsonify({"message": f"Not enough stock for {product.name}"}), 400
-                
-            item_total = product.price * cart_item.quantity
+            item_total = product.price * quantity
             total_amount += item_total
             
             order_items_data.append({
                 "product_id": product.id,
-                "quantity": cart_item.quantity,
-                "price": product.price
+                "quantity": quantity,
+                "price": product.price,
+                "category": product.category
             })
-            
-            # Update product stock
-            product.stock -= cart_item.quantity
+            quantities[product.id] += quantity
         
-        # Create payment intent
-        payment_intent = create_payment_intent(int(total_amount * 100))
-        if not payment_intent:
-            return jsonify({"message": "Payment processing failed"}), 500
+        # Take the unreserved remainder with conditional decrements so concurrent
+        # checkouts can't oversell, and hand back anything reserved but not bought
+        needed = {
+            product_id: quantity - reserved.get(product_id, 0)
+            for product_id, quantity in quantities.items()
+        }
+        if not inventory.take_stock(needed):
+            db.session.rollback()
+            shortages = inventory.find_shortages(needed)
+            names = ', '.join(product.name for _, product in shortages if product)
+            return jsonify({"message": f"Not enough stock for {names or 'items in your cart'}"}), 400
+        inventory.restore_stock({
+            product_id: -quantity for product_id, quantity in needed.items() if quantity < 0
+        })
+        sold_out = any(
+            products[product_id].stock - quantity <= 0
+            for product_id, quantity in needed.items()
+        )
         
-        # Create order
+        # Create order; it stays pending until the payment is confirmed
         order = Order(
             user_id=user_id,
             status='pending',
             total_amount=total_amount
         )
-        
         db.session.add(order)
-        db.session.commit()
+        db.session.flush()
         
-        # Create order items
+        # Insert all order items with one executemany
         for item_data in order_items_data:
-            order_item = OrderItem(
-                order_id=order.id,
-                product_id=item_data["product_id"],
-                quantity=item_data["quantity"],
-                price=item_data["price"]
-            )
-            db.session.add(order_item)
+            item_data["order_id"] = order.id
+        db.session.execute(OrderItem.__table__.insert(), order_items_data)
+        analytics.record_new_order(order, [
+            (item["product_id"], item["category"], item["quantity"], item["price"])
+            for item in order_items_data
+        ])
         
         # Clear the cart
-        for cart_item in cart_items:
-            db.session.delete(cart_item)
-            
-        db.session.commit()
+        cart_store.clear(user_id)
         
-        # After creating the payment intent
-        order.status = 'paid'  # Simulate successful payment
+        # Stock, order, items and cart all land in one transaction
+        # (a memory-backed cart is cleared once it commits)
         db.session.commit()
+        if sold_out:
+            category_facets.invalidate()
+        product_cache.invalidate(*product_ids)
+        
+        # The payment intent is created by a background worker, outside this transaction
+        payment_pipeline.submit(order.id, total_amount)
         
+        # Reload the committed order with its items and products in two queries
+        order = Order.query.options(*order_options()).filter_by(id=order.id).one()
         return jsonify({
-            "message": "Order created successfully",
-            "order": order_schema.dump(order),
-            "payment_intent": payment_intent
+            "message": "Order created successfully, payment is being processed",
+            "order": order_serializer.dump(order),
+            # Poll this for the intent's client secret once the worker has created it
+            "payment_url": url_for('order.get_order_payment', id=order.id)
         }), 201
         
-    except Exception as e:
-        print(f"Error: {str(e)}")
+    except Exception:
+        logger.exception('Checkout failed')
         db.session.rollback()
         return jsonify({"message": "An error occurred during checkout"}), 500
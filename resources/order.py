@@ -1,9 +1,19 @@
+import logging
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from marshmallow import ValidationError
 from app import db
-from models.order import Order, OrderItem
-from schemas import order_schema, orders_schema, OrderItemSchema
+from models.order import Order
+from schemas import order_create_schema, order_batch_schema
+from serializers import order_serializer
+from services.facets import category_facets
+from services.cache import product_cache
+from services import inventory
+from services import ordering
+from services.payments import PaymentError, payment_pipeline
+from services.projection import OrderProjection, InvalidProjection, order_options
+
+logger = logging.getLogger(__name__)
 
 bp = Blueprint('order', __name__, url_prefix='/orders')
 
@@ -12,41 +22,61 @@ bp = Blueprint('order', __name__, url_prefix='/orders')
 def create_order():
     try:
         user_id = get_jwt_identity()
-        data = order_schema.load(request.get_json())
+        projection = OrderProjection.from_args(request.args)
+        payload = request.get_json()
         
-        order = Order(
-            user_id=user_id,
-            status='pending',
-            total_amount=sum(item['price'] * item['quantity'] for item in data['items'])
-        )
+        # A body with "orders" creates a whole batch in one transaction
+        batch = isinstance(payload, dict) and 'orders' in payload
+        if batch:
+            requested = order_batch_schema.load(payload)['orders']
+        else:
+            requested = [order_create_schema.load(payload)]
         
-        db.session.add(order)
+        orders, errors, sold_out = ordering.create_orders(user_id, requested)
+        if errors:
+            db.session.rollback()
+            if not batch:
+                return jsonify({"message": "; ".join(errors[0])}), 400
+            return jsonify({"message": "No orders were created", "errors": errors}), 400
+        # Ids and totals are read before the commit expires every order
+        submitted = [(order.id, order.total_amount) for order in orders]
         db.session.commit()
+        if sold_out:
+            category_facets.invalidate()
+        product_cache.invalidate(*{item['product_id'] for order_data in requested for item in order_data['items']})
         
-        for item_data in data['items']:
-            order_item = OrderItem(
-                order_id=order.id,
-                product_id=item_data['product_id'],
-                quantity=item_data['quantity'],
-                price=item_data['price']
-            )
-            db.session.add(order_item)
+        # Like checkout, the payment intents are created in the background
+        for order_id, amount in submitted:
+            payment_pipeline.submit(order_id, amount)
         
-        db.session.commit()
-        return jsonify(order_schema.dump(order)), 201
+        orders = ordering.load_orders([order_id for order_id, _ in submitted], projection.options())
+        
+        if not batch:
+            return jsonify(projection.dump(orders[0])), 201
+        return jsonify({
+            "orders": projection.dump(orders, many=True),
+            "count": len(orders)
+        }), 201
     except ValidationError as err:
         return jsonify(err.messages), 400
+    except InvalidProjection as err:
+        return jsonify({"message": str(err)}), 400
 
 @bp.route('', methods=['GET'])
 @jwt_required()
 def get_orders():
     try:
         user_id = get_jwt_identity()
+        projection = OrderProjection.from_args(request.args)
         # Get all orders for the current user, ordered by creation date (newest first)
-        orders = Order.query.filter_by(user_id=user_id).order_by(Order.created_at.desc()).all()
-        return jsonify(orders_schema.dump(orders))
-    except Exception as e:
-        print(f"Error: {str(e)}")
+        orders = Order.query.options(*projection.options()).filter_by(
+            user_id=user_id
+        ).order_by(Order.created_at.desc()).all()
+        return jsonify(projection.dump(orders, many=True))
+    except InvalidProjection as err:
+        return jsonify({"message": str(err)}), 400
+    except Exception:
+        logger.exception('Failed to list orders')
         return jsonify({"message": "An error occurred"}), 500
 
 @bp.route('/<int:id>', methods=['GET'])
@@ -54,11 +84,43 @@ def get_orders():
 def get_order(id):
     try:
         user_id = get_jwt_identity()
+        projection = OrderProjection.from_args(request.args)
         # Get specific order, ensuring it belongs to the current user
-        order = Order.query.filter_by(id=id, user_id=user_id).first_or_404()
-        return jsonify(order_schema.dump(order))
-    except Exception as e:
-        print(f"Error: {str(e)}")
+        order = Order.query.options(*projection.options()).filter_by(id=id, user_id=user_id).first_or_404()
+        return jsonify(projection.dump(order))
+    except InvalidProjection as err:
+        return jsonify({"message": str(err)}), 400
+    except Exception:
+        logger.exception('Failed to fetch order')
+        return jsonify({"message": "An error occurred"}), 500
+
+@bp.route('/<int:id>/payment', methods=['GET'])
+@jwt_required()
+def get_order_payment(id):
+    try:
+        user_id = get_jwt_identity()
+        order = Order.query.filter_by(id=id, user_id=user_id).first()
+        if not order:
+            return jsonify({"message": "Order not found"}), 404
+        
+        payment = {
+            "order_id": order.id,
+            "status": order.status,
+            "payment_intent_id": order.payment_intent_id,
+            "client_secret": None
+        }
+        if order.status == 'pending':
+            if not order.payment_intent_id:
+                # The background worker hasn't created the intent yet; poll again
+                return jsonify(payment), 202
+            # Only a pending order still needs confirming by the client
+            payment["client_secret"] = payment_pipeline.client_secret(order)
+        return jsonify(payment)
+    except PaymentError as e:
+        logger.warning('Payment intent lookup failed for order %s: %s', id, e)
+        return jsonify({"message": "Payment provider unavailable"}), 502
+    except Exception:
+        logger.exception('Failed to fetch order payment')
         return jsonify({"message": "An error occurred"}), 500
 
 @bp.route('/<int:id>/cancel', methods=['POST'])
@@ -66,24 +128,29 @@ def get_order(id):
 def cancel_order(id):
     try:
         user_id = get_jwt_identity()
-        order = Order.query.filter_by(id=id, user_id=user_id).first_or_404()
+        # Restocking needs every item and its product, and so does the response
+        order = Order.query.options(*order_options()).filter_by(id=id, user_id=user_id).first_or_404()
         
         if order.status != 'pending':
             return jsonify({"message": "Only pending orders can be cancelled"}), 400
             
-        # Return items to stock
-        for item in order.items:
-            product = item.product
-            if product:
-                product.stock += item.quantity
+        # Return items to stock, unless a concurrent request got there first
+        restocked = any(item.product and item.product.stock <= 0 for item in order.items)
+        restocked_ids = [item.product_id for item in order.items]
+        if not inventory.cancel_order(order, 'pending'):
+            db.session.rollback()
+            return jsonify({"message": "Only pending orders can be cancelled"}), 400
         
-        order.status = 'cancelled'
         db.session.commit()
+        if restocked:
+            category_facets.invalidate()
+        if restocked_ids:
+            product_cache.invalidate(*restocked_ids)
         
         return jsonify({
             "message": "Order cancelled successfully",
-            "order": order_schema.dump(order)
+            "order": order_serializer.dump(order)
         })
-    except Exception as e:
-        print(f"Error: {str(e)}")
+    except Exception:
+        logger.exception('Failed to cancel order')
         return jsonify({"message": "An error occurred"}), 500
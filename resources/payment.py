@@ -0,0 +1,57 @@
+import logging
+from flask import Blueprint, request, jsonify
+from resources.stripe import construct_webhook_event
+from services.payments import FakeProvider, payment_pipeline
+
+logger = logging.getLogger(__name__)
+
+bp = Blueprint('payment', __name__, url_prefix='/payments')
+
+def _parse_event(event):
+    """(type, intent id, order id or None) from a webhook event; ValueError if malformed"""
+    if not isinstance(event, dict) or not isinstance(event.get('type'), str):
+        raise ValueError("event has no type")
+    data = event.get('data')
+    intent = data.get('object') if isinstance(data, dict) else None
+    if not isinstance(intent, dict) or not isinstance(intent.get('id'), str):
+        raise ValueError("event has no payment intent")
+    metadata = intent.get('metadata', {})
+    if not isinstance(metadata, dict):
+        raise ValueError("metadata must be an object")
+    order_id = metadata.get('order_id')
+    if order_id in (None, ''):
+        return event['type'], intent['id'], None
+    if isinstance(order_id, bool) or not str(order_id).isdigit():
+        raise ValueError("order_id must be an integer")
+    return event['type'], intent['id'], int(order_id)
+
+@bp.route('/webhook', methods=['POST'])
+def payment_webhook():
+    try:
+        if payment_pipeline.webhook_secret:
+            event = construct_webhook_event(
+                request.get_data(),
+                request.headers.get('Stripe-Signature', ''),
+                payment_pipeline.webhook_secret
+            )
+            if event is None:
+                return jsonify({"message": "Invalid signature"}), 400
+        elif payment_pipeline.provider.name == FakeProvider.name:
+            # Only the offline fake provider accepts unsigned events
+            event = request.get_json(silent=True)
+        else:
+            return jsonify({"message": "Webhook signing is not configured"}), 400
+
+        event_type, intent_id, order_id = _parse_event(event)
+        if event_type == 'payment_intent.succeeded':
+            payment_pipeline.mark_paid(intent_id, order_id)
+        elif event_type == 'payment_intent.payment_failed':
+            payment_pipeline.mark_failed(intent_id, order_id)
+            
+        return jsonify({"received": True})
+    except ValueError as e:
+        logger.warning('Invalid payment webhook: %s', e)
+        return jsonify({"message": "Invalid event"}), 400
+    except Exception:
+        logger.exception('Failed to handle payment webhook')
+        return jsonify({"message": "An error occurred while handling the webhook"}), 500
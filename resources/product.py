@@ -1,20 +1,24 @@
+import logging
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
 from app import db
 from models.product import Product
-from models.user import User
-from schemas import product_schema, products_schema
+from schemas import product_schema
+from serializers import product_serializer, products_serializer
 from marshmallow import ValidationError
 from sqlalchemy import or_
 from sqlalchemy.exc import IntegrityError
+from services.pagination import keyset_page, InvalidCursor
+from services import search as search_index
+from services.facets import category_facets
+from services.authorization import admin_required
+from services.cache import product_cache, cached_response
+
+logger = logging.getLogger(__name__)
 
 bp = Blueprint('product', __name__, url_prefix='/products')
 
-def is_admin():
-    """Helper function to check if current user is admin"""
-    current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
-    return user and user.is_admin
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
 
 @bp.route('', methods=['GET'])
 def get_products():
@@ -26,6 +30,8 @@ def get_products():
         max_price = request.args.get('max_price', type=float)
         sort_by = request.args.get('sort', 'name')
         order = request.args.get('order', 'asc')
+        limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+        cursor = request.args.get('cursor')
         
         # Validate price range
         if min_price is not None and min_price < 0:
@@ -36,7 +42,7 @@ def get_products():
             return jsonify({"message": "Minimum price cannot be greater than maximum price"}), 400
             
         # Validate sorting parameters
-        valid_sort_fields = ['name', 'price', 'created_at']
+        valid_sort_fields = ['name', 'price', 'created_at', 'relevance']
         if sort_by not in valid_sort_fields:
             return jsonify({
                 "message": f"Invalid sort field. Must be one of: {', '.join(valid_sort_fields)}"
@@ -44,11 +50,30 @@ def get_products():
             
         if order not in ['asc', 'desc']:
             return jsonify({"message": "Order must be 'asc' or 'desc'"}), 400
+            
+        if limit < 1 or limit > MAX_PAGE_SIZE:
+            return jsonify({"message": f"Limit must be between 1 and {MAX_PAGE_SIZE}"}), 400
+        
+        # Serve repeat listings straight from the cache
+        cache_key = tuple(sorted(request.args.items(multi=True)))
+        entry = product_cache.get_listing(cache_key)
+        if entry is not None:
+            return cached_response(entry)
+        generation = product_cache.generation
+        
+        # Relevance only means something for full-text matches
+        use_index = bool(search) and search_index.build_match_query(search) is not None and search_index.is_available()
+        if sort_by == 'relevance' and not use_index:
+            if not search:
+                return jsonify({"message": "Sorting by relevance requires a search term"}), 400
+            sort_by = 'name'
         
         # Build query
         query = Product.query
         
-        if search:
+        if use_index:
+            query = search_index.apply_search(query, search)
+        elif search:
             search_term = f"%{search}%"
             query = query.filter(
                 or_(
@@ -66,63 +91,89 @@ def get_products():
             query = query.filter(Product.price <= max_price)
         
         # Apply sorting
-        if sort_by == 'price':
+        key = None
+        if sort_by == 'relevance':
+            sort_column = search_index.rank
+            query = query.add_columns(sort_column.label('relevance'))
+            key = lambda row: (row.relevance, row.Product.id)
+        elif sort_by == 'price':
             sort_column = Product.price
         elif sort_by == 'created_at':
             sort_column = Product.created_at
         else:
             sort_column = Product.name
-            
-        if order == 'desc':
-            sort_column = sort_column.desc()
-            
-        query = query.order_by(sort_column)
         
         # Get categories for filtering
-        categories = db.session.query(Product.category).distinct().all()
-        categories = [cat[0] for cat in categories if cat[0]]
+        facets = category_facets.get()
+        categories = [facet["category"] for facet in facets]
         
-        # Execute query
-        products = query.all()
+        # Fetch a single page, using the product id as a stable tiebreaker
+        products, next_cursor, prev_cursor = keyset_page(
+            query,
+            sort_column,
+            Product.id,
+            descending=(order == 'desc'),
+            limit=limit,
+            cursor=cursor,
+            scope=f"{sort_by}:{order}",
+            key=key
+        )
+        if sort_by == 'relevance':
+            products = [row.Product for row in products]
         
+        response = {
+            "categories": categories,
+            "facets": facets,
+            "products": products_serializer.dump(products),
+            "count": len(products),
+            "limit": limit,
+            "next_cursor": next_cursor,
+            "prev_cursor": prev_cursor
+        }
         if not products:
-            return jsonify({
-                "message": "No products found matching your criteria",
-                "total": 0,
-                "products": []
-            })
+            response["message"] = "No products found matching your criteria"
         
-        return jsonify({
-            "total": len(products),
-            "categories": categories,
-            "products": products_schema.dump(products)
-        })
+        entry = product_cache.set_listing(cache_key, response, generation)
+        return cached_response(entry)
         
-    except Exception as e:
-        print(f"Error: {str(e)}")
+    except InvalidCursor as err:
+        return jsonify({"message": str(err)}), 400
+    except Exception:
+        logger.exception('Failed to list products')
         return jsonify({"message": "An error occurred while fetching products"}), 500
 
+@bp.route('/facets', methods=['GET'])
+def get_facets():
+    try:
+        return jsonify({"facets": category_facets.get()})
+    except Exception:
+        logger.exception('Failed to compute facets')
+        return jsonify({"message": "An error occurred while fetching facets"}), 500
+
 @bp.route('/<int:id>', methods=['GET'])
 def get_product(id):
     try:
+        entry = product_cache.get_product(id)
+        if entry is not None:
+            return cached_response(entry)
+        generation = product_cache.generation
+        
         product = Product.query.get(id)
         if not product:
             return jsonify({
                 "message": f"Product with ID {id} not found"
             }), 404
             
-        return jsonify(product_schema.dump(product))
-    except Exception as e:
-        print(f"Error: {str(e)}")
+        entry = product_cache.set_product(id, product_serializer.dump(product), generation)
+        return cached_response(entry)
+    except Exception:
+        logger.exception('Failed to fetch product')
         return jsonify({"message": "An error occurred while fetching the product"}), 500
 
 @bp.route('', methods=['POST'])
-@jwt_required()
+@admin_required
 def create_product():
     try:
-        if not is_admin():
-            return jsonify({"message": "Admin access required"}), 403
-            
         data = product_schema.load(request.get_json())
         
         # Additional validations
@@ -134,11 +185,15 @@ def create_product():
             
         product = Product(**data)
         db.session.add(product)
+        db.session.flush()
+        search_index.index_product(product)
         db.session.commit()
+        category_facets.invalidate()
+        product_cache.invalidate()
         
         return jsonify({
             "message": "Product created successfully",
-            "product": product_schema.dump(product)
+            "product": product_serializer.dump(product)
         }), 201
         
     except ValidationError as err:
@@ -146,18 +201,15 @@ def create_product():
     except IntegrityError:
         db.session.rollback()
         return jsonify({"message": "A product with this name already exists"}), 400
-    except Exception as e:
-        print(f"Error: {str(e)}")
+    except Exception:
+        logger.exception('Failed to create product')
         db.session.rollback()
         return jsonify({"message": "An error occurred while creating the product"}), 500
 
 @bp.route('/<int:id>', methods=['PUT'])
-@jwt_required()
+@admin_required
 def update_product(id):
     try:
-        if not is_admin():
-            return jsonify({"message": "Admin access required"}), 403
-            
         product = Product.query.get(id)
         if not product:
             return jsonify({
@@ -176,11 +228,14 @@ def update_product(id):
         for key, value in data.items():
             setattr(product, key, value)
             
+        search_index.index_product(product)
         db.session.commit()
+        category_facets.invalidate()
+        product_cache.invalidate(id)
         
         return jsonify({
             "message": "Product updated successfully",
-            "product": product_schema.dump(product)
+            "product": product_serializer.dump(product)
         })
         
     except ValidationError as err:
@@ -188,26 +243,26 @@ def update_product(id):
     except IntegrityError:
         db.session.rollback()
         return jsonify({"message": "A product with this name already exists"}), 400
-    except Exception as e:
-        print(f"Error: {str(e)}")
+    except Exception:
+        logger.exception('Failed to update product')
         db.session.rollback()
         return jsonify({"message": "An error occurred while updating the product"}), 500
 
 @bp.route('/<int:id>', methods=['DELETE'])
-@jwt_required()
+@admin_required
 def delete_product(id):
     try:
-        if not is_admin():
-            return jsonify({"message": "Admin access required"}), 403
-            
         product = Product.query.get(id)
         if not product:
             return jsonify({
                 "message": f"Product with ID {id} not found"
             }), 404
             
+        search_index.remove_product(product.id)
         db.session.delete(product)
         db.session.commit()
+        category_facets.invalidate()
+        product_cache.invalidate(id)
         
         return jsonify({
             "message": "Product deleted successfully"
@@ -218,8 +273,8 @@ def delete_product(id):
         return jsonify({
             "message": "Cannot delete product as it is referenced in orders or cart"
         }), 400
-    except Exception as e:
-        print(f"Error: {str(e)}")
+    except Exception:
+        logger.exception('Failed to delete product')
         db.session.rollback()
         return jsonify({"message": "An error occurred while deleting the product"}), 500
 
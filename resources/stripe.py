@@ -1,21 +1,49 @@
+import logging
 import stripe
 import os
 import dotenv
 
+logger = logging.getLogger(__name__)
+
 # Load environment variables from .env
 dotenv.load_dotenv()
 
 # Set API key
 stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
 
-def create_payment_intent(amount, currency='eur'):
+def set_timeout(seconds):
+    """Bound how long a single Stripe API call may take"""
+    stripe.default_http_client = stripe.RequestsClient(timeout=seconds)
+
+def create_payment_intent(amount, currency='eur', idempotency_key=None, metadata=None):
     try:
         payment_intent = stripe.PaymentIntent.create(
             amount=amount,
             currency=currency,
             payment_method_types=["card"],
+            metadata=metadata or {},
+            idempotency_key=idempotency_key
         )
         return payment_intent
     except Exception as e:
-        print(f"Stripe error: {str(e)}")
-        return None 
\ No newline at end of file
+        logger.warning('Stripe error: %s', e)
+        return None
+
+def retrieve_payment_intent(intent_id):
+    try:
+        return stripe.PaymentIntent.retrieve(intent_id)
+    except Exception as e:
+        logger.warning('Stripe error: %s', e)
+        return None
+
+def construct_webhook_event(payload, signature, secret):
+    """Verify a webhook payload against the endpoint's signing secret and parse it into a dict"""
+    try:
+        event = stripe.Webhook.construct_event(payload, signature, secret)
+        # StripeObject stopped subclassing dict in stripe 8, and to_dict() became recursive
+        if hasattr(event, 'to_dict_recursive'):
+            return event.to_dict_recursive()
+        return event.to_dict()
+    except Exception as e:
+        logger.warning('Stripe webhook verification failed: %s', e)
+        return None
@@ -1,5 +1,22 @@
+import sys
+import time
+import click
+from flask_migrate import stamp
 from app import create_app, db
 from models.user import User
+from models.product import Product
+from models.cart import CartItem
+from models.order import Order
+import schemas
+import serializers
+from services import search as search_index
+from services import inventory
+from services import analytics
+from services import query_plans
+from services import serialization
+from services import seeding
+from services.payments import payment_pipeline
+from services.projection import OrderProjection, order_options
 
 app = create_app()
 
@@ -7,8 +24,45 @@ app = create_app()
 def init_db():
     """Initialize the database."""
     db.create_all()
+    if db.engine.dialect.name == 'sqlite':
+        search_index.create_index()
+        db.session.commit()
+    # create_all already built the latest schema, so record it as migrated
+    stamp()
     print('Database initialized!')
 
+@app.cli.command("rebuild-search-index")
+def rebuild_search_index():
+    """Rebuild the product full-text search index."""
+    if db.engine.dialect.name != 'sqlite':
+        print('Full-text search index requires SQLite with FTS5')
+        return
+    count = search_index.rebuild_index()
+    print(f'Search index rebuilt with {count} products!')
+
+@app.cli.command("release-reservations")
+def release_reservations():
+    """Return stock held by expired cart reservations."""
+    count = inventory.release_expired()
+    db.session.commit()
+    # Other workers pick up the restored stock once their cached copies expire
+    print(f'Released {count} expired reservations!')
+
+@app.cli.command("sweep-payments")
+@click.option('--older-than', default=300, help='Seconds a pending order may go without a payment intent.')
+def sweep_payments(older_than):
+    """Resubmit pending orders whose payment intent was never created."""
+    futures = payment_pipeline.sweep(older_than)
+    # Wait here, or the workers would die with the command
+    attached = sum(1 for future in futures if future.result() is not None)
+    print(f'Resubmitted {len(futures)} orders, {attached} now have a payment intent!')
+
+@app.cli.command("backfill-analytics")
+def backfill_analytics():
+    """Rebuild the daily sales rollups from order history."""
+    count = analytics.backfill()
+    print(f'Analytics rebuilt with {count} rollup rows!')
+
 @app.cli.command("create-admin")
 def create_admin():
     """Create an admin user."""
@@ -22,5 +76,91 @@ def create_admin():
     db.session.commit()
     print('Admin user created!')
 
+@app.cli.command("seed")
+@click.option('--users', default=1000, help='Customer accounts to create.')
+@click.option('--products', default=10000, help='Products to create.')
+@click.option('--carts', default=200, help='Customers that get a filled cart.')
+@click.option('--orders', default=5000, help='Orders to create.')
+@click.option('--admins', default=1, help='Admin accounts to create.')
+@click.option('--popularity', default=1.1, help='Zipf exponent for product popularity; 0 is uniform.')
+@click.option('--order-sizes', default=None, help='Items per order histogram, e.g. "1:35,2:30,3:15,4:10,6:7,10:3".')
+@click.option('--days', default=365, help='Days of order history.')
+@click.option('--seed', 'random_seed', default=42, help='Random seed; the same seed gives the same data.')
+@click.option('--password', default=seeding.DEFAULT_PASSWORD, help='Password for every seeded user.')
+def seed(users, products, carts, orders, admins, popularity, order_sizes, days, random_seed, password):
+    """Fill the database with generated users, products, carts and orders."""
+    try:
+        histogram = seeding.parse_histogram(order_sizes) if order_sizes else None
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint='--order-sizes')
+    started = time.perf_counter()
+    counts = seeding.seed(users, products, carts, orders, admin_count=admins, order_sizes=histogram,
+                          popularity=popularity, days=days, seed=random_seed, password=password)
+    print(', '.join(f'{count} {table}' for table, count in counts.items()),
+          f'in {time.perf_counter() - started:.1f}s')
+    # Derived data is rebuilt wholesale, which beats maintaining it row by row
+    if db.engine.dialect.name == 'sqlite':
+        search_index.rebuild_index()
+    analytics.backfill()
+    print(f'Database seeded in {time.perf_counter() - started:.1f}s!')
+
+@app.cli.command("check-query-plans")
+def check_query_plans():
+    """Fail if a hot endpoint's queries scan a whole table."""
+    if db.engine.dialect.name != 'sqlite':
+        print('Query plan checks require SQLite')
+        sys.exit(1)
+    offenders, skipped = query_plans.check(app)
+    for path, statement, plan in offenders:
+        print(f'{path}:\n  {statement}')
+        for detail in plan:
+            print(f'    {detail}')
+    for path, reason in skipped:
+        print(f'{path}: skipped, {reason}')
+    if offenders:
+        print(f'{len(offenders)} queries fall back to a full table scan')
+    if skipped:
+        # An unchecked endpoint is not a passing one
+        print(f'{len(skipped)} endpoints could not be checked; seed the database first (flask seed)')
+    if offenders or skipped:
+        sys.exit(1)
+    print('All checked queries use an index!')
+
+@app.cli.command("check-serializers")
+@click.option('--limit', default=1000, help='Rows of each model to compare.')
+def check_serializers(limit):
+    """Compare the compiled serializers with marshmallow on stored data."""
+    checks = [
+        ('user', schemas.user_schema, serializers.user_serializer, User.query.limit(limit).all()),
+        ('product', schemas.product_schema, serializers.product_serializer, Product.query.limit(limit).all()),
+        ('product row', schemas.product_schema, serializers.product_serializer,
+         db.session.execute(Product.__table__.select().limit(limit)).all()),
+        ('cart item', schemas.cart_item_schema, serializers.cart_item_serializer, CartItem.query.limit(limit).all()),
+        ('order', schemas.order_schema, serializers.order_serializer,
+         Order.query.options(*order_options()).limit(limit).all()),
+    ]
+    # A sample of the ?fields= / ?expand= projections
+    orders = checks[-1][3]
+    for fields, expand in ((('id', 'status'), ()), (('id', 'total_amount'), ('items',))):
+        projection = OrderProjection(fields, expand)
+        checks.append((f'order {",".join(fields)} +{",".join(expand) or "none"}',
+                       projection.serializer().schema, projection.serializer(), orders))
+    failed = False
+    for name, schema, serializer, objects in checks:
+        if not objects:
+            # Nothing compared is not a match
+            failed = True
+            print(f'{name}: no rows to compare; seed the database first (flask seed)')
+            continue
+        mismatch = serialization.find_mismatch(schema, serializer, objects)
+        if mismatch:
+            failed = True
+            print(f'{name}: marshmallow gave {mismatch[0]}')
+            print(f'{" " * len(name)}  compiled gave {mismatch[1]}')
+        else:
+            print(f'{name}: {len(objects)} rows match')
+    if failed:
+        sys.exit(1)
+
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
@@ -1,4 +1,4 @@
-from marshmallow import Schema, fields, validate
+from marshmallow import Schema, fields, validate, validates_schema, ValidationError
 
 class UserSchema(Schema):
     id = fields.Int(dump_only=True)
@@ -24,6 +24,24 @@ class CartItemSchema(Schema):
     quantity = fields.Int(required=True, validate=validate.Range(min=1))
     product = fields.Nested(ProductSchema, dump_only=True)
 
+class CartOperationSchema(Schema):
+    op = fields.Str(required=True, validate=validate.OneOf(['add', 'set', 'remove']))
+    product_id = fields.Int(required=True)
+    quantity = fields.Int(validate=validate.Range(min=1))
+
+    @validates_schema
+    def validate_quantity(self, data, **kwargs):
+        if data.get('op') in ('add', 'set') and 'quantity' not in data:
+            raise ValidationError("Quantity is required for add and set", 'quantity')
+
+class CartBatchSchema(Schema):
+    operations = fields.List(
+        fields.Nested(CartOperationSchema),
+        required=True,
+        validate=validate.Length(min=1, max=100)
+    )
+    atomic = fields.Bool(load_default=False)
+
 class OrderItemSchema(Schema):
     id = fields.Int(dump_only=True)
     order_id = fields.Int(dump_only=True)
@@ -32,12 +50,29 @@ class OrderItemSchema(Schema):
     price = fields.Float(required=True, validate=validate.Range(min=0))
     product = fields.Nested(ProductSchema, dump_only=True)
 
+class OrderLineSchema(Schema):
+    product_id = fields.Int(required=True)
+    quantity = fields.Int(required=True, validate=validate.Range(min=1))
+    # Still accepted from older clients, but orders are priced from the catalog
+    price = fields.Float(load_only=True)
+
+class OrderCreateSchema(Schema):
+    items = fields.List(fields.Nested(OrderLineSchema), required=True, validate=validate.Length(min=1))
+
+class OrderBatchSchema(Schema):
+    orders = fields.List(
+        fields.Nested(OrderCreateSchema),
+        required=True,
+        validate=validate.Length(min=1, max=1000)
+    )
+
 class OrderSchema(Schema):
     id = fields.Int(dump_only=True)
     user_id = fields.Int(dump_only=True)
     status = fields.Str(validate=validate.OneOf(['pending', 'paid', 'shipped', 'delivered', 'cancelled']))
     total_amount = fields.Float(dump_only=True)
     created_at = fields.DateTime(dump_only=True)
+    payment_intent_id = fields.Str(dump_only=True)
     items = fields.Nested(OrderItemSchema, many=True)
 
 # Create instances for common use cases
@@ -47,5 +82,8 @@ product_schema = ProductSchema()
 products_schema = ProductSchema(many=True)
 cart_item_schema = CartItemSchema()
 cart_items_schema = CartItemSchema(many=True)
+cart_batch_schema = CartBatchSchema()
 order_schema = OrderSchema()
 orders_schema = OrderSchema(many=True)
+order_create_schema = OrderCreateSchema()
+order_batch_schema = OrderBatchSchema()
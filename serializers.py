@@ -0,0 +1,13 @@
+from schemas import (
+    UserSchema, ProductSchema, CartItemSchema, OrderSchema
+)
+from services.serialization import CompiledSerializer
+
+# Drop-in replacements for the schema instances' dump(), generated from schemas.py
+user_serializer = CompiledSerializer(UserSchema())
+product_serializer = CompiledSerializer(ProductSchema())
+products_serializer = CompiledSerializer(ProductSchema(many=True))
+cart_item_serializer = CompiledSerializer(CartItemSchema())
+cart_items_serializer = CompiledSerializer(CartItemSchema(many=True))
+order_serializer = CompiledSerializer(OrderSchema())
+orders_serializer = CompiledSerializer(OrderSchema(many=True))
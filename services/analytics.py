@@ -0,0 +1,210 @@
+from collections import defaultdict
+from sqlalchemy import String, cast, distinct, func, literal, select
+from sqlalchemy.dialects import postgresql, sqlite
+from app import db
+from models.analytics import SalesRollup
+from models.order import Order, OrderItem
+
+rollups = SalesRollup.__table__
+orders = Order.__table__
+order_items = OrderItem.__table__
+
+
+def _upsert_statement():
+    """INSERT ... ON CONFLICT that adds to an existing bucket instead of replacing it"""
+    if db.engine.dialect.name == 'postgresql':
+        insert = postgresql.insert(rollups)
+    else:
+        insert = sqlite.insert(rollups)
+    return insert.on_conflict_do_update(
+        index_elements=['dimension', 'day', 'key', 'status'],
+        set_={
+            "revenue": rollups.c.revenue + insert.excluded.revenue,
+            "units": rollups.c.units + insert.excluded.units,
+            "orders": rollups.c.orders + insert.excluded.orders
+        }
+    )
+
+
+def _buckets(lines):
+    """{(dimension, key): [revenue, units]} for one order's (product_id, category, quantity, price) lines"""
+    buckets = defaultdict(lambda: [0.0, 0])
+    for product_id, category, quantity, price in lines:
+        for dimension, key in (('product', str(product_id)), ('category', category or ''), ('total', '')):
+            bucket = buckets[(dimension, key)]
+            bucket[0] += price * quantity
+            bucket[1] += quantity
+    return buckets
+
+
+def _apply(day, status, lines, sign):
+    """
+    Add (sign=1) or remove (sign=-1) one order's contribution to its day's buckets.
+    `lines` is a list of (product_id, category, quantity, price).
+    """
+    buckets = _buckets(lines)
+
+    # Each bucket counts the order once, however many of its lines fell into it
+    rows = [
+        {
+            "dimension": dimension,
+            "day": day,
+            "key": key,
+            "status": status,
+            "revenue": sign * revenue,
+            "units": sign * units,
+            "orders": sign
+        }
+        for (dimension, key), (revenue, units) in buckets.items()
+    ]
+    if rows:
+        db.session.execute(_upsert_statement(), rows)
+
+
+def record_new_order(order, lines):
+    """Count a freshly created (flushed) order; `lines` as in _apply"""
+    _apply(order.created_at.date(), order.status, lines, 1)
+
+
+def record_new_orders(orders):
+    """Count many freshly created (flushed) orders with one upsert; `orders` is [(order, lines)]"""
+    totals = defaultdict(lambda: [0.0, 0, 0])
+    for order, lines in orders:
+        day = order.created_at.date()
+        for (dimension, key), (revenue, units) in _buckets(lines).items():
+            total = totals[(dimension, day, key, order.status)]
+            total[0] += revenue
+            total[1] += units
+            total[2] += 1
+
+    rows = [
+        {
+            "dimension": dimension,
+            "day": day,
+            "key": key,
+            "status": status,
+            "revenue": revenue,
+            "units": units,
+            "orders": count
+        }
+        for (dimension, day, key, status), (revenue, units, count) in totals.items()
+    ]
+    if rows:
+        db.session.execute(_upsert_statement(), rows)
+
+
+def record_order(order_id):
+    """Count a flushed order by reading its lines back from the database"""
+    day, status, lines = _snapshot(order_id)
+    if day is not None:
+        _apply(day, status, lines, 1)
+
+
+def _snapshot(order_id):
+    rows = db.session.execute(
+        select(
+            orders.c.created_at,
+            orders.c.status,
+            order_items.c.product_id,
+            order_items.c.category,
+            order_items.c.quantity,
+            order_items.c.price
+        ).select_from(
+            orders.join(order_items, order_items.c.order_id == orders.c.id)
+        ).where(orders.c.id == order_id)
+    ).all()
+    if not rows:
+        return None, None, []
+    return rows[0].created_at.date(), rows[0].status, [
+        (row.product_id, row.category, row.quantity, row.price) for row in rows
+    ]
+
+
+def record_transition(order_id, old_status, new_status):
+    """Move an order's totals from one status bucket to another"""
+    if old_status == new_status:
+        return
+    day, _, lines = _snapshot(order_id)
+    if day is None:
+        return
+    _apply(day, old_status, lines, -1)
+    _apply(day, new_status, lines, 1)
+
+
+def backfill():
+    """
+    Rebuild every rollup from order history with set-based INSERT ... SELECT statements.
+
+    Categories come from the order items, as recorded when each order was placed,
+    so the result matches what the incremental updates maintain.
+    """
+    db.session.execute(rollups.delete())
+
+    day = func.date(orders.c.created_at)
+    source = orders.join(order_items, order_items.c.order_id == orders.c.id)
+    dimensions = (
+        ('product', cast(order_items.c.product_id, String)),
+        ('category', func.coalesce(order_items.c.category, '')),
+        ('total', literal(''))
+    )
+    for dimension, key in dimensions:
+        db.session.execute(rollups.insert().from_select(
+            ['dimension', 'day', 'key', 'status', 'revenue', 'units', 'orders'],
+            select(
+                literal(dimension),
+                day,
+                key,
+                orders.c.status,
+                func.sum(order_items.c.price * order_items.c.quantity),
+                func.sum(order_items.c.quantity),
+                func.count(distinct(orders.c.id))
+            ).select_from(source).group_by(day, key, orders.c.status)
+        ))
+
+    db.session.commit()
+    return db.session.query(func.count(SalesRollup.id)).scalar()
+
+
+def query(dimension, date_from=None, date_to=None, statuses=None, interval=None, limit=None):
+    """Sum rollup buckets over a date range, grouped by key and status (and day if asked)"""
+    columns = [SalesRollup.key, SalesRollup.status]
+    if interval == 'day':
+        columns.insert(0, SalesRollup.day)
+
+    revenue = func.sum(SalesRollup.revenue).label('revenue')
+    q = db.session.query(
+        *columns,
+        revenue,
+        func.sum(SalesRollup.units).label('units'),
+        func.sum(SalesRollup.orders).label('orders')
+    ).filter(SalesRollup.dimension == dimension)
+
+    if date_from:
+        q = q.filter(SalesRollup.day >= date_from)
+    if date_to:
+        q = q.filter(SalesRollup.day < date_to)
+    if statuses:
+        q = q.filter(SalesRollup.status.in_(statuses))
+
+    # Buckets emptied by status changes stay behind with zero totals; hide them
+    q = q.group_by(*columns).having(func.sum(SalesRollup.orders) != 0)
+    if interval == 'day':
+        q = q.order_by(SalesRollup.day, revenue.desc())
+    else:
+        q = q.order_by(revenue.desc())
+    if limit:
+        q = q.limit(limit)
+
+    results = []
+    for row in q.all():
+        result = {
+            "key": row.key,
+            "status": row.status,
+            "revenue": round(row.revenue or 0, 2),
+            "units": row.units or 0,
+            "orders": row.orders or 0
+        }
+        if interval == 'day':
+            result["day"] = row.day.isoformat()
+        results.append(result)
+    return results
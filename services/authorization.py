@@ -0,0 +1,60 @@
+import threading
+import time
+from functools import wraps
+from flask import current_app, jsonify
+from flask_jwt_extended import create_access_token, get_jwt, get_jwt_identity, jwt_required
+from models.user import User
+
+
+def create_user_token(user):
+    """Issue an access token that carries the user's role as a claim"""
+    role = 'admin' if user.is_admin else 'customer'
+    return create_access_token(identity=str(user.id), additional_claims={"role": role})
+
+
+class AdminStatusCache:
+    """
+    Short-lived cache of which users are still admins.
+
+    The role claim lets customer requests be rejected without touching the database.
+    Admin claims are re-checked against the user table at most once per
+    ADMIN_STATUS_TTL seconds per user, so a demoted admin loses access within that
+    window even though their token is still valid.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._status = {}
+
+    def is_admin(self, user_id):
+        now = time.monotonic()
+        cached = self._status.get(user_id)
+        if cached and cached[1] > now:
+            return cached[0]
+
+        user = User.query.get(user_id)
+        is_admin = bool(user and user.is_admin)
+        with self._lock:
+            self._status[user_id] = (is_admin, now + current_app.config.get('ADMIN_STATUS_TTL', 60))
+        return is_admin
+
+    def revoke(self, user_id):
+        """Forget a user's cached status, e.g. right after changing their role"""
+        with self._lock:
+            self._status.pop(str(user_id), None)
+
+
+admin_status = AdminStatusCache()
+
+
+def admin_required(fn):
+    """Require a valid JWT whose user is an admin"""
+    @wraps(fn)
+    @jwt_required()
+    def wrapper(*args, **kwargs):
+        role = get_jwt().get('role')
+        # Tokens issued before role claims existed fall through to the cached lookup
+        if role not in (None, 'admin') or not admin_status.is_admin(get_jwt_identity()):
+            return jsonify({"message": "Admin access required"}), 403
+        return fn(*args, **kwargs)
+    return wrapper
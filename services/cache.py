@@ -0,0 +1,148 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from flask import current_app, json, request
+
+
+class CacheEntry:
+    """A serialized JSON response body with its validators"""
+
+    __slots__ = ('body', 'etag', 'last_modified', 'expires_at')
+
+    def __init__(self, body, ttl):
+        self.body = body
+        self.etag = hashlib.sha1(body).hexdigest()
+        self.last_modified = datetime.now(timezone.utc).replace(microsecond=0)
+        self.expires_at = time.monotonic() + ttl
+
+
+class LRUCache:
+    """Thread-safe LRU map whose entries also expire after a TTL"""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry.expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            self._data[key] = entry
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class ProductCache:
+    """
+    Read-through cache of serialized product and listing responses.
+
+    Single products are keyed by id; listings are keyed by their query string and are
+    all dropped whenever any product changes, since a write can move a product in or
+    out of any page. Invalidation is per process, so PRODUCT_CACHE_TTL bounds how long
+    other workers may serve a stale copy.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.hits = 0
+        self.misses = 0
+        # Bumped on every invalidation so a read that raced a write doesn't re-cache stale data
+        self.generation = 0
+        self._products = LRUCache(0, 0)
+        self._listings = LRUCache(0, 0)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('PRODUCT_CACHE_ENABLED', True)
+        size = app.config.get('PRODUCT_CACHE_SIZE', 1024)
+        ttl = app.config.get('PRODUCT_CACHE_TTL', 300)
+        self._products = LRUCache(size, ttl)
+        self._listings = LRUCache(size, ttl)
+
+    def get_product(self, id):
+        return self._count(self._products.get(id))
+
+    def set_product(self, id, payload, generation):
+        return self._store(self._products, id, payload, generation)
+
+    def get_listing(self, key):
+        return self._count(self._listings.get(key))
+
+    def set_listing(self, key, payload, generation):
+        return self._store(self._listings, key, payload, generation)
+
+    def invalidate(self, *product_ids):
+        """Drop the given products and every cached listing"""
+        self.generation += 1
+        for id in product_ids:
+            self._products.pop(id)
+        self._listings.clear()
+
+    def clear(self):
+        self.generation += 1
+        self._products.clear()
+        self._listings.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "products": len(self._products),
+            "listings": len(self._listings),
+            "max_size": self._products.maxsize,
+            "ttl": self._products.ttl
+        }
+
+    def _count(self, entry):
+        if not self.enabled:
+            return None
+        # Counters are best-effort; a lost increment under contention is harmless
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def _store(self, cache, key, payload, generation):
+        entry = CacheEntry((json.dumps(payload) + '\n').encode(), cache.ttl)
+        if self.enabled and generation == self.generation:
+            cache.set(key, entry)
+        return entry
+
+
+def cached_response(entry):
+    """Build a JSON response from a cache entry, answering 304 when the client's copy is current"""
+    response = current_app.response_class(entry.body, mimetype='application/json')
+    response.set_etag(entry.etag)
+    response.last_modified = entry.last_modified
+    return response.make_conditional(request)
+
+
+product_cache = ProductCache()
@@ -0,0 +1,429 @@
+import atexit
+import logging
+import threading
+import time
+from sqlalchemy import event
+from sqlalchemy.orm import Session, joinedload
+from app import db
+from models.cart import CartItem
+from models.product import Product
+
+try:
+    import redis
+except ImportError:  # pragma: no cover - redis is optional
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+cart_items = CartItem.__table__
+
+# Writes a non-SQL backend must only apply once the surrounding transaction commits
+_PENDING = 'cart_store_pending'
+
+
+def _defer(session, apply):
+    session.info.setdefault(_PENDING, []).append(apply)
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_pending(session):
+    for apply in session.info.pop(_PENDING, ()):
+        apply()
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def _drop_pending(session, transaction):
+    # Rolled back or closed without committing: the cart stays as it was
+    if transaction.parent is None:
+        session.info.pop(_PENDING, None)
+
+
+class CartLine:
+    """One product in a cart, shaped like a CartItem for the cart serializers"""
+
+    __slots__ = ('id', 'user_id', 'product_id', 'quantity', 'product')
+
+    def __init__(self, user_id, product_id, quantity, product=None):
+        # A product appears once per cart, so it doubles as the line's id
+        self.id = product_id
+        self.user_id = user_id
+        self.product_id = product_id
+        self.quantity = quantity
+        self.product = product
+
+
+class CartBackend:
+    """
+    Interface for cart storage.
+
+    Carts are {product_id: quantity}. write() takes the same shape, where a quantity
+    of 0 removes the product. Writes and clears take effect when the current
+    database transaction commits, so a cart never changes without the stock
+    reservations that go with it.
+    """
+
+    name = None
+
+    def quantities(self, user_id, product_ids=None):
+        raise NotImplementedError
+
+    def find(self, user_id, item_id):
+        """The product id of a cart line, or None if the user has no such line"""
+        raise NotImplementedError
+
+    def write(self, user_id, changes):
+        raise NotImplementedError
+
+    def clear(self, user_id):
+        raise NotImplementedError
+
+    def lines(self, user_id, product_ids=None):
+        """Cart lines with their products loaded, for responses"""
+        raise NotImplementedError
+
+
+class SQLCartBackend(CartBackend):
+    """Carts as CartItem rows, written in the request's own transaction"""
+
+    name = 'sql'
+
+    def _query(self, user_id, product_ids):
+        query = CartItem.query.filter(CartItem.user_id == user_id)
+        if product_ids is not None:
+            query = query.filter(CartItem.product_id.in_(list(product_ids)))
+        return query
+
+    def quantities(self, user_id, product_ids=None):
+        rows = self._query(user_id, product_ids).with_entities(CartItem.product_id, CartItem.quantity)
+        return {product_id: quantity for product_id, quantity in rows}
+
+    def find(self, user_id, item_id):
+        return db.session.query(CartItem.product_id).filter_by(id=item_id, user_id=user_id).scalar()
+
+    def write(self, user_id, changes):
+        existing = {item.product_id: item for item in self._query(user_id, changes).all()}
+        new_items = []
+        for product_id, quantity in changes.items():
+            cart_item = existing.get(product_id)
+            if cart_item and quantity <= 0:
+                db.session.delete(cart_item)
+            elif cart_item:
+                cart_item.quantity = quantity
+            elif quantity > 0:
+                new_items.append({"user_id": user_id, "product_id": product_id, "quantity": quantity})
+        # One executemany for every new line
+        if new_items:
+            db.session.execute(cart_items.insert(), new_items)
+
+    def clear(self, user_id):
+        CartItem.query.filter_by(user_id=user_id).delete(synchronize_session=False)
+
+    def lines(self, user_id, product_ids=None):
+        return self._query(user_id, product_ids).options(
+            joinedload(CartItem.product)
+        ).order_by(CartItem.id).all()
+
+
+class MemoryCartBackend(CartBackend):
+    """
+    Carts as Redis hashes, `cart:<user_id>` mapping product ids to quantities.
+
+    Works with a redis-py client or the in-process LocalRedis stand-in. Each cart
+    expires CART_TTL seconds after its last change. With write-behind enabled,
+    changed carts are copied to the cart_item table in the background, and a
+    cart that has expired from memory is reloaded from there on its next use.
+    """
+
+    name = 'memory'
+
+    # Field 0 (never a product id) keeps an emptied cart's hash in place, so an
+    # emptied cart is not mistaken for an expired one and reloaded from stale rows
+    SENTINEL = '0'
+
+    def __init__(self, client, ttl, write_behind=None):
+        self.client = client
+        self.ttl = ttl
+        self.write_behind = write_behind
+
+    def _key(self, user_id):
+        return f"cart:{int(user_id)}"
+
+    def read(self, user_id):
+        """The stored cart, or None if it isn't in memory"""
+        raw = self.client.hgetall(self._key(user_id))
+        if not raw:
+            return None
+        return {int(field): int(quantity) for field, quantity in raw.items() if int(field)}
+
+    def _store(self, user_id, quantities, removed=()):
+        key = self._key(user_id)
+        pipe = self.client.pipeline()
+        pipe.hset(key, mapping={self.SENTINEL: 1, **{str(product_id): quantity for product_id, quantity in quantities.items()}})
+        if removed:
+            pipe.hdel(key, *[str(product_id) for product_id in removed])
+        pipe.expire(key, self.ttl)
+        pipe.execute()
+
+    def quantities(self, user_id, product_ids=None):
+        cart = self.read(user_id)
+        if cart is None and self.write_behind:
+            cart = self.write_behind.load(user_id)
+            self._store(user_id, cart)
+        cart = cart or {}
+        if product_ids is None:
+            return cart
+        return {product_id: cart[product_id] for product_id in product_ids if product_id in cart}
+
+    def find(self, user_id, item_id):
+        return item_id if self.quantities(user_id, [item_id]) else None
+
+    def write(self, user_id, changes):
+        def apply():
+            self._store(
+                user_id,
+                {product_id: quantity for product_id, quantity in changes.items() if quantity > 0},
+                [product_id for product_id, quantity in changes.items() if quantity <= 0]
+            )
+            if self.write_behind:
+                self.write_behind.mark(user_id)
+        _defer(db.session, apply)
+
+    def clear(self, user_id):
+        def apply():
+            key = self._key(user_id)
+            pipe = self.client.pipeline()
+            pipe.delete(key)
+            pipe.hset(key, mapping={self.SENTINEL: 1})
+            pipe.expire(key, self.ttl)
+            pipe.execute()
+            if self.write_behind:
+                self.write_behind.mark(user_id)
+        _defer(db.session, apply)
+
+    def lines(self, user_id, product_ids=None):
+        cart = self.quantities(user_id, product_ids)
+        if not cart:
+            return []
+        products = {
+            product.id: product
+            for product in Product.query.filter(Product.id.in_(list(cart))).all()
+        }
+        return [
+            CartLine(int(user_id), product_id, cart[product_id], products.get(product_id))
+            for product_id in sorted(cart)
+        ]
+
+
+class LocalRedis:
+    """
+    In-process stand-in for the Redis hash and expiry commands the memory backend
+    uses, for tests and single-process deployments. Expired keys are dropped when
+    next touched and swept out periodically.
+    """
+
+    SWEEP_INTERVAL = 60
+
+    def __init__(self):
+        self._data = {}
+        self._expires = {}
+        self._lock = threading.RLock()
+        self._next_sweep = time.monotonic() + self.SWEEP_INTERVAL
+
+    def _live(self, key, now=None):
+        expires_at = self._expires.get(key)
+        if expires_at is not None and expires_at <= (now or time.monotonic()):
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+        return self._data.get(key)
+
+    def _sweep(self):
+        now = time.monotonic()
+        if now < self._next_sweep:
+            return
+        self._next_sweep = now + self.SWEEP_INTERVAL
+        for key in [key for key, expires_at in self._expires.items() if expires_at <= now]:
+            self._live(key, now)
+
+    def hgetall(self, key):
+        with self._lock:
+            return dict(self._live(key) or {})
+
+    def hset(self, key, mapping):
+        with self._lock:
+            self._sweep()
+            fields = self._live(key)
+            if fields is None:
+                fields = self._data[key] = {}
+            added = sum(1 for field in mapping if str(field) not in fields)
+            fields.update({str(field): str(value) for field, value in mapping.items()})
+            return added
+
+    def hdel(self, key, *fields):
+        with self._lock:
+            stored = self._live(key)
+            if not stored:
+                return 0
+            removed = sum(1 for field in fields if stored.pop(str(field), None) is not None)
+            if not stored:
+                self.delete(key)
+            return removed
+
+    def expire(self, key, seconds):
+        with self._lock:
+            if self._live(key) is None:
+                return False
+            self._expires[key] = time.monotonic() + seconds
+            return True
+
+    def delete(self, *keys):
+        with self._lock:
+            deleted = 0
+            for key in keys:
+                deleted += self._live(key) is not None
+                self._data.pop(key, None)
+                self._expires.pop(key, None)
+            return deleted
+
+    def pipeline(self, transaction=True):
+        return _LocalPipeline(self)
+
+
+class _LocalPipeline:
+    """Queues LocalRedis commands and runs them together under its lock"""
+
+    def __init__(self, client):
+        self._client = client
+        self._commands = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self._commands.append((getattr(self._client, name), args, kwargs))
+            return self
+        return queue
+
+    def execute(self):
+        with self._client._lock:
+            results = [command(*args, **kwargs) for command, args, kwargs in self._commands]
+        self._commands = []
+        return results
+
+
+class CartWriteBehind:
+    """
+    Copies changed in-memory carts to the cart_item table every
+    CART_WRITE_BEHIND_INTERVAL seconds, one transaction per flush, so carts survive
+    restarts and memory eviction without a database write on every change.
+    """
+
+    def __init__(self, app, interval):
+        self.app = app
+        self.interval = interval
+        self.backend = None
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self, backend):
+        self.backend = backend
+        self._thread = threading.Thread(target=self._run, name='cart-write-behind', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def mark(self, user_id):
+        with self._lock:
+            self._dirty.add(int(user_id))
+
+    def load(self, user_id):
+        rows = db.session.query(CartItem.product_id, CartItem.quantity).filter(CartItem.user_id == user_id)
+        return {product_id: quantity for product_id, quantity in rows}
+
+    def flush(self):
+        """Write every cart changed since the last flush; returns how many were written"""
+        with self._lock:
+            user_ids, self._dirty = self._dirty, set()
+        if not user_ids:
+            return 0
+
+        rows = []
+        for user_id in user_ids:
+            # Carts that expired before being flushed keep their last written rows
+            cart = self.backend.read(user_id)
+            if cart is None:
+                continue
+            rows += [
+                {"user_id": user_id, "product_id": product_id, "quantity": quantity}
+                for product_id, quantity in cart.items()
+            ]
+
+        with self.app.app_context():
+            try:
+                db.session.execute(cart_items.delete().where(cart_items.c.user_id.in_(list(user_ids))))
+                if rows:
+                    db.session.execute(cart_items.insert(), rows)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                with self._lock:
+                    self._dirty |= user_ids
+                logger.exception('Cart write-behind failed, will retry')
+                return 0
+            finally:
+                db.session.remove()
+        return len(user_ids)
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.flush()
+
+    def stop(self):
+        self._stopped.set()
+        self.flush()
+
+
+class CartStore:
+    """The configured cart backend (CART_BACKEND), used by the cart endpoints and checkout"""
+
+    def __init__(self):
+        self.backend = SQLCartBackend()
+        self.write_behind = None
+
+    def init_app(self, app):
+        name = app.config.get('CART_BACKEND', 'sql')
+        if name == SQLCartBackend.name:
+            self.backend = SQLCartBackend()
+            return
+        if name != MemoryCartBackend.name:
+            raise ValueError(f"Unknown CART_BACKEND {name!r}; use 'sql' or 'memory'")
+
+        url = app.config.get('CART_REDIS_URL')
+        if url:
+            if redis is None:
+                raise RuntimeError("CART_REDIS_URL is set but the redis package is not installed")
+            client = redis.Redis.from_url(url)
+        else:
+            client = LocalRedis()
+
+        interval = app.config.get('CART_WRITE_BEHIND_INTERVAL', 0)
+        self.write_behind = CartWriteBehind(app, interval) if interval > 0 else None
+        self.backend = MemoryCartBackend(client, app.config.get('CART_TTL', 7 * 24 * 3600), self.write_behind)
+        if self.write_behind:
+            self.write_behind.start(self.backend)
+
+    def quantities(self, user_id, product_ids=None):
+        return self.backend.quantities(user_id, product_ids)
+
+    def find(self, user_id, item_id):
+        return self.backend.find(user_id, item_id)
+
+    def write(self, user_id, changes):
+        self.backend.write(user_id, changes)
+
+    def clear(self, user_id):
+        self.backend.clear(user_id)
+
+    def lines(self, user_id, product_ids=None):
+        return self.backend.lines(user_id, product_ids)
+
+
+cart_store = CartStore()
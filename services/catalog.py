@@ -0,0 +1,209 @@
+import csv
+import io
+import json
+from marshmallow import ValidationError
+from sqlalchemy import bindparam, func, select
+from sqlalchemy.exc import IntegrityError
+from app import db
+from models.product import Product
+from schemas import product_schema
+from serializers import products_serializer
+from services import serialization
+from services import search as search_index
+
+products = Product.__table__
+
+EXPORT_COLUMNS = ['id', 'name', 'description', 'price', 'stock', 'image_url', 'category', 'created_at']
+
+# Keep the per-row error report bounded no matter how bad the feed is
+MAX_REPORTED_ERRORS = 1000
+
+
+def iter_rows(stream, format):
+    """Yield (line number, dict) pairs from an NDJSON or CSV byte stream without buffering it"""
+    text = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+    if format == 'csv':
+        reader = csv.DictReader(text)
+        for row in reader:
+            # Empty CSV cells mean "not provided" rather than an empty string
+            yield reader.line_num, {key: value for key, value in row.items() if key and value != ''}
+        return
+
+    for line_number, line in enumerate(text, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield line_number, None
+            continue
+        yield line_number, row
+
+
+def _batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def import_products(rows, batch_size):
+    """
+    Validate and upsert products in chunks, one transaction per chunk.
+
+    Rows with an `id` that already exists update that product; every other row is
+    inserted (keeping its `id` if one was given, so an export can be re-imported,
+    after which a PostgreSQL id sequence is moved past the imported ids).
+    Returns a report with counts and the first MAX_REPORTED_ERRORS row errors.
+    """
+    report = {"inserted": 0, "updated": 0, "failed": 0, "errors": []}
+
+    for batch in _batches(rows, batch_size):
+        valid = []
+        seen = set()
+        for line_number, row in batch:
+            if not isinstance(row, dict):
+                _reject(report, line_number, {"_schema": ["Row is not a JSON object"]})
+                continue
+            # Nulls (as written by the export) mean "not provided", like empty CSV cells
+            row = {key: value for key, value in row.items() if value is not None}
+            id = row.pop('id', None)
+            row.pop('created_at', None)
+            try:
+                data = product_schema.load(row)
+                if id is not None:
+                    data['id'] = int(id)
+            except ValidationError as err:
+                _reject(report, line_number, err.messages)
+                continue
+            except (TypeError, ValueError):
+                _reject(report, line_number, {"id": ["Not a valid integer."]})
+                continue
+            if 'id' in data:
+                if data['id'] in seen:
+                    _reject(report, line_number, {"id": ["Duplicate id in the same batch."]})
+                    continue
+                seen.add(data['id'])
+            valid.append((line_number, data))
+
+        if not valid:
+            continue
+
+        try:
+            inserted, updated = _upsert([data for _, data in valid])
+        except IntegrityError as err:
+            db.session.rollback()
+            for line_number, _ in valid:
+                _reject(report, line_number, {"_schema": [f"Batch rejected by the database: {err.orig}"]})
+            continue
+
+        report["inserted"] += inserted
+        report["updated"] += updated
+
+    return report
+
+
+def _upsert(valid):
+    """Write one validated chunk and commit it; returns (inserted, updated)"""
+    ids = [data['id'] for data in valid if 'id' in data]
+    existing = set()
+    if ids:
+        existing = {
+            id for (id,) in db.session.execute(
+                select(products.c.id).where(products.c.id.in_(ids))
+            )
+        }
+
+    inserts = [data for data in valid if data.get('id') not in existing]
+    updates = [data for data in valid if data.get('id') in existing]
+
+    # Rows inserted without an id get one from the database; anything above the
+    # current maximum afterwards was written by this chunk (or harmlessly, by a
+    # concurrent writer) and needs indexing
+    watermark = None
+    if any('id' not in data for data in inserts):
+        watermark = db.session.execute(select(func.coalesce(func.max(products.c.id), 0))).scalar()
+
+    # Core executemany statements skip ORM object construction entirely; rows are
+    # grouped by their column set so each group is a single statement
+    for columns, group in _group_by_columns(inserts):
+        db.session.execute(products.insert(), group)
+    if any('id' in data for data in inserts):
+        _sync_id_sequence()
+    for columns, group in _group_by_columns(updates):
+        statement = products.update().where(products.c.id == bindparam('_id')).values(
+            {column: bindparam(column) for column in columns if column != 'id'}
+        )
+        db.session.execute(statement, [dict(data, _id=data['id']) for data in group])
+
+    if watermark is not None:
+        ids += [
+            id for (id,) in db.session.execute(
+                select(products.c.id).where(products.c.id > watermark)
+            )
+        ]
+    search_index.index_products(ids)
+    db.session.commit()
+
+    return len(inserts), len(updates)
+
+
+def _sync_id_sequence():
+    """
+    Move the id sequence past ids inserted explicitly, so the next product created
+    without one doesn't collide with them. SQLite and MySQL do this on their own.
+    """
+    if db.engine.dialect.name != 'postgresql':
+        return
+    sequence = func.pg_get_serial_sequence(products.name, products.c.id.name)
+    # nextval() keeps the sequence from moving backwards past a concurrent writer's ids
+    db.session.execute(select(func.setval(sequence, func.greatest(
+        select(func.max(products.c.id)).scalar_subquery(),
+        func.nextval(sequence)
+    ))))
+
+
+def _reject(report, line_number, messages):
+    report["failed"] += 1
+    if len(report["errors"]) < MAX_REPORTED_ERRORS:
+        report["errors"].append({"row": line_number, "errors": messages})
+
+
+def _group_by_columns(rows):
+    groups = {}
+    for row in rows:
+        groups.setdefault(tuple(sorted(row)), []).append(row)
+    return groups.items()
+
+
+def export_products(format, batch_size):
+    """Yield the catalog as NDJSON or CSV text, reading it in id-ordered batches"""
+    if format == 'csv':
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS, extrasaction='ignore')
+        writer.writeheader()
+        yield buffer.getvalue()
+
+    last_id = 0
+    while True:
+        # Core rows aren't tracked by the session, so memory stays flat across batches
+        batch = db.session.execute(
+            select(products).where(products.c.id > last_id).order_by(products.c.id).limit(batch_size)
+        ).all()
+        if not batch:
+            return
+        last_id = batch[-1].id
+        dumped = products_serializer.dump(batch)
+
+        if format == 'csv':
+            buffer = io.StringIO()
+            writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS, extrasaction='ignore')
+            writer.writerows(dumped)
+            yield buffer.getvalue()
+        else:
+            yield ''.join(serialization.dumps(row) + '\n' for row in dumped)
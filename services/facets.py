@@ -0,0 +1,66 @@
+import threading
+import time
+from flask import current_app
+from sqlalchemy import case, func
+from app import db
+from models.product import Product
+
+
+class CategoryFacets:
+    """
+    In-process cache of per-category product counts.
+
+    The counts are rebuilt with one GROUP BY query when the cache is empty or older
+    than FACET_CACHE_TTL seconds. Writers call invalidate() after committing so the
+    local process sees changes immediately; the TTL bounds staleness across workers.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._facets = None
+        self._expires_at = 0
+        # Bumped on every invalidation so a load that raced a write doesn't re-cache stale counts
+        self.generation = 0
+
+    def get(self):
+        facets, expires_at = self._facets, self._expires_at
+        if facets is not None and time.monotonic() < expires_at:
+            return facets
+
+        with self._lock:
+            # Another thread may have refreshed while we waited for the lock
+            if self._facets is not None and time.monotonic() < self._expires_at:
+                return self._facets
+            generation = self.generation
+            facets = self._load()
+            if generation == self.generation:
+                self._facets = facets
+                self._expires_at = time.monotonic() + current_app.config.get('FACET_CACHE_TTL', 60)
+            return facets
+
+    def invalidate(self):
+        self.generation += 1
+        self._facets = None
+
+    def stock_changed(self, before, after):
+        """Invalidate only when a product moves in or out of stock"""
+        if (before > 0) != (after > 0):
+            self.invalidate()
+
+    def _load(self):
+        rows = db.session.query(
+            Product.category,
+            func.count(Product.id),
+            func.sum(case((Product.stock > 0, 1), else_=0))
+        ).filter(
+            Product.category.isnot(None),
+            Product.category != ''
+        ).group_by(Product.category).order_by(Product.category).all()
+
+        return [
+            {"category": category, "count": count, "in_stock": in_stock or 0}
+            for category, count, in_stock in rows
+        ]
+
+
+category_facets = CategoryFacets()
@@ -0,0 +1,407 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import bindparam, select
+from app import db
+from models.order import Order
+from models.product import Product
+from models.reservation import StockReservation
+from services import analytics
+
+products = Product.__table__
+reservations = StockReservation.__table__
+
+# The stock check and the decrement happen in one statement, so concurrent buyers
+# can never both pass the check for the last unit
+_take = products.update().where(
+    products.c.id == bindparam('product_id')
+).where(
+    products.c.stock >= bindparam('quantity')
+).values(stock=products.c.stock - bindparam('quantity'))
+
+_restore = products.update().where(
+    products.c.id == bindparam('product_id')
+).values(stock=products.c.stock + bindparam('quantity'))
+
+_set = products.update().where(
+    products.c.id == bindparam('product_id')
+).values(stock=bindparam('stock'))
+
+# Deltas keep their own guard so a concurrent checkout can't push stock below zero
+_adjust = products.update().where(
+    products.c.id == bindparam('product_id')
+).where(
+    products.c.stock + bindparam('delta') >= 0
+).values(stock=products.c.stock + bindparam('delta'))
+
+# Reservation rows are claimed only if they still hold what was read, so a checkout
+# and the expiry sweep can't both count the same reserved units
+_claim = reservations.delete().where(
+    reservations.c.id == bindparam('reservation_id')
+).where(
+    reservations.c.quantity == bindparam('held')
+)
+
+_shrink = reservations.update().where(
+    reservations.c.id == bindparam('reservation_id')
+).where(
+    reservations.c.quantity == bindparam('held')
+).values(quantity=reservations.c.quantity - bindparam('released'))
+
+
+def reservations_enabled():
+    return current_app.config.get('STOCK_RESERVATIONS_ENABLED', False)
+
+
+def _rows(quantities):
+    return [
+        {"product_id": product_id, "quantity": quantity}
+        for product_id, quantity in quantities.items()
+        if quantity > 0
+    ]
+
+
+def take_stock(quantities):
+    """
+    Decrement stock for {product_id: quantity} only where enough is left.
+
+    Returns False if any product was short. Successful decrements are not undone,
+    so the caller must roll back the transaction in that case.
+    """
+    rows = _rows(quantities)
+    if not rows:
+        return True
+
+    # Each row matches at most one product, so the summed rowcount of a single
+    # executemany tells us whether every decrement applied
+    if db.engine.dialect.supports_sane_multi_rowcount:
+        return db.session.execute(_take, rows).rowcount == len(rows)
+
+    for row in rows:
+        if db.session.execute(_take, row).rowcount != 1:
+            return False
+    return True
+
+
+def restore_stock(quantities):
+    """Return stock for {product_id: quantity}, e.g. after a cancellation"""
+    rows = _rows(quantities)
+    if rows:
+        db.session.execute(_restore, rows)
+
+
+def find_shortages(quantities):
+    """Products from {product_id: quantity} that are missing or don't have enough stock"""
+    found = {
+        product.id: product
+        for product in Product.query.filter(Product.id.in_(list(quantities))).all()
+    }
+    return [
+        (product_id, found.get(product_id))
+        for product_id, quantity in quantities.items()
+        if product_id not in found or found[product_id].stock < quantity
+    ]
+
+
+def cancel_order(order, from_status):
+    """
+    Move an order to 'cancelled' and put its items back in stock.
+
+    The status change is conditional on the order still being in `from_status`,
+    so two concurrent cancels can't both restock it.
+    Returns False if the order was no longer cancellable.
+    """
+    cancelled = Order.query.filter(
+        Order.id == order.id,
+        Order.status == from_status
+    ).update({"status": "cancelled"}, synchronize_session=False)
+    if cancelled != 1:
+        return False
+
+    quantities = defaultdict(int)
+    for item in order.items:
+        quantities[item.product_id] += item.quantity
+    restore_stock(quantities)
+    analytics.record_transition(order.id, from_status, 'cancelled')
+    return True
+
+
+def _expiry():
+    return datetime.utcnow() + timedelta(seconds=current_app.config.get('STOCK_RESERVATION_TTL', 900))
+
+
+def reserve(user_id, product_id, quantity):
+    """Hold `quantity` more units of a product for a user's cart until the reservation expires"""
+    if not take_stock({product_id: quantity}):
+        return False
+
+    reservation = StockReservation.query.filter_by(
+        user_id=user_id,
+        product_id=product_id
+    ).with_for_update().first()
+
+    if reservation:
+        reservation.quantity += quantity
+        reservation.expires_at = _expiry()
+    else:
+        db.session.add(StockReservation(
+            user_id=user_id,
+            product_id=product_id,
+            quantity=quantity,
+            expires_at=_expiry()
+        ))
+    return True
+
+
+def _delete_held(held, *criteria):
+    """
+    Delete reservations that were read earlier, with any extra `criteria`, and
+    return [(product_id, quantity)] for only the rows this transaction removed.
+
+    Uses DELETE ... RETURNING where the dialect has it, and otherwise one
+    conditional DELETE per reservation with its rowcount checked.
+    """
+    if not held:
+        return []
+
+    if db.engine.dialect.full_returning:
+        return db.session.execute(reservations.delete().where(
+            reservations.c.id.in_([reservation.id for reservation in held]),
+            *criteria
+        ).returning(reservations.c.product_id, reservations.c.quantity)).all()
+
+    statement = _claim.where(*criteria)
+    return [
+        (reservation.product_id, reservation.quantity)
+        for reservation in held
+        if db.session.execute(statement, {
+            "reservation_id": reservation.id,
+            "held": reservation.quantity
+        }).rowcount == 1
+    ]
+
+
+def _totals(rows):
+    quantities = defaultdict(int)
+    for product_id, quantity in rows:
+        quantities[product_id] += quantity
+    return dict(quantities)
+
+
+def _release_held(releases):
+    """
+    Give back stock for [(reservation, quantity)] pairs, deleting a reservation once
+    all of it is released. Each change is conditional on the reservation still holding
+    what was read, and only the changes that applied are restocked.
+    """
+    released = {}
+    for reservation, quantity in releases:
+        if quantity >= reservation.quantity:
+            applied = _totals(_delete_held([reservation]))
+        elif db.session.execute(_shrink, {
+            "reservation_id": reservation.id,
+            "held": reservation.quantity,
+            "released": quantity
+        }).rowcount == 1:
+            applied = {reservation.product_id: quantity}
+        else:
+            applied = {}
+        released.update(applied)
+    restore_stock(released)
+    return released
+
+
+def release(user_id, product_id, quantity=None):
+    """Give back part (or all) of a user's reservation on a product"""
+    reservation = StockReservation.query.filter_by(
+        user_id=user_id,
+        product_id=product_id
+    ).with_for_update().first()
+    if not reservation:
+        return
+
+    if quantity is None:
+        quantity = reservation.quantity
+    _release_held([(reservation, quantity)])
+
+
+def change_reservations(user_id, changes):
+    """
+    Reserve (positive) or release (negative) units of several products in a user's
+    cart at once, from {product_id: change}.
+
+    Costs one conditional stock executemany, one locking SELECT of the user's
+    reservations, one insert executemany and one restore executemany, however
+    many products change, plus one conditional statement per released product.
+    Returns False if any product was short; the caller must roll back then.
+    """
+    if not take_stock({product_id: change for product_id, change in changes.items() if change > 0}):
+        return False
+
+    held = {
+        reservation.product_id: reservation
+        for reservation in StockReservation.query.filter(
+            StockReservation.user_id == user_id,
+            StockReservation.product_id.in_(list(changes))
+        ).with_for_update().all()
+    }
+    releases = []
+    new_reservations = []
+    expires_at = _expiry()
+    for product_id, change in changes.items():
+        reservation = held.get(product_id)
+        if change > 0 and reservation:
+            reservation.quantity += change
+            reservation.expires_at = expires_at
+        elif change > 0:
+            new_reservations.append({
+                "user_id": user_id,
+                "product_id": product_id,
+                "quantity": change,
+                "expires_at": expires_at,
+                "created_at": datetime.utcnow()
+            })
+        elif change < 0 and reservation:
+            releases.append((reservation, -change))
+    if new_reservations:
+        db.session.execute(reservations.insert(), new_reservations)
+    _release_held(releases)
+    return True
+
+
+def consume_reservations(user_id, product_ids):
+    """
+    Turn a user's reservations into a sale at checkout.
+
+    The reserved units have already left `Product.stock`, so the reservations are
+    simply deleted and their quantities returned as {product_id: quantity}.
+    Expired reservations that haven't been swept yet still hold stock and count too,
+    but a reservation the sweep deleted first is not counted.
+    """
+    held = StockReservation.query.filter(
+        StockReservation.user_id == user_id,
+        StockReservation.product_id.in_(product_ids)
+    ).with_for_update().all()
+    return _totals(_delete_held(held))
+
+
+def release_expired(now=None):
+    """Return stock held by expired reservations; returns how many were released"""
+    now = now or datetime.utcnow()
+    expired = StockReservation.query.filter(
+        StockReservation.expires_at <= now
+    ).with_for_update().all()
+
+    # Only what this sweep deleted is restocked; a checkout may have consumed
+    # (or a cart extended) a reservation since it was read
+    claimed = _delete_held(expired, reservations.c.expires_at <= now)
+    restore_stock(_totals(claimed))
+    return len(claimed)
+
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _adjust_chunk(chunk, batched):
+    """
+    Apply one chunk of validated stock changes without committing.
+
+    Returns (updated_ids, missing, rejected, stock_crossed), counted from the
+    UPDATEs' rowcounts, or None when `batched` and some row of an executemany
+    matched nothing; the caller then rolls back and retries with batched=False.
+    """
+    current = dict(db.session.execute(
+        select(products.c.id, products.c.stock).where(
+            products.c.id.in_([change['id'] for change in chunk])
+        ).with_for_update()
+    ).all())
+
+    missing = []
+    rejected = []
+    planned = []
+    for change in chunk:
+        id = change['id']
+        if id not in current:
+            missing.append(id)
+        elif 'stock' in change:
+            planned.append((_set, {"product_id": id, "stock": change['stock']}, change['stock']))
+        elif current[id] + change['delta'] < 0:
+            rejected.append({"id": id, "reason": f"Only {current[id]} in stock"})
+        else:
+            planned.append((_adjust, {"product_id": id, "delta": change['delta']}, current[id] + change['delta']))
+
+    if batched:
+        for statement in (_set, _adjust):
+            rows = [params for planned_statement, params, _ in planned if planned_statement is statement]
+            if rows and db.session.execute(statement, rows).rowcount != len(rows):
+                return None
+        applied = planned
+    else:
+        applied = []
+        for statement, params, new_stock in planned:
+            if db.session.execute(statement, params).rowcount == 1:
+                applied.append((statement, params, new_stock))
+            else:
+                rejected.append({"id": params["product_id"], "reason": "Product changed during the update; not applied"})
+
+    crossed = any((current[params["product_id"]] > 0) != (new_stock > 0) for _, params, new_stock in applied)
+    return [params["product_id"] for _, params, _ in applied], missing, rejected, crossed
+
+
+def adjust_stock(changes, chunk_size):
+    """
+    Apply many stock changes, each {"id": ..., "stock": n} (absolute) or
+    {"id": ..., "delta": n} (relative), committing once per chunk.
+
+    Each chunk costs one locking SELECT to classify ids plus one executemany per kind
+    of change. Counts come from the UPDATEs' rowcounts, so a change a concurrent
+    writer made impossible (e.g. a checkout took the stock a negative delta needed)
+    is reported under rejected rather than updated. Returns a report of updated,
+    missing and rejected ids, and whether any product moved in or out of stock.
+    """
+    report = {"updated": 0, "missing": [], "rejected": [], "updated_ids": [], "stock_crossed": False}
+
+    valid = []
+    seen = set()
+    for change in changes:
+        id = change.get('id') if isinstance(change, dict) else None
+        if not _is_int(id):
+            report["rejected"].append({"id": id, "reason": "Id must be an integer"})
+            continue
+        if id in seen:
+            report["rejected"].append({"id": id, "reason": "Duplicate id in request"})
+            continue
+        seen.add(id)
+        if ('stock' in change) == ('delta' in change):
+            report["rejected"].append({"id": id, "reason": "Provide exactly one of 'stock' or 'delta'"})
+            continue
+        value = change.get('stock', change.get('delta'))
+        if not _is_int(value):
+            report["rejected"].append({"id": id, "reason": "Stock values must be integers"})
+            continue
+        if 'stock' in change and value < 0:
+            report["rejected"].append({"id": id, "reason": "Stock cannot be negative"})
+            continue
+        valid.append(change)
+
+    # Rowcounts of an executemany can only be trusted where the driver sums them
+    batched = db.engine.dialect.supports_sane_multi_rowcount
+    for start in range(0, len(valid), chunk_size):
+        chunk = valid[start:start + chunk_size]
+        outcome = _adjust_chunk(chunk, batched)
+        if outcome is None:
+            # A product changed between the SELECT and the UPDATE; redo the chunk one
+            # statement at a time to find out which changes didn't apply
+            db.session.rollback()
+            outcome = _adjust_chunk(chunk, batched=False)
+        db.session.commit()
+
+        updated_ids, missing, rejected, crossed = outcome
+        report["updated"] += len(updated_ids)
+        report["updated_ids"] += updated_ids
+        report["missing"] += missing
+        report["rejected"] += rejected
+        report["stock_crossed"] = report["stock_crossed"] or crossed
+
+    return report
@@ -0,0 +1,194 @@
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import re
+import sys
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from flask import g, request
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+# Incoming ids are echoed back and logged, so only accept short, plain tokens
+_VALID_REQUEST_ID = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+# Set per request; records logged outside a request carry neither
+_request_id = ContextVar('request_id', default=None)
+_sampled = ContextVar('debug_sampled', default=None)
+
+# Attributes every LogRecord has; anything else came from `extra=` and is logged as a field
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime', 'request_id'}
+
+
+def current_request_id():
+    return _request_id.get()
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record, with the request id and any `extra=` fields"""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        request_id = getattr(record, 'request_id', None)
+        if request_id:
+            entry["request_id"] = request_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        if orjson is not None:
+            try:
+                return orjson.dumps(entry, default=str).decode()
+            except TypeError:
+                pass
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Readable lines for a terminal, with the request id when there is one"""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s %(request_id_label)s%(message)s')
+
+    def format(self, record):
+        request_id = getattr(record, 'request_id', None)
+        record.request_id_label = f'[{request_id}] ' if request_id else ''
+        return super().format(record)
+
+
+class RequestContextFilter(logging.Filter):
+    """
+    Tags records with the current request id and drops unsampled debug records.
+
+    Debug records are kept for a LOG_DEBUG_SAMPLE_RATE fraction of requests,
+    decided once per request so a sampled request's trace is complete; outside
+    requests each debug record is sampled on its own. INFO and above are never
+    dropped.
+    """
+
+    def __init__(self, sample_rate):
+        super().__init__()
+        self.sample_rate = sample_rate
+
+    def filter(self, record):
+        record.request_id = _request_id.get()
+        if record.levelno >= logging.INFO or self.sample_rate >= 1:
+            return True
+        sampled = _sampled.get()
+        if sampled is None:
+            sampled = random.random() < self.sample_rate
+        return sampled
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Hands records to the writer thread without ever waiting.
+
+    The message and traceback are rendered here, while the arguments are still
+    valid, but JSON encoding and the write happen on the writer thread. When the
+    queue is full the record is dropped and counted rather than blocking the caller.
+    """
+
+    def __init__(self, q):
+        super().__init__(q)
+        self.dropped = 0
+        self._traceback = logging.Formatter()
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = self._traceback.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class StructuredLogging:
+    """
+    Routes the root logger through a bounded queue to a background writer thread.
+
+    Request threads only copy the record onto the queue; formatting and the write
+    to stdout happen on the listener thread. Each request gets an id, taken from an
+    incoming X-Request-ID header when it looks safe or generated otherwise, which
+    is added to every record and echoed in the response.
+    """
+
+    def __init__(self):
+        self.handler = None
+        self.listener = None
+
+    def init_app(self, app):
+        if self.listener is None:
+            self._start(app.config)
+        app.before_request(self._begin_request)
+        app.after_request(self._end_request)
+        app.teardown_request(self._clear_request)
+
+    def _start(self, config):
+        output = logging.StreamHandler(sys.stdout)
+        output.setFormatter(JSONFormatter() if config.get('LOG_FORMAT', 'json') == 'json' else TextFormatter())
+
+        self.handler = NonBlockingQueueHandler(queue.Queue(config.get('LOG_QUEUE_SIZE', 10000)))
+        self.handler.addFilter(RequestContextFilter(config.get('LOG_DEBUG_SAMPLE_RATE', 0.01)))
+        self.listener = logging.handlers.QueueListener(self.handler.queue, output, respect_handler_level=True)
+
+        root = logging.getLogger()
+        root.setLevel(config.get('LOG_LEVEL', 'INFO'))
+        root.addHandler(self.handler)
+        self.listener.start()
+        # Write out whatever is still queued when the process exits
+        atexit.register(self.stop)
+
+    def stop(self):
+        if self.listener is not None:
+            self.listener.stop()
+            logging.getLogger().removeHandler(self.handler)
+            self.listener = None
+
+    def _begin_request(self):
+        request_id = request.headers.get(REQUEST_ID_HEADER, '')
+        if not _VALID_REQUEST_ID.match(request_id):
+            request_id = uuid.uuid4().hex
+        g.request_id = request_id
+        # Decided once, so a sampled request keeps all of its debug records
+        sampled = random.random() < self.handler.filters[0].sample_rate
+        g.log_tokens = (_request_id.set(request_id), _sampled.set(sampled))
+
+    def _end_request(self, response):
+        request_id = g.get('request_id')
+        if request_id:
+            response.headers[REQUEST_ID_HEADER] = request_id
+        return response
+
+    def _clear_request(self, exc=None):
+        tokens = g.pop('log_tokens', None)
+        if tokens:
+            _request_id.reset(tokens[0])
+            _sampled.reset(tokens[1])
+
+
+structured_logging = StructuredLogging()
@@ -0,0 +1,195 @@
+import bisect
+import threading
+import time
+from flask import Response, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Prometheus' default latency buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+STATEMENT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    """Monotonic totals per label set"""
+
+    kind = 'counter'
+
+    def __init__(self, name, help, labels):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, key, amount=1):
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield f'{self.name}{_labels(self.labels, key)} {_number(value)}'
+
+
+class Histogram:
+    """
+    Bucketed observations per label set.
+
+    Each observation only bumps its own bucket; the cumulative counts Prometheus
+    expects are summed when scraped, which keeps observe() cheap.
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels, buckets):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, key, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # Bucket counts, then the +Inf overflow, count and sum
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0, 0.0]
+            series[index] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def samples(self):
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+        for key, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), values):
+                cumulative += count
+                le = 'le="+Inf"' if bound == '+Inf' else f'le="{_number(bound)}"'
+                yield f'{self.name}_bucket{_labels(self.labels, key, le)} {cumulative}'
+            yield f'{self.name}_count{_labels(self.labels, key)} {values[-2]}'
+            yield f'{self.name}_sum{_labels(self.labels, key)} {_number(round(values[-1], 6))}'
+
+
+class Metrics:
+    """
+    Per-endpoint request latency, status codes and SQL activity, served in the
+    Prometheus text format.
+
+    Timing starts in before_request and ends in after_request. SQL statements are
+    timed by engine events and charged to the request running on the same thread;
+    statements from background threads (payments, write-behind) are not counted.
+    Series live in process memory, so each worker process is scraped separately.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.server_timing = False
+        self._local = threading.local()
+        self.requests = Counter(
+            'http_requests_total', 'Requests by endpoint, method and status code.',
+            ('endpoint', 'method', 'status'))
+        self.latency = Histogram(
+            'http_request_duration_seconds', 'Time spent handling a request.',
+            ('endpoint', 'method'), LATENCY_BUCKETS)
+        self.statements = Histogram(
+            'db_statements_per_request', 'SQL statements executed per request.',
+            ('endpoint',), STATEMENT_BUCKETS)
+        self.sql_time = Histogram(
+            'db_time_per_request_seconds', 'Time spent in SQL statements per request.',
+            ('endpoint',), LATENCY_BUCKETS)
+        self.series = [self.requests, self.latency, self.statements, self.sql_time]
+
+    def init_app(self, app):
+        self.enabled = app.config.get('METRICS_ENABLED', True)
+        if not self.enabled:
+            return
+        self.server_timing = app.config.get('METRICS_SERVER_TIMING', True)
+        self._listen()
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        app.teardown_request(self._clear)
+        app.add_url_rule(app.config.get('METRICS_PATH', '/metrics'), 'metrics', self.export)
+
+    def _listen(self):
+        # Engines are created lazily per app, so listen on all of them once
+        if event.contains(Engine, 'before_cursor_execute', self._before_statement):
+            return
+        event.listen(Engine, 'before_cursor_execute', self._before_statement)
+        event.listen(Engine, 'after_cursor_execute', self._after_statement)
+
+    def _before_statement(self, conn, cursor, statement, parameters, context, executemany):
+        local = self._local
+        if getattr(local, 'started', None) is not None:
+            local.statement_started = time.perf_counter()
+
+    def _after_statement(self, conn, cursor, statement, parameters, context, executemany):
+        local = self._local
+        if getattr(local, 'started', None) is not None:
+            local.sql_count += 1
+            local.sql_time += time.perf_counter() - local.statement_started
+
+    def _start(self):
+        local = self._local
+        local.sql_count = 0
+        local.sql_time = 0.0
+        local.started = time.perf_counter()
+
+    def _finish(self, response):
+        local = self._local
+        started = getattr(local, 'started', None)
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        # Each attribute read through the proxy costs a context lookup
+        current = request._get_current_object()
+        endpoint = current.endpoint or 'unmatched'
+        method = current.method
+        self.requests.inc((endpoint, method, str(response.status_code)))
+        self.latency.observe((endpoint, method), elapsed)
+        self.statements.observe((endpoint,), local.sql_count)
+        self.sql_time.observe((endpoint,), local.sql_time)
+        if self.server_timing:
+            response.headers['Server-Timing'] = (
+                f'app;dur={elapsed * 1000:.2f}, '
+                f'db;dur={local.sql_time * 1000:.2f};desc="{local.sql_count} queries"'
+            )
+        return response
+
+    def _clear(self, exc=None):
+        self._local.started = None
+
+    def render(self):
+        lines = []
+        for series in self.series:
+            lines.append(f'# HELP {series.name} {series.help}')
+            lines.append(f'# TYPE {series.name} {series.kind}')
+            lines.extend(series.samples())
+        return '\n'.join(lines) + '\n'
+
+    def export(self):
+        return Response(self.render(), content_type=CONTENT_TYPE)
+
+
+metrics = Metrics()
@@ -0,0 +1,104 @@
+from collections import defaultdict
+from sqlalchemy import select
+from app import db
+from models.order import Order, OrderItem
+from models.product import Product
+from services import analytics, inventory
+
+products = Product.__table__
+order_items = OrderItem.__table__
+
+# Ids per IN (...) query, under SQLite's bound-parameter limit
+LOOKUP_CHUNK_SIZE = 500
+
+
+def current_products(product_ids):
+    """{product_id: row} with the price, category and stock from the catalog, for existing products only"""
+    product_ids = list(product_ids)
+    found = {}
+    for start in range(0, len(product_ids), LOOKUP_CHUNK_SIZE):
+        rows = db.session.execute(
+            select(products.c.id, products.c.price, products.c.category, products.c.stock).where(
+                products.c.id.in_(product_ids[start:start + LOOKUP_CHUNK_SIZE])
+            )
+        )
+        found.update({row.id: row for row in rows})
+    return found
+
+
+def create_orders(user_id, requested):
+    """
+    Create pending orders for a user, priced from the catalog rather than the client.
+
+    `requested` is a list of {"items": [{"product_id", "quantity"}, ...]}. Prices
+    for every line of every order come from one lookup, stock for the whole batch
+    is taken with one conditional executemany as at checkout, and all items are
+    inserted with one executemany. Nothing is committed; the caller commits once
+    for the batch, or rolls back if there are errors.
+    Returns (orders, errors, sold_out), where errors maps an order's index to its
+    problems and sold_out says whether any product ran out of stock.
+    """
+    found = current_products({
+        item['product_id'] for order_data in requested for item in order_data['items']
+    })
+
+    errors = {}
+    for index, order_data in enumerate(requested):
+        missing = sorted({item['product_id'] for item in order_data['items']} - found.keys())
+        if missing:
+            errors[index] = [f"Product {product_id} does not exist" for product_id in missing]
+    if errors:
+        return [], errors, False
+
+    quantities = defaultdict(int)
+    for order_data in requested:
+        for item in order_data['items']:
+            quantities[item['product_id']] += item['quantity']
+    if not inventory.take_stock(quantities):
+        short = {product_id for product_id, quantity in quantities.items() if found[product_id].stock < quantity}
+        for index, order_data in enumerate(requested):
+            # Without a product short at lookup time, a concurrent order took the stock since
+            problems = sorted({item['product_id'] for item in order_data['items']} & short) if short else [
+                item['product_id'] for item in order_data['items']
+            ]
+            if problems:
+                errors[index] = [f"Not enough stock for product {product_id}" for product_id in problems]
+        return [], errors, False
+
+    orders = []
+    lines = []
+    for order_data in requested:
+        order_lines = [
+            (item['product_id'], found[item['product_id']].category, item['quantity'], found[item['product_id']].price)
+            for item in order_data['items']
+        ]
+        orders.append(Order(
+            user_id=user_id,
+            status='pending',
+            total_amount=sum(price * quantity for _, _, quantity, price in order_lines)
+        ))
+        lines.append(order_lines)
+
+    # Orders need their ids for the items, so they're flushed first
+    db.session.add_all(orders)
+    db.session.flush()
+
+    db.session.execute(order_items.insert(), [
+        {"order_id": order.id, "product_id": product_id, "category": category, "quantity": quantity, "price": price}
+        for order, order_lines in zip(orders, lines)
+        for product_id, category, quantity, price in order_lines
+    ])
+    analytics.record_new_orders(list(zip(orders, lines)))
+    sold_out = any(found[product_id].stock - quantity <= 0 for product_id, quantity in quantities.items())
+    return orders, {}, sold_out
+
+
+def load_orders(order_ids, options):
+    """Orders by id with the given loader options, in the order of `order_ids`"""
+    loaded = {}
+    for start in range(0, len(order_ids), LOOKUP_CHUNK_SIZE):
+        for order in Order.query.options(*options).filter(
+            Order.id.in_(order_ids[start:start + LOOKUP_CHUNK_SIZE])
+        ):
+            loaded[order.id] = order
+    return [loaded[order_id] for order_id in order_ids]
@@ -0,0 +1,110 @@
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+
+class InvalidCursor(ValueError):
+    """Raised when a client supplies a malformed or mismatched cursor"""
+
+
+def encode_cursor(scope, value, id, direction):
+    """Pack a keyset position into an opaque, URL-safe token"""
+    if isinstance(value, datetime):
+        payload = {"s": scope, "t": value.isoformat(), "id": id, "d": direction}
+    else:
+        payload = {"s": scope, "v": value, "id": id, "d": direction}
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token, scope):
+    """Unpack a cursor token, checking it was issued for the same sort scope"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if 't' in payload:
+            value = datetime.fromisoformat(payload['t'])
+        else:
+            value = payload['v']
+        id = int(payload['id'])
+        direction = payload['d']
+    except (ValueError, TypeError, KeyError):
+        raise InvalidCursor("Invalid cursor")
+
+    if payload.get('s') != scope:
+        raise InvalidCursor("Cursor does not match the requested sort")
+    if direction not in ('next', 'prev'):
+        raise InvalidCursor("Invalid cursor")
+
+    return value, id, direction
+
+
+def keyset_page(query, column, id_column, descending, limit, cursor=None, scope='', key=None):
+    """
+    Fetch one page of `query` ordered by (column, id_column) using keyset pagination.
+
+    Instead of OFFSET, each page starts strictly after (or before) the row the cursor
+    points at, so the cost of a page does not grow with how deep the client pages.
+    `key` extracts the (sort value, id) pair from a result row; by default it reads
+    the attributes named after the two columns.
+    Returns (rows, next_cursor, prev_cursor).
+    """
+    if key is None:
+        key = lambda row: (getattr(row, column.key), getattr(row, id_column.key))
+    direction = 'next'
+    has_prev = False
+    has_next = False
+
+    if cursor:
+        value, last_id, direction = decode_cursor(cursor, scope)
+        # Walking backwards flips the comparison and the ordering
+        forwards = (direction == 'next') != descending
+        if forwards:
+            query = query.filter(or_(column > value, and_(column == value, id_column > last_id)))
+        else:
+            query = query.filter(or_(column < value, and_(column == value, id_column < last_id)))
+
+    reverse = direction == 'prev'
+    if descending != reverse:
+        query = query.order_by(column.desc(), id_column.desc())
+    else:
+        query = query.order_by(column.asc(), id_column.asc())
+
+    # One extra row tells us whether another page exists without a COUNT(*)
+    rows = query.limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    if reverse:
+        rows.reverse()
+        has_prev = has_more
+        has_next = True
+    else:
+        has_next = has_more
+        has_prev = cursor is not None
+
+    next_cursor = None
+    prev_cursor = None
+    if rows and has_next:
+        value, id = key(rows[-1])
+        next_cursor = encode_cursor(scope, value, id, 'next')
+    if rows and has_prev:
+        value, id = key(rows[0])
+        prev_cursor = encode_cursor(scope, value, id, 'prev')
+
+    return rows, next_cursor, prev_cursor
+
+
+def iter_chunks(query, column, id_column, descending, chunk_size):
+    """Walk a whole query in keyset-ordered chunks, e.g. for streaming exports"""
+    cursor = None
+    while True:
+        rows, cursor, _ = keyset_page(
+            query, column, id_column, descending, chunk_size, cursor=cursor, scope='chunks'
+        )
+        if rows:
+            yield rows
+        if not cursor:
+            return
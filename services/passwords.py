@@ -0,0 +1,78 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+
+class HasherBusy(Exception):
+    """Too many password hashes are already queued; the caller should shed the request"""
+
+
+class PasswordHasher:
+    """
+    Runs werkzeug's deliberately slow password hashing off the request threads.
+
+    Hashes are computed in a small process pool, so a burst of logins can use at most
+    PASSWORD_HASH_WORKERS cores and never holds the GIL that catalog requests need.
+    At most PASSWORD_HASH_MAX_PENDING hashes may be queued or running; beyond that,
+    callers wait up to PASSWORD_HASH_QUEUE_TIMEOUT seconds and then get HasherBusy.
+    With PASSWORD_HASH_WORKERS = 0 hashing runs inline, which suits scripts and tests.
+    """
+
+    def __init__(self):
+        self.method = f'pbkdf2:sha256:{DEFAULT_PBKDF2_ITERATIONS}'
+        self.workers = 0
+        self.queue_timeout = None
+        self._slots = None
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        method = app.config.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256')
+        iterations = app.config.get('PASSWORD_HASH_ITERATIONS', DEFAULT_PBKDF2_ITERATIONS)
+        # Spell out the iteration count so needs_rehash() can compare it to stored hashes
+        if method.startswith('pbkdf2:') and method.count(':') == 1:
+            method = f'{method}:{iterations}'
+        self.method = method
+        self.workers = app.config.get('PASSWORD_HASH_WORKERS', 2)
+        self.queue_timeout = app.config.get('PASSWORD_HASH_QUEUE_TIMEOUT', 5)
+        max_pending = app.config.get('PASSWORD_HASH_MAX_PENDING', 64)
+        self._slots = threading.BoundedSemaphore(max_pending) if max_pending else None
+
+    def _pool(self):
+        # Created on first use so CLI commands that never hash don't start workers.
+        # Workers are spawned rather than forked: the server is multi-threaded and
+        # they only need werkzeug, not the app.
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context('spawn')
+                    )
+        return self._executor
+
+    def _run(self, fn, *args):
+        if not self.workers:
+            return fn(*args)
+
+        if self._slots and not self._slots.acquire(timeout=self.queue_timeout):
+            raise HasherBusy("Too many password checks in progress")
+        try:
+            return self._pool().submit(fn, *args).result()
+        finally:
+            if self._slots:
+                self._slots.release()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, pwhash, password):
+        return self._run(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        """True if a stored hash was made with a different method or cost than configured"""
+        return pwhash.split('$', 1)[0] != self.method
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,291 @@
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from app import db
+from models.order import Order
+from resources.stripe import create_payment_intent, retrieve_payment_intent, set_timeout
+from services import analytics
+from services import inventory
+from services.cache import product_cache
+from services.facets import category_facets
+from services.projection import order_options
+
+logger = logging.getLogger(__name__)
+
+
+class PaymentError(Exception):
+    """A payment provider call failed; the pipeline may retry it"""
+
+
+class PaymentTimeout(PaymentError):
+    """A payment provider call took longer than PAYMENT_TIMEOUT"""
+
+
+class PaymentProvider:
+    """
+    Interface for payment backends.
+
+    create_intent() must be idempotent for a given key: calling it again after a
+    timeout or a lost response returns the same intent instead of charging twice.
+    Providers that confirm payments themselves call `on_succeeded(intent_id, order_id)`;
+    others report confirmations through the webhook endpoint.
+    """
+
+    name = None
+
+    def __init__(self, timeout, on_succeeded):
+        self.timeout = timeout
+        self.on_succeeded = on_succeeded
+
+    def create_intent(self, amount, currency, idempotency_key, metadata):
+        raise NotImplementedError
+
+    def client_secret(self, intent_id):
+        """The secret a client needs to confirm the intent"""
+        raise NotImplementedError
+
+
+class StripeProvider(PaymentProvider):
+    name = 'stripe'
+
+    def __init__(self, timeout, on_succeeded):
+        super().__init__(timeout, on_succeeded)
+        set_timeout(timeout)
+
+    def create_intent(self, amount, currency, idempotency_key, metadata):
+        intent = create_payment_intent(
+            amount,
+            currency,
+            idempotency_key=idempotency_key,
+            metadata=metadata
+        )
+        if not intent:
+            raise PaymentError("Stripe payment intent creation failed")
+        return {"id": intent["id"], "status": intent["status"]}
+
+    def client_secret(self, intent_id):
+        intent = retrieve_payment_intent(intent_id)
+        if not intent:
+            raise PaymentError("Stripe payment intent lookup failed")
+        return intent["client_secret"]
+
+
+class FakeProvider(PaymentProvider):
+    """
+    In-process stand-in for offline and load testing.
+
+    Simulates provider latency and a failure rate, honours idempotency keys and
+    confirms every intent it creates straight away.
+    """
+
+    name = 'fake'
+
+    def __init__(self, timeout, on_succeeded, latency=0.0, failure_rate=0.0):
+        super().__init__(timeout, on_succeeded)
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.intents = {}
+        self._secrets = {}
+        self._lock = threading.Lock()
+
+    def create_intent(self, amount, currency, idempotency_key, metadata):
+        if self.latency > self.timeout:
+            time.sleep(self.timeout)
+            raise PaymentTimeout(f"Fake provider did not answer within {self.timeout}s")
+        time.sleep(self.latency)
+        if random.random() < self.failure_rate:
+            raise PaymentError("Simulated provider failure")
+
+        with self._lock:
+            intent = self.intents.get(idempotency_key)
+            if intent is None:
+                intent_id = f"pi_fake_{uuid.uuid4().hex[:24]}"
+                intent = {
+                    "id": intent_id,
+                    "status": "succeeded",
+                    "amount": amount,
+                    "currency": currency
+                }
+                self.intents[idempotency_key] = intent
+                self._secrets[intent_id] = f"{intent_id}_secret_{uuid.uuid4().hex[:24]}"
+
+        self.on_succeeded(intent["id"], int(metadata["order_id"]))
+        return intent
+
+    def client_secret(self, intent_id):
+        secret = self._secrets.get(intent_id)
+        if secret is None:
+            raise PaymentError(f"Unknown payment intent {intent_id}")
+        return secret
+
+
+class PaymentPipeline:
+    """
+    Creates payment intents on a background worker pool.
+
+    Checkout and POST /orders commit orders as 'pending', with their stock already
+    taken, and submit them here, so no database transaction is held open while the
+    provider is called. Each order gets a stable
+    idempotency key, so retries after timeouts never create a second intent.
+    Orders whose intent can't be created after PAYMENT_MAX_RETRIES are cancelled
+    and their stock returned.
+
+    Submissions only live in this process, so orders whose worker died with it stay
+    pending without an intent; sweep() resubmits them, and the idempotency key
+    makes that safe even if the original attempt did reach the provider.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.provider = None
+        self.webhook_secret = None
+        self._executor = None
+        self._inflight = set()
+        self._inflight_lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        self.currency = app.config.get('PAYMENT_CURRENCY', 'eur')
+        self.max_retries = app.config.get('PAYMENT_MAX_RETRIES', 3)
+        self.backoff = app.config.get('PAYMENT_RETRY_BACKOFF', 0.5)
+
+        name = app.config.get('PAYMENT_PROVIDER', 'stripe')
+        timeout = app.config.get('PAYMENT_TIMEOUT', 10)
+        if name == FakeProvider.name:
+            self.provider = FakeProvider(
+                timeout,
+                self.mark_paid,
+                latency=app.config.get('PAYMENT_FAKE_LATENCY', 0.0),
+                failure_rate=app.config.get('PAYMENT_FAKE_FAILURE_RATE', 0.0)
+            )
+        else:
+            self.provider = StripeProvider(timeout, self.mark_paid)
+
+        # .env is loaded by resources.stripe, after the config classes were built
+        self.webhook_secret = app.config.get('STRIPE_WEBHOOK_SECRET') or os.getenv('STRIPE_WEBHOOK_SECRET')
+        if self.provider.name == StripeProvider.name and not self.webhook_secret:
+            # Without it anyone could post a "succeeded" event and mark orders paid
+            raise RuntimeError("PAYMENT_PROVIDER 'stripe' requires STRIPE_WEBHOOK_SECRET")
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=app.config.get('PAYMENT_WORKERS', 4),
+            thread_name_prefix='payments'
+        )
+
+    def submit(self, order_id, amount):
+        """Queue intent creation for a committed order; returns a Future"""
+        with self._inflight_lock:
+            self._inflight.add(order_id)
+        return self._executor.submit(self._process, order_id, amount)
+
+    def sweep(self, older_than=300):
+        """
+        Resubmit pending orders that still have no payment intent `older_than`
+        seconds after they were created. Returns the Futures of the resubmissions.
+        """
+        cutoff = datetime.utcnow() - timedelta(seconds=older_than)
+        stranded = db.session.query(Order.id, Order.total_amount).filter(
+            Order.status == 'pending',
+            Order.payment_intent_id.is_(None),
+            Order.created_at < cutoff
+        ).order_by(Order.id).all()
+        with self._inflight_lock:
+            # Orders still queued here will be attached by their own worker
+            stranded = [(order_id, amount) for order_id, amount in stranded if order_id not in self._inflight]
+        if stranded:
+            logger.info('Resubmitting %d orders without a payment intent', len(stranded))
+        return [self.submit(order_id, amount) for order_id, amount in stranded]
+
+    def client_secret(self, order):
+        """The client secret of an order's intent, or None while it has none"""
+        if not order.payment_intent_id:
+            return None
+        return self.provider.client_secret(order.payment_intent_id)
+
+    def _process(self, order_id, amount):
+        with self.app.app_context():
+            try:
+                intent = self._create_with_retries(order_id, amount)
+                if intent is None:
+                    self._fail(order_id)
+                    return None
+                self._attach(order_id, intent["id"])
+                return intent
+            except Exception:
+                # Nobody waits on the Future, so this is the only trace; sweep() retries the order
+                logger.exception('Payment processing failed for order %s', order_id)
+                raise
+            finally:
+                db.session.remove()
+                with self._inflight_lock:
+                    self._inflight.discard(order_id)
+
+    def _create_with_retries(self, order_id, amount):
+        key = f"order-{order_id}"
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self.provider.create_intent(
+                    int(round(amount * 100)),
+                    self.currency,
+                    key,
+                    {"order_id": str(order_id)}
+                )
+            except PaymentError as e:
+                logger.warning('Payment error for order %s (attempt %d): %s', order_id, attempt + 1, e)
+                if attempt < self.max_retries:
+                    time.sleep(self.backoff * (2 ** attempt))
+        return None
+
+    def _attach(self, order_id, intent_id):
+        Order.query.filter_by(id=order_id).update(
+            {"payment_intent_id": intent_id},
+            synchronize_session=False
+        )
+        db.session.commit()
+
+    def _fail(self, order_id):
+        order = Order.query.options(*order_options(products=False)).get(order_id)
+        if order and inventory.cancel_order(order, 'pending'):
+            product_ids = [item.product_id for item in order.items]
+            db.session.commit()
+            category_facets.invalidate()
+            product_cache.invalidate(*product_ids)
+
+    def mark_paid(self, intent_id, order_id=None):
+        """
+        Record a confirmed payment. Called by providers that confirm in-process and
+        by the webhook endpoint; only pending orders move to 'paid'.
+        """
+        if order_id is None:
+            order = Order.query.filter_by(payment_intent_id=intent_id).first()
+            if not order:
+                return False
+            order_id = order.id
+
+        updated = Order.query.filter(
+            Order.id == order_id,
+            Order.status == 'pending'
+        ).update(
+            {"status": "paid", "payment_intent_id": intent_id},
+            synchronize_session=False
+        )
+        if updated == 1:
+            analytics.record_transition(order_id, 'pending', 'paid')
+        db.session.commit()
+        return updated == 1
+
+    def mark_failed(self, intent_id, order_id=None):
+        """Cancel the pending order behind a failed intent and return its stock"""
+        if order_id is None:
+            order = Order.query.filter_by(payment_intent_id=intent_id).first()
+            order_id = order.id if order else None
+        if order_id is not None:
+            self._fail(order_id)
+
+
+payment_pipeline = PaymentPipeline()
@@ -0,0 +1,83 @@
+from sqlalchemy.orm import raiseload, selectinload
+from models.order import Order, OrderItem
+from schemas import OrderSchema
+from services.serialization import CompiledSerializer
+
+ORDER_FIELDS = ('id', 'user_id', 'status', 'total_amount', 'created_at', 'payment_intent_id')
+ORDER_EXPANSIONS = ('items', 'items.product')
+
+# Compiled serializers per (fields, expand) combination; there are under two hundred
+_serializers = {}
+
+
+class InvalidProjection(ValueError):
+    """Raised when a client asks for fields or expansions that don't exist"""
+
+
+def _split(value):
+    return [part.strip() for part in value.split(',') if part.strip()]
+
+
+class OrderProjection:
+    """
+    Which parts of an order a response includes, from `?fields=` and `?expand=`.
+
+    `fields` picks the order's own columns (all by default). `expand` picks the
+    related data to embed: `items`, and `items.product` for the product inside each
+    item. Without `expand` both are included, as responses always have been; an
+    empty `expand=` returns order summaries only. The projection also decides how
+    relationships are loaded, so unrequested data is never queried.
+    """
+
+    def __init__(self, fields=ORDER_FIELDS, expand=ORDER_EXPANSIONS):
+        self.fields = tuple(field for field in ORDER_FIELDS if field in fields)
+        self.items = 'items' in expand or 'items.product' in expand
+        self.products = 'items.product' in expand
+
+    @classmethod
+    def from_args(cls, args):
+        fields = ORDER_FIELDS
+        expand = ORDER_EXPANSIONS
+        if 'fields' in args:
+            fields = _split(args['fields'])
+            unknown = [field for field in fields if field not in ORDER_FIELDS]
+            if unknown or not fields:
+                raise InvalidProjection(f"Invalid fields. Must be any of: {', '.join(ORDER_FIELDS)}")
+        if 'expand' in args:
+            expand = _split(args['expand'])
+            unknown = [name for name in expand if name not in ORDER_EXPANSIONS]
+            if unknown:
+                raise InvalidProjection(f"Invalid expand. Must be any of: {', '.join(ORDER_EXPANSIONS)}")
+        return cls(fields, expand)
+
+    def options(self):
+        """Loader options for an Order query that fetch exactly what will be dumped"""
+        if not self.items:
+            return [raiseload(Order.items)]
+        # One extra SELECT ... IN for all items of the page, rather than a join that
+        # repeats every order row once per item
+        items = selectinload(Order.items)
+        if self.products:
+            return [items.joinedload(OrderItem.product)]
+        return [items.raiseload(OrderItem.product)]
+
+    def serializer(self):
+        key = (self.fields, self.items, self.products)
+        serializer = _serializers.get(key)
+        if serializer is None:
+            if self.fields == ORDER_FIELDS and self.items and self.products:
+                schema = OrderSchema()
+            else:
+                only = self.fields + (('items',) if self.items else ())
+                exclude = () if self.products or not self.items else ('items.product',)
+                schema = OrderSchema(only=only, exclude=exclude)
+            serializer = _serializers[key] = CompiledSerializer(schema)
+        return serializer
+
+    def dump(self, obj, many=False):
+        return self.serializer().dump(obj, many=many)
+
+
+def order_options(products=True):
+    """Loader options for code paths that work on an order's items, and optionally their products"""
+    return OrderProjection(expand=ORDER_EXPANSIONS if products else ('items',)).options()
@@ -0,0 +1,202 @@
+import logging
+import re
+import threading
+import time
+from contextlib import contextmanager
+from flask import request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app import db
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r'\s+')
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+# Expanded IN lists render one placeholder per value
+_IN_LIST = re.compile(r'\(\s*(?:\?|%\(\w+\)s|:\w+)(?:\s*,\s*(?:\?|%\(\w+\)s|:\w+))*\s*\)')
+
+
+def normalize(statement):
+    """`statement` with literals and IN lists collapsed, so repeats of one query group together"""
+    statement = _WHITESPACE.sub(' ', statement).strip()
+    statement = _STRING.sub('?', statement)
+    statement = _NUMBER.sub('?', statement)
+    return _IN_LIST.sub('(...)', statement)
+
+
+class QueryRecord:
+    __slots__ = ('statement', 'parameters', 'executemany', 'duration')
+
+    def __init__(self, statement, parameters, executemany, duration):
+        self.statement = statement
+        self.parameters = parameters
+        self.executemany = executemany
+        self.duration = duration
+
+
+class QueryGroup:
+    """Every execution of one normalized statement"""
+
+    __slots__ = ('sql', 'records')
+
+    def __init__(self, sql):
+        self.sql = sql
+        self.records = []
+
+    @property
+    def count(self):
+        return len(self.records)
+
+    @property
+    def duration(self):
+        return sum(record.duration for record in self.records)
+
+
+class QueryLog:
+    """The statements run on one thread while a capture was open"""
+
+    def __init__(self):
+        self.records = []
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def duration(self):
+        return sum(record.duration for record in self.records)
+
+    def groups(self):
+        """QueryGroups, most executed first"""
+        groups = {}
+        for record in self.records:
+            sql = normalize(record.statement)
+            group = groups.get(sql)
+            if group is None:
+                group = groups[sql] = QueryGroup(sql)
+            group.records.append(record)
+        return sorted(groups.values(), key=lambda group: -group.count)
+
+    def repeated(self, threshold):
+        """Groups run at least `threshold` times: the signature of an N+1 loop"""
+        return [group for group in self.groups() if group.count >= threshold]
+
+    def slow(self, threshold):
+        """Single statements that took `threshold` seconds or longer"""
+        return [record for record in self.records if record.duration >= threshold]
+
+    def report(self):
+        lines = [f'{len(self)} statements in {self.duration * 1000:.1f}ms']
+        for group in self.groups():
+            lines.append(f'  {group.count:>4} x {group.duration * 1000:8.2f}ms  {group.sql}')
+        return '\n'.join(lines)
+
+
+class QueryInspector:
+    """
+    Development aid that watches the SQL each request runs.
+
+    Statements are grouped by their normalized text; any group executed
+    QUERY_INSPECTOR_REPEAT_THRESHOLD times or more in one request is logged as a
+    likely N+1 loop, and statements slower than QUERY_INSPECTOR_SLOW_MS are logged
+    with their EXPLAIN plan. It is on by default only in debug mode. capture()
+    works on its own, for tests and scripts, whether or not the request hooks are on.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.repeat_threshold = 5
+        self.slow_threshold = 0.1
+        self._local = threading.local()
+
+    def init_app(self, app):
+        enabled = app.config.get('QUERY_INSPECTOR_ENABLED')
+        self.enabled = app.debug if enabled is None else enabled
+        if not self.enabled:
+            return
+        self.repeat_threshold = app.config.get('QUERY_INSPECTOR_REPEAT_THRESHOLD', 5)
+        self.slow_threshold = app.config.get('QUERY_INSPECTOR_SLOW_MS', 100) / 1000
+        self._listen()
+        app.before_request(self._start)
+        app.teardown_request(self._finish)
+
+    def _listen(self):
+        # Engines are created lazily per app, so listen on all of them once
+        if event.contains(Engine, 'before_cursor_execute', self._before_statement):
+            return
+        event.listen(Engine, 'before_cursor_execute', self._before_statement)
+        event.listen(Engine, 'after_cursor_execute', self._after_statement)
+
+    def _logs(self):
+        logs = getattr(self._local, 'logs', None)
+        if logs is None:
+            logs = self._local.logs = []
+        return logs
+
+    def _before_statement(self, conn, cursor, statement, parameters, context, executemany):
+        if getattr(self._local, 'logs', None):
+            self._local.statement_started = time.perf_counter()
+
+    def _after_statement(self, conn, cursor, statement, parameters, context, executemany):
+        logs = getattr(self._local, 'logs', None)
+        if logs:
+            record = QueryRecord(statement, parameters, executemany,
+                                 time.perf_counter() - self._local.statement_started)
+            for log in logs:
+                log.records.append(record)
+
+    @contextmanager
+    def capture(self):
+        """Collect the statements run on this thread inside the block into a QueryLog"""
+        self._listen()
+        log = QueryLog()
+        logs = self._logs()
+        logs.append(log)
+        try:
+            yield log
+        finally:
+            logs.remove(log)
+
+    def _start(self):
+        log = QueryLog()
+        self._logs().append(log)
+        self._local.request_log = log
+
+    def _finish(self, exc=None):
+        log = getattr(self._local, 'request_log', None)
+        if log is None:
+            return
+        self._local.request_log = None
+        self._logs().remove(log)
+        self.inspect(log, f'{request.method} {request.path}')
+
+    def inspect(self, log, label):
+        """Log the repeated and slow statements in `log`"""
+        for group in log.groups():
+            if group.count >= self.repeat_threshold:
+                logger.warning('%s: possible N+1, %d x %s (%.1fms total)',
+                               label, group.count, group.sql, group.duration * 1000)
+            slow = [record for record in group.records if record.duration >= self.slow_threshold]
+            if slow:
+                # One plan per statement is enough, however often it ran
+                slowest = max(slow, key=lambda record: record.duration)
+                logger.warning('%s: slow query, %d run(s) up to %.1fms: %s\n%s',
+                               label, len(slow), slowest.duration * 1000, group.sql,
+                               '\n'.join(f'    {line}' for line in self._plan(slowest)))
+        logger.debug('%s: %s', label, log.report())
+
+    def _plan(self, record):
+        from services.query_plans import explain
+        # Writes and batched statements are never explained; EXPLAIN needs one parameter set
+        if record.executemany or not record.statement.lstrip().upper().startswith('SELECT'):
+            return []
+        connection = db.engine.raw_connection()
+        try:
+            return explain(connection.cursor(), record.statement, record.parameters, db.engine.dialect.name)
+        except Exception as e:
+            return [f'EXPLAIN failed: {e}']
+        finally:
+            connection.close()
+
+
+query_inspector = QueryInspector()
@@ -0,0 +1,124 @@
+import re
+from sqlalchemy import event, inspect
+from app import db
+from models.order import Order
+from models.product import Product
+from models.user import User
+from services.authorization import create_user_token
+from services.cache import product_cache
+from services.facets import category_facets
+
+# "SCAN product" (or "SCAN TABLE product" on older SQLite) with no index after it
+FULL_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)$')
+# SQLite builds a throwaway index per statement when a join has no usable one
+AUTOMATIC_INDEX = 'AUTOMATIC'
+
+
+def _is_unindexed(detail, tables):
+    match = FULL_SCAN.match(detail)
+    return bool(match and match.group(1) in tables) or AUTOMATIC_INDEX in detail
+
+
+def explain(cursor, statement, parameters, dialect='sqlite'):
+    """
+    The plan for one statement as a list of lines, from EXPLAIN QUERY PLAN on
+    SQLite and plain EXPLAIN elsewhere. Neither runs the statement itself.
+    """
+    prefix = 'EXPLAIN QUERY PLAN' if dialect == 'sqlite' else 'EXPLAIN'
+    cursor.execute(f'{prefix} {statement}', parameters)
+    return [str(row[-1]) for row in cursor.fetchall()]
+
+
+def _endpoints():
+    """
+    The read paths to check, filled in with ids from whatever data the database
+    holds, and the paths that had to be skipped because it holds none.
+    """
+    product = Product.query.order_by(Product.id).first()
+    order = Order.query.order_by(Order.id).first()
+    user = User.query.get(order.user_id) if order else User.query.order_by(User.id).first()
+    admin = User.query.filter_by(is_admin=True).first()
+
+    endpoints = [
+        (None, '/products'),
+        (None, '/products?sort=price&order=desc'),
+        (None, '/products?sort=created_at&order=desc'),
+        (None, '/products/facets'),
+    ]
+    # Unchecked paths are reported, so an empty database can't pass by checking less
+    skipped = []
+    if product:
+        endpoints += [
+            (None, f'/products/{product.id}'),
+            (None, f'/products?category={product.category or ""}&sort=price'),
+        ]
+    else:
+        skipped += [('/products/<id>', 'no products'), ('/products?category=...', 'no products')]
+    if user:
+        endpoints += [(user, '/cart'), (user, '/orders')]
+    else:
+        skipped += [('/cart', 'no users'), ('/orders', 'no users')]
+    if order:
+        endpoints.append((user, f'/orders/{order.id}'))
+    else:
+        skipped.append(('/orders/<id>', 'no orders'))
+    if admin:
+        endpoints += [
+            (admin, '/admin/orders'),
+            (admin, '/admin/orders?status=paid'),
+            (admin, f'/admin/orders?user_id={user.id if user else 0}'),
+            (admin, '/admin/analytics'),
+        ]
+    else:
+        skipped.append(('/admin/*', 'no admin user'))
+    return endpoints, skipped
+
+
+def check(app):
+    """
+    Request each hot read endpoint, EXPLAIN QUERY PLAN every SELECT it runs, and
+    return (offenders, skipped): (path, statement, plan) for statements that scan
+    a whole table or need an automatic index, and (path, reason) for endpoints
+    that couldn't be requested because the database lacks the rows they need.
+
+    Only SQLite is supported. Caches are cleared before each request so the
+    queries behind them are checked too.
+    """
+    tables = set(inspect(db.engine).get_table_names())
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            statements.append((statement, parameters))
+
+    client = app.test_client()
+    offenders = []
+    endpoints, skipped = _endpoints()
+    for user, path in endpoints:
+        headers = {}
+        if user:
+            headers['Authorization'] = f'Bearer {create_user_token(user)}'
+        product_cache.clear()
+        category_facets.invalidate()
+
+        statements.clear()
+        event.listen(db.engine, 'before_cursor_execute', capture)
+        try:
+            response = client.get(path, headers=headers)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', capture)
+        if response.status_code >= 400:
+            offenders.append((path, f'HTTP {response.status_code}', []))
+            continue
+
+        connection = db.engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            for statement, parameters in statements:
+                plan = explain(cursor, statement, parameters)
+                if any(_is_unindexed(detail, tables) for detail in plan):
+                    offenders.append((path, statement, plan))
+        finally:
+            connection.close()
+
+    return offenders, skipped
@@ -0,0 +1,108 @@
+import re
+from flask import current_app
+from sqlalchemy import Table, Column, Integer, Text, MetaData, func, inspect, literal_column, select, text
+from app import db
+from models.product import Product
+
+# Kept out of db.metadata so create_all() doesn't try to build it as a regular table
+search_metadata = MetaData()
+
+product_fts = Table(
+    'product_fts', search_metadata,
+    Column('rowid', Integer, primary_key=True),
+    Column('name', Text),
+    Column('description', Text),
+    Column('category', Text)
+)
+
+# bm25() column weights: name matches count most, then category, then description
+RANK_WEIGHTS = (10.0, 1.0, 5.0)
+
+# Lower bm25() scores are better matches
+rank = func.bm25(literal_column('product_fts'), *RANK_WEIGHTS)
+
+def is_available():
+    """Check whether the FTS5 index can be used on the current database"""
+    if db.engine.dialect.name != 'sqlite':
+        return False
+    if current_app.extensions.get('product_search'):
+        return True
+    # Only positive results are remembered, so a rebuilt index is picked up without a restart
+    available = inspect(db.engine).has_table('product_fts')
+    if available:
+        current_app.extensions['product_search'] = True
+    return available
+
+def create_index():
+    """Create the FTS5 table if it does not exist yet"""
+    db.session.execute(text(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS product_fts USING fts5("
+        "name, description, category, "
+        "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+    ))
+
+def rebuild_index():
+    """Repopulate the whole index from the product table"""
+    create_index()
+    db.session.execute(text("DELETE FROM product_fts"))
+    result = db.session.execute(text(
+        "INSERT INTO product_fts (rowid, name, description, category) "
+        "SELECT id, name, COALESCE(description, ''), COALESCE(category, '') FROM product"
+    ))
+    db.session.commit()
+    return result.rowcount
+
+def index_product(product):
+    """Add or refresh a product in the index; the product must already be flushed"""
+    if not is_available():
+        return
+    remove_product(product.id)
+    db.session.execute(product_fts.insert().values(
+        rowid=product.id,
+        name=product.name,
+        description=product.description or '',
+        category=product.category or ''
+    ))
+
+def index_products(ids, chunk_size=500):
+    """Refresh many products at once with set-based statements, e.g. after a bulk import"""
+    if not ids or not is_available():
+        return
+    products = Product.__table__
+    for start in range(0, len(ids), chunk_size):
+        chunk = ids[start:start + chunk_size]
+        db.session.execute(product_fts.delete().where(product_fts.c.rowid.in_(chunk)))
+        db.session.execute(product_fts.insert().from_select(
+            ['rowid', 'name', 'description', 'category'],
+            select(
+                products.c.id,
+                products.c.name,
+                func.coalesce(products.c.description, ''),
+                func.coalesce(products.c.category, '')
+            ).where(products.c.id.in_(chunk))
+        ))
+
+def remove_product(product_id):
+    """Drop a product from the index"""
+    if not is_available():
+        return
+    db.session.execute(product_fts.delete().where(product_fts.c.rowid == product_id))
+
+def build_match_query(term):
+    """
+    Turn free user input into an FTS5 query: every word must match, as a prefix.
+    Words are quoted so FTS5 operators in the input are treated as plain text.
+    """
+    words = re.findall(r'\w+', term)
+    if not words:
+        return None
+    return ' '.join(f'"{word}"*' for word in words)
+
+def apply_search(query, term):
+    """Restrict a Product query to index matches for `term`"""
+    match = build_match_query(term)
+    if match is None:
+        return query
+    return query.join(product_fts, product_fts.c.rowid == Product.id).filter(
+        literal_column('product_fts').op('MATCH')(match)
+    )
@@ -0,0 +1,221 @@
+import bisect
+import itertools
+import random
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from app import db
+from models.cart import CartItem
+from models.order import Order, OrderItem
+from models.product import Product
+from models.user import User
+from services.passwords import password_hasher
+
+users = User.__table__
+products = Product.__table__
+cart_items = CartItem.__table__
+orders = Order.__table__
+order_items = OrderItem.__table__
+
+DEFAULT_PASSWORD = 'password123'
+
+# Items per order and how often each size occurs
+DEFAULT_ORDER_SIZES = {1: 35, 2: 30, 3: 15, 4: 10, 6: 7, 10: 3}
+
+CATEGORIES = [
+    'books', 'electronics', 'garden', 'toys', 'tools', 'sports', 'music', 'food',
+    'clothing', 'beauty', 'health', 'office', 'pets', 'auto', 'baby', 'games'
+]
+# Categories get progressively smaller, like a real catalog
+CATEGORY_WEIGHTS = list(itertools.accumulate(0.8 ** rank for rank in range(len(CATEGORIES))))
+WORDS = [
+    'red', 'blue', 'steel', 'wooden', 'compact', 'deluxe', 'classic', 'smart',
+    'portable', 'organic', 'wireless', 'vintage', 'heavy', 'mini', 'pro', 'eco'
+]
+STOCK_LEVELS = [0, 5, 20, 50, 100, 500]
+
+CHUNK_SIZE = 50_000
+# Above this many new rows, dropping a table's indexes and rebuilding them after
+# the load beats updating them row by row in random order
+INDEX_REBUILD_ROWS = 100_000
+
+
+def parse_histogram(text):
+    """{size: weight} from "1:35,2:30,..." """
+    histogram = {}
+    for part in text.split(','):
+        size, _, weight = part.partition(':')
+        histogram[int(size)] = float(weight)
+    if not histogram or min(histogram) < 1 or min(histogram.values()) < 0 or not sum(histogram.values()):
+        raise ValueError("Order sizes must look like 1:35,2:30 with sizes of at least 1")
+    return histogram
+
+
+def _next_id(table):
+    return (db.session.query(func.max(table.c.id)).scalar() or 0) + 1
+
+
+def _insert(table, rows):
+    for start in range(0, len(rows), CHUNK_SIZE):
+        db.session.execute(table.insert(), rows[start:start + CHUNK_SIZE])
+
+
+@contextmanager
+def _deferred_indexes(table, rows):
+    """Drop `table`'s secondary indexes while loading `rows` rows into it"""
+    if rows < INDEX_REBUILD_ROWS:
+        yield
+        return
+    connection = db.session.connection()
+    for index in table.indexes:
+        index.drop(bind=connection)
+    try:
+        yield
+    finally:
+        connection = db.session.connection()
+        for index in table.indexes:
+            index.create(bind=connection, checkfirst=True)
+
+
+class _Popularity:
+    """Draws product ids with Zipf-distributed popularity (exponent 0 is uniform)"""
+
+    def __init__(self, rng, product_ids, exponent):
+        ranked = list(product_ids)
+        # Which products are popular is random, not tied to their ids
+        rng.shuffle(ranked)
+        self.ranked = ranked
+        self.cumulative = list(itertools.accumulate(1 / rank ** exponent for rank in range(1, len(ranked) + 1)))
+        self.total = self.cumulative[-1]
+        self.random = rng.random
+
+    def draw(self, count):
+        ranked, cumulative, total, random_ = self.ranked, self.cumulative, self.total, self.random
+        last = len(ranked) - 1
+        return [ranked[min(bisect.bisect(cumulative, random_() * total), last)] for _ in range(count)]
+
+
+def _status(rng, age):
+    """Plausible status for an order `age` old: recent ones are still in progress"""
+    if rng.random() < 0.05:
+        return 'cancelled'
+    if age < timedelta(days=1):
+        return rng.choice(('pending', 'paid'))
+    if age < timedelta(days=7):
+        return rng.choice(('paid', 'shipped'))
+    return 'delivered'
+
+
+def seed(user_count, product_count, cart_count, order_count, admin_count=1,
+         order_sizes=None, popularity=1.1, days=365, seed=42, password=DEFAULT_PASSWORD):
+    """
+    Append generated users, products, carts and orders with bulk Core inserts,
+    one transaction per table.
+
+    The same `seed` always produces the same data, with dates relative to now.
+    Every user gets the same password, hashed once with the configured method.
+    Product popularity in carts and orders follows a Zipf distribution with
+    exponent `popularity`, and order sizes follow the `order_sizes` histogram.
+    Orders are spread over the last `days` days. Returns the number of rows
+    inserted per table.
+    """
+    rng = random.Random(seed)
+    now = datetime.utcnow().replace(microsecond=0)
+    history = days * 86400
+    order_sizes = order_sizes or DEFAULT_ORDER_SIZES
+    password_hash = password_hasher.hash(password)
+    counts = {}
+
+    first_user = _next_id(users)
+    _insert(users, [
+        {
+            "id": user_id,
+            "username": f'admin{user_id}' if user_id < first_user + admin_count else f'user{user_id}',
+            "email": f'admin{user_id}@example.com' if user_id < first_user + admin_count else f'user{user_id}@example.com',
+            "password_hash": password_hash,
+            "is_admin": user_id < first_user + admin_count
+        }
+        for user_id in range(first_user, first_user + admin_count + user_count)
+    ])
+    db.session.commit()
+    counts["users"] = admin_count + user_count
+    customer_ids = range(first_user + admin_count, first_user + admin_count + user_count)
+
+    first_product = _next_id(products)
+    prices = []
+    product_categories = []
+    with _deferred_indexes(products, product_count):
+        for start in range(0, product_count, CHUNK_SIZE):
+            size = min(CHUNK_SIZE, product_count - start)
+            categories = rng.choices(CATEGORIES, cum_weights=CATEGORY_WEIGHTS, k=size)
+            words = rng.choices(WORDS, k=size * 3)
+            stocks = rng.choices(STOCK_LEVELS, k=size)
+            chunk_prices = [round(rng.lognormvariate(3, 1), 2) for _ in range(size)]
+            prices += chunk_prices
+            product_categories += categories
+            db.session.execute(products.insert(), [
+                {
+                    "id": first_product + start + i,
+                    "name": f'{words[3 * i].title()} {words[3 * i + 1]} {categories[i]} {first_product + start + i}',
+                    "description": f'A {words[3 * i + 2]} item for {categories[i]} fans',
+                    "price": chunk_prices[i],
+                    "stock": stocks[i],
+                    "category": categories[i],
+                    "created_at": now - timedelta(seconds=int(rng.random() * history))
+                }
+                for i in range(size)
+            ])
+    db.session.commit()
+    counts["products"] = product_count
+
+    if not product_count or not user_count:
+        counts["cart_items"] = counts["orders"] = counts["order_items"] = 0
+        return counts
+
+    popular = _Popularity(rng, range(first_product, first_product + product_count), popularity)
+
+    rows = []
+    for user_id in rng.sample(customer_ids, min(cart_count, user_count)):
+        for product_id in set(popular.draw(rng.randint(1, 5))):
+            rows.append({"user_id": user_id, "product_id": product_id, "quantity": rng.randint(1, 3)})
+    _insert(cart_items, rows)
+    db.session.commit()
+    counts["cart_items"] = len(rows)
+
+    sizes = list(order_sizes)
+    size_weights = list(itertools.accumulate(order_sizes.values()))
+    first_order = _next_id(orders)
+    item_count = 0
+    with _deferred_indexes(orders, order_count):
+        for start in range(0, order_count, CHUNK_SIZE):
+            chunk = min(CHUNK_SIZE, order_count - start)
+            order_lines = rng.choices(sizes, cum_weights=size_weights, k=chunk)
+            picks = iter(popular.draw(sum(order_lines)))
+            buyers = rng.choices(customer_ids, k=chunk)
+            order_rows = []
+            item_rows = []
+            for i in range(chunk):
+                order_id = first_order + start + i
+                lines = {}
+                for product_id in itertools.islice(picks, order_lines[i]):
+                    lines[product_id] = lines.get(product_id, 0) + rng.randint(1, 3)
+                age = timedelta(seconds=int(rng.random() * history))
+                order_rows.append({
+                    "id": order_id,
+                    "user_id": buyers[i],
+                    "status": _status(rng, age),
+                    "total_amount": round(sum(prices[product_id - first_product] * quantity for product_id, quantity in lines.items()), 2),
+                    "created_at": now - age
+                })
+                item_rows += [
+                    {"order_id": order_id, "product_id": product_id, "quantity": quantity,
+                     "price": prices[product_id - first_product], "category": product_categories[product_id - first_product]}
+                    for product_id, quantity in lines.items()
+                ]
+            db.session.execute(orders.insert(), order_rows)
+            db.session.execute(order_items.insert(), item_rows)
+            item_count += len(item_rows)
+    db.session.commit()
+    counts["orders"] = order_count
+    counts["order_items"] = item_count
+    return counts
@@ -0,0 +1,209 @@
+import json
+from flask.json import JSONEncoder
+from marshmallow import Schema, fields
+from marshmallow.utils import missing
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+
+class CompiledSerializer:
+    """
+    A dump-only stand-in for a marshmallow schema instance.
+
+    The schema's fields are turned into one generated Python function that reads
+    each attribute and formats it inline, instead of going through marshmallow's
+    per-field method calls. The output is the same dict `schema.dump()` returns.
+    Field types without a fast path call the marshmallow field itself, and schemas
+    this can't reproduce (dump hooks, custom attribute access, ordered output)
+    keep using `schema.dump()`.
+    """
+
+    def __init__(self, schema):
+        self.schema = schema
+        self.many = schema.many
+        self._dump_one = _compile(schema)
+
+    def dump(self, obj, *, many=None):
+        many = self.many if many is None else bool(many)
+        if many and obj is not None:
+            dump_one = self._dump_one
+            return [dump_one(item) for item in obj]
+        return self._dump_one(obj)
+
+
+def _item_get(obj, key, default):
+    # Same lookup order as marshmallow.utils.get_value for a plain key
+    try:
+        return obj[key]
+    except (KeyError, IndexError, TypeError, AttributeError):
+        return getattr(obj, key, default)
+
+
+def _loaded_values(obj):
+    # Columns an ORM instance has already loaded sit in its __dict__; reading them
+    # there skips SQLAlchemy's attribute descriptor, while anything expired or not
+    # yet loaded is missing and goes through getattr() as usual
+    if hasattr(type(obj), '_sa_class_manager'):
+        return obj.__dict__
+    return _NOTHING
+
+
+_NOTHING = {}
+
+
+def _ensure_text(value):
+    if isinstance(value, bytes):
+        return value.decode('utf-8')
+    return str(value)
+
+
+def _compilable(schema):
+    return (
+        isinstance(schema, Schema)
+        and not schema._has_processors('pre_dump')
+        and not schema._has_processors('post_dump')
+        and type(schema).get_attribute is Schema.get_attribute
+        and schema.dict_class is dict
+    )
+
+
+def _compile(schema):
+    """Build the single-object dump function for a schema instance"""
+    if not _compilable(schema):
+        return lambda obj: schema.dump(obj, many=False)
+
+    namespace = {
+        "MISSING": missing,
+        "_item_get": _item_get,
+        "_loaded_values": _loaded_values,
+        "_ensure_text": _ensure_text,
+        "_getattr": getattr,
+        "_accessor": schema.get_attribute,
+    }
+    lines = [
+        "def dump(obj):",
+        "    get = _item_get if hasattr(obj, '__getitem__') else _getattr",
+        "    loaded = _loaded_values(obj)",
+        "    out = {}",
+    ]
+
+    for index, (name, field) in enumerate(schema.dump_fields.items()):
+        key = field.data_key if field.data_key is not None else name
+        attribute = field.attribute or name
+        field_ref = f"F{index}"
+        namespace[field_ref] = field
+        expression = _fast_expression(field, f"S{index}", namespace)
+
+        if expression is None or '.' in attribute or not field._CHECK_ATTRIBUTE:
+            # Let marshmallow do this one field exactly as it would
+            lines += [
+                f"    v = {field_ref}.serialize({name!r}, obj, accessor=_accessor)",
+                "    if v is not MISSING:",
+                f"        out[{key!r}] = v",
+            ]
+            continue
+
+        lines += [
+            f"    v = loaded.get({attribute!r}, MISSING)",
+            "    if v is MISSING:",
+            f"        v = get(obj, {attribute!r}, MISSING)",
+        ]
+        if field.dump_default is missing:
+            lines += [
+                "    if v is not MISSING:",
+                f"        out[{key!r}] = {expression}",
+            ]
+        else:
+            namespace[f"D{index}"] = field.dump_default
+            default = f"D{index}()" if callable(field.dump_default) else f"D{index}"
+            lines += [
+                "    if v is MISSING:",
+                f"        v = {default}",
+                f"    out[{key!r}] = {expression}",
+            ]
+
+    lines.append("    return out")
+    exec(compile('\n'.join(lines), f"<serializer {type(schema).__name__}>", 'exec'), namespace)
+    return namespace['dump']
+
+
+def _fast_expression(field, ref, namespace):
+    """Inline formatting code for `v`, or None if the field has no fast path"""
+    kind = type(field)
+
+    if isinstance(field, fields.String) and kind._serialize is fields.String._serialize:
+        return "None if v is None else (v if type(v) is str else _ensure_text(v))"
+
+    if (
+        isinstance(field, fields.Number)
+        and kind._serialize is fields.Number._serialize
+        and kind._format_num is fields.Number._format_num
+        and not field.as_string
+    ):
+        namespace[ref] = field.num_type
+        return f"None if v is None else {ref}(v)"
+
+    if kind is fields.DateTime and (field.format or field.DEFAULT_FORMAT) == 'iso':
+        return "None if v is None else v.isoformat()"
+
+    if kind is fields.Nested:
+        nested = field.schema
+        if not _compilable(nested):
+            return None
+        namespace[ref] = _compile(nested)
+        if nested.many or field.many:
+            return f"None if v is None else [{ref}(item) for item in v]"
+        return f"None if v is None else {ref}(v)"
+
+    return None
+
+
+def find_mismatch(schema, serializer, objects):
+    """The first object whose compiled dump differs from marshmallow's, as (expected, actual)"""
+    for obj in objects:
+        expected = schema.dump(obj, many=False)
+        actual = serializer.dump(obj, many=False)
+        # Key order is compared too, so responses are byte-identical when unsorted
+        if expected != actual or list(expected) != list(actual):
+            return expected, actual
+    return None
+
+
+class FastJSONEncoder(JSONEncoder):
+    """
+    Flask JSON encoder that hands the work to orjson when it is installed.
+
+    Dates, dataclasses and anything else orjson can't encode natively still go through
+    Flask's `default()`, so responses parse to the same values as before. Payloads
+    orjson rejects outright (e.g. integers beyond 64 bits) fall back to the stdlib.
+    """
+
+    def encode(self, o):
+        if orjson is not None and self.indent in (None, 2):
+            option = (
+                orjson.OPT_PASSTHROUGH_DATETIME
+                | orjson.OPT_PASSTHROUGH_DATACLASS
+                | orjson.OPT_NON_STR_KEYS
+            )
+            if self.sort_keys:
+                option |= orjson.OPT_SORT_KEYS
+            if self.indent:
+                option |= orjson.OPT_INDENT_2
+            try:
+                return orjson.dumps(o, default=self.default, option=option).decode()
+            except TypeError:
+                pass
+        return super().encode(o)
+
+
+def dumps(obj):
+    """Compact JSON text for already-serialized data, e.g. one NDJSON line"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj).decode()
+        except TypeError:
+            pass
+    return json.dumps(obj, separators=(',', ':'))
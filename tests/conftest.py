@@ -0,0 +1,139 @@
+"""
+Shared fixtures. `app` is a testing-profile app on a fresh SQLite file with the
+schema created, `client` its test client, and `customer` / `admin` seeded users
+with matching `auth_headers` / `admin_headers`. `make_app`, `make_user` and
+`make_product` build more of each. Bound the SQL an endpoint may run with:
+
+    def test_order_list(client, auth_headers, max_queries):
+        with max_queries(2, repeats=3):
+            client.get('/orders', headers=auth_headers)
+
+The block fails if it runs more statements than allowed, or (with `repeats`)
+any one normalized statement that many times, and the failure lists every
+statement group so the culprit is easy to spot.
+"""
+from contextlib import contextmanager
+import pytest
+from app import create_app, db
+from models.product import Product
+from models.user import User
+from services import search as search_index
+from services.authorization import admin_status, create_user_token
+from services.cache import product_cache
+from services.facets import category_facets
+from services.query_inspector import query_inspector
+
+PASSWORD = 'password123'
+
+
+@contextmanager
+def assert_max_queries(count, repeats=None):
+    """Fail if the block runs more than `count` statements, or one statement `repeats` times"""
+    with query_inspector.capture() as log:
+        yield log
+    problems = []
+    if len(log) > count:
+        problems.append(f'expected at most {count} statements, ran {len(log)}')
+    if repeats is not None:
+        for group in log.repeated(repeats):
+            problems.append(f'possible N+1: {group.count} x {group.sql}')
+    if problems:
+        pytest.fail('\n'.join(problems) + '\n' + log.report(), pytrace=False)
+
+
+@pytest.fixture
+def max_queries():
+    return assert_max_queries
+
+
+@pytest.fixture
+def make_app(tmp_path):
+    """Build a testing-profile app on its own SQLite file, with `overrides` on top"""
+    created = []
+
+    def make(name='test', **overrides):
+        # A file rather than :memory:, so request threads get their own connections
+        config = {'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / f"{name}.db"}', **overrides}
+        app = create_app('testing', config)
+        created.append(app)
+        return app
+
+    yield make
+    for app in created:
+        with app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+
+
+@pytest.fixture
+def app(make_app):
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        search_index.create_index()
+        db.session.commit()
+        # Process-wide caches would otherwise serve rows from an earlier test's database
+        product_cache.clear()
+        category_facets.invalidate()
+        yield app
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def reserving(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'STOCK_RESERVATIONS_ENABLED', True)
+
+
+@pytest.fixture
+def make_user(app):
+    def make(username, is_admin=False):
+        user = User(username=username, email=f'{username}@example.com', is_admin=is_admin)
+        user.set_password(PASSWORD)
+        db.session.add(user)
+        db.session.commit()
+        admin_status.revoke(user.id)
+        return user
+    return make
+
+
+@pytest.fixture
+def make_headers():
+    def make(user):
+        return {'Authorization': f'Bearer {create_user_token(user)}'}
+    return make
+
+
+@pytest.fixture
+def make_product(app):
+    """Add a product and return its id"""
+    def make(stock=10, category='books', price=10.0, name='Limited'):
+        product = Product(name=name, price=price, stock=stock, category=category)
+        db.session.add(product)
+        db.session.commit()
+        return product.id
+    return make
+
+
+@pytest.fixture
+def customer(make_user):
+    return make_user('customer')
+
+
+@pytest.fixture
+def admin(make_user):
+    return make_user('admin', is_admin=True)
+
+
+@pytest.fixture
+def auth_headers(customer, make_headers):
+    return make_headers(customer)
+
+
+@pytest.fixture
+def admin_headers(admin, make_headers):
+    return make_headers(admin)
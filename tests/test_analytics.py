@@ -0,0 +1,77 @@
+import threading
+from datetime import datetime
+from sqlalchemy import event
+from app import db
+from models.order import Order
+from models.product import Product
+from services import analytics, ordering
+from services.payments import payment_pipeline
+
+
+def _categories():
+    return sorted((row["key"], row["status"], row["units"]) for row in analytics.query('category'))
+
+
+def test_recategorized_product_keeps_sales_in_original_category(customer, make_product):
+    book = db.session.get(Product, make_product(name='Novel'))
+    orders, _, _ = ordering.create_orders(customer.id, [{"items": [{"product_id": book.id, "quantity": 2}]}])
+    db.session.commit()
+
+    book.category = 'gifts'
+    db.session.commit()
+    # Moves the order's totals between status buckets, re-reading its lines
+    payment_pipeline.mark_paid('pi_test', orders[0].id)
+
+    incremental = _categories()
+    analytics.backfill()
+
+    assert incremental == [('books', 'paid', 2)]
+    assert _categories() == incremental
+
+
+def _totals(client, admin_headers, **params):
+    response = client.get('/admin/analytics', query_string=params, headers=admin_headers)
+    assert response.status_code == 200
+    return [(row["status"], row["orders"]) for row in response.get_json()["results"]]
+
+
+def test_to_with_a_time_includes_that_day(client, customer, admin_headers, make_product):
+    ordering.create_orders(customer.id, [{"items": [{"product_id": make_product(), "quantity": 1}]}])
+    db.session.commit()
+    today = datetime.utcnow().date()
+
+    assert _totals(client, admin_headers, to=f'{today}T23:59:59') == [('pending', 1)]
+    assert _totals(client, admin_headers, to=today.isoformat()) == []
+
+
+def test_status_update_that_lost_a_race_is_not_recorded(app, client, customer, admin_headers, make_product):
+    orders, _, _ = ordering.create_orders(customer.id, [{"items": [{"product_id": make_product(), "quantity": 1}]}])
+    db.session.commit()
+    order_id = orders[0].id
+    # The request shares this thread's session; make it read the order like a fresh request would
+    db.session.expunge_all()
+    started = threading.Event()
+
+    def ship():
+        with app.app_context():
+            Order.query.filter_by(id=order_id).update({"status": "shipped"})
+            db.session.commit()
+
+    # Another admin ships the order after this request has read it
+    def after_read(conn, cursor, statement, parameters, context, executemany):
+        if not started.is_set() and statement.startswith('SELECT "order".'):
+            started.set()
+            thread = threading.Thread(target=ship)
+            thread.start()
+            thread.join()
+
+    event.listen(db.engine, 'after_cursor_execute', after_read)
+    try:
+        response = client.put(f'/admin/orders/{order_id}/status', json={"status": "delivered"}, headers=admin_headers)
+    finally:
+        event.remove(db.engine, 'after_cursor_execute', after_read)
+
+    assert response.status_code == 409
+    db.session.expire_all()
+    assert db.session.get(Order, order_id).status == 'shipped'
+    assert _totals(client, admin_headers) == [('pending', 1)]
@@ -0,0 +1,57 @@
+import pytest
+from app import db
+from models.user import User
+from services import authorization
+from services.authorization import admin_status
+
+
+def _demote(user):
+    User.query.filter_by(id=user.id).update({"is_admin": False})
+    db.session.commit()
+
+
+@pytest.mark.parametrize('headers, status', [(None, 401), ('auth_headers', 403), ('admin_headers', 200)])
+def test_admin_routes_require_an_admin(client, request, headers, status):
+    headers = request.getfixturevalue(headers) if headers else {}
+
+    assert client.get('/admin/cache', headers=headers).status_code == status
+    assert client.get('/admin/orders', headers=headers).status_code == status
+
+
+def test_demoted_admin_keeps_access_until_ttl(app, client, admin, admin_headers, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(authorization.time, 'monotonic', lambda: now[0])
+    ttl = app.config['ADMIN_STATUS_TTL']
+    assert client.get('/admin/cache', headers=admin_headers).status_code == 200
+
+    _demote(admin)
+
+    # The cached status still holds within the TTL ...
+    now[0] += ttl - 1
+    assert client.get('/admin/cache', headers=admin_headers).status_code == 200
+    # ... and is re-checked once it has passed
+    now[0] += 2
+    assert client.get('/admin/cache', headers=admin_headers).status_code == 403
+
+
+def test_revoke_applies_demotion_immediately(client, admin, admin_headers):
+    assert client.get('/admin/cache', headers=admin_headers).status_code == 200
+
+    _demote(admin)
+    admin_status.revoke(admin.id)
+
+    assert client.get('/admin/cache', headers=admin_headers).status_code == 403
+
+
+def test_register_ignores_is_admin(client):
+    response = client.post('/auth/register', json={
+        "username": 'mallory',
+        "email": 'mallory@example.com',
+        "password": 'password123',
+        "is_admin": True
+    })
+
+    assert response.status_code == 201
+    assert response.get_json()["user"]["is_admin"] is False
+    token = response.get_json()["access_token"]
+    assert client.get('/admin/cache', headers={'Authorization': f'Bearer {token}'}).status_code == 403
@@ -0,0 +1,244 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import event, func
+from app import db
+from models.cart import CartItem
+from models.order import OrderItem
+from models.product import Product
+from models.reservation import StockReservation
+from services import inventory
+from services.cart_store import cart_store
+from services.facets import category_facets
+
+
+def test_reserving_last_unit_updates_facets(client, auth_headers, reserving, make_product):
+    product_id = make_product(stock=1)
+    assert category_facets.get() == [{"category": "books", "count": 1, "in_stock": 1}]
+
+    response = client.post('/cart', json={"product_id": product_id, "quantity": 1}, headers=auth_headers)
+
+    assert response.status_code == 201
+    assert category_facets.get() == [{"category": "books", "count": 1, "in_stock": 0}]
+
+
+@pytest.fixture
+def customers(make_user, make_headers):
+    return [make_headers(make_user(f'racer{i}')) for i in range(12)]
+
+
+def _race(app, customers, action):
+    """Run action(client, headers) for every customer at once; returns the responses"""
+    start = threading.Barrier(len(customers))
+
+    def run(headers):
+        client = app.test_client()
+        start.wait()
+        return action(client, headers)
+
+    with ThreadPoolExecutor(max_workers=len(customers)) as pool:
+        return list(pool.map(run, customers))
+
+
+@pytest.mark.parametrize('reservations', [False, True])
+def test_concurrent_checkout_never_oversells(app, monkeypatch, make_product, customers, reservations):
+    monkeypatch.setitem(app.config, 'STOCK_RESERVATIONS_ENABLED', reservations)
+    stock = 5
+    product_id = make_product(stock)
+
+    def add(client, headers):
+        return client.post('/cart', json={"product_id": product_id, "quantity": 1}, headers=headers)
+
+    def checkout(client, headers):
+        return client.post('/cart/checkout', headers=headers)
+
+    def add_and_checkout(client, headers):
+        added = add(client, headers)
+        return added, checkout(client, headers) if added.status_code == 201 else None
+
+    if reservations:
+        # Reserving and checking out race each other
+        results = _race(app, customers, add_and_checkout)
+        checkouts = [result for added, result in results if result is not None]
+    else:
+        # Every cart fits the stock on its own; only the checkouts compete
+        assert all(response.status_code == 201 for response in _race(app, customers, add))
+        checkouts = _race(app, customers, checkout)
+
+    assert all(response.status_code in (201, 400) for response in checkouts)
+    assert sum(response.status_code == 201 for response in checkouts) == stock
+
+    db.session.expire_all()
+    sold = db.session.query(func.sum(OrderItem.quantity)).filter(OrderItem.product_id == product_id).scalar()
+    assert sold == stock
+    assert db.session.get(Product, product_id).stock == 0
+
+
+@pytest.mark.parametrize('reservations, budget', [(False, 10), (True, 11)])
+@pytest.mark.parametrize('items', [1, 5])
+def test_checkout_statement_budget(app, client, auth_headers, max_queries, monkeypatch, make_product, items, reservations, budget):
+    monkeypatch.setitem(app.config, 'STOCK_RESERVATIONS_ENABLED', reservations)
+    product_ids = [make_product(stock=10) for _ in range(items)]
+    for product_id in product_ids:
+        client.post('/cart', json={"product_id": product_id, "quantity": 1}, headers=auth_headers)
+    # Without DELETE ... RETURNING each reservation is claimed by its own conditional delete
+    claims = 0 if not reservations or db.engine.dialect.full_returning else items - 1
+
+    # The same statements whatever the cart size; only reservations add their lookup and delete
+    with max_queries(budget + claims) as log:
+        response = client.post('/cart/checkout', headers=auth_headers)
+
+    assert response.status_code == 201
+    assert len(response.get_json()["order"]["items"]) == items
+    repeated = [group.sql for group in log.repeated(3)]
+    assert repeated == (['DELETE FROM stock_reservation WHERE stock_reservation.id = ? AND stock_reservation.quantity = ?'] if claims else [])
+
+
+def test_checkout_and_expiry_sweep_never_both_count_a_reservation(app, client, auth_headers, reserving, make_product):
+    product_id = make_product(stock=5)
+    client.post('/cart', json={"product_id": product_id, "quantity": 2}, headers=auth_headers)
+    StockReservation.query.update({"expires_at": datetime.utcnow() - timedelta(seconds=1)})
+    db.session.commit()
+    swept = []
+    started = threading.Event()
+
+    def sweep():
+        with app.app_context():
+            swept.append(inventory.release_expired())
+            db.session.commit()
+
+    # Checkout has read the expired reservation; the sweep releases it before checkout deletes it
+    def after_read(conn, cursor, statement, parameters, context, executemany):
+        if not started.is_set() and statement.startswith('SELECT stock_reservation.'):
+            started.set()
+            thread = threading.Thread(target=sweep)
+            thread.start()
+            thread.join()
+
+    event.listen(db.engine, 'after_cursor_execute', after_read)
+    try:
+        response = client.post('/cart/checkout', headers=auth_headers)
+    finally:
+        event.remove(db.engine, 'after_cursor_execute', after_read)
+
+    # The sweep restocked the units, so checkout had to take them again
+    assert swept == [1]
+    assert response.status_code == 201
+    db.session.expire_all()
+    assert db.session.get(Product, product_id).stock == 3
+    assert StockReservation.query.count() == 0
+
+
+def _patch(client, headers, *operations, atomic=False):
+    return client.patch('/cart', json={"operations": list(operations), "atomic": atomic}, headers=headers)
+
+
+def test_patch_applies_what_it_can_and_reports_the_rest(client, customer, auth_headers, make_product):
+    plenty, scarce = make_product(stock=5), make_product(stock=1)
+
+    response = _patch(
+        client, auth_headers,
+        {"op": "add", "product_id": plenty, "quantity": 2},
+        {"op": "set", "product_id": scarce, "quantity": 3},
+        {"op": "remove", "product_id": scarce},
+        {"op": "add", "product_id": plenty, "quantity": 1},
+    )
+
+    assert response.status_code == 200
+    assert [result["status"] for result in response.get_json()["results"]] == ['ok', 'error', 'error', 'ok']
+    assert response.get_json()["results"][3]["quantity"] == 3
+    assert cart_store.quantities(customer.id) == {plenty: 3}
+
+
+def test_atomic_patch_changes_nothing_when_an_operation_fails(client, customer, auth_headers, make_product):
+    first, scarce = make_product(stock=5), make_product(stock=1)
+    _patch(client, auth_headers, {"op": "add", "product_id": first, "quantity": 1})
+
+    response = _patch(
+        client, auth_headers,
+        {"op": "set", "product_id": first, "quantity": 4},
+        {"op": "add", "product_id": scarce, "quantity": 2},
+        atomic=True
+    )
+
+    assert response.status_code == 400
+    assert cart_store.quantities(customer.id) == {first: 1}
+
+
+def test_patch_moves_reserved_stock(client, auth_headers, reserving, make_product):
+    product_id = make_product(stock=5)
+
+    def stock():
+        db.session.expire_all()
+        return db.session.get(Product, product_id).stock
+
+    _patch(client, auth_headers, {"op": "add", "product_id": product_id, "quantity": 3})
+    assert stock() == 2
+    _patch(client, auth_headers, {"op": "set", "product_id": product_id, "quantity": 1})
+    assert stock() == 4
+    _patch(client, auth_headers, {"op": "remove", "product_id": product_id})
+    assert stock() == 5
+    assert StockReservation.query.count() == 0
+
+
+@pytest.fixture
+def memory_carts(app):
+    # A long interval so only the tests' own flush() calls write behind
+    app.config.update(CART_BACKEND='memory', CART_WRITE_BEHIND_INTERVAL=3600)
+    cart_store.init_app(app)
+    yield cart_store.backend
+    cart_store.write_behind.stop()
+    app.config.update(CART_BACKEND='sql', CART_WRITE_BEHIND_INTERVAL=0)
+    cart_store.init_app(app)
+
+
+def _rows(user_id):
+    return dict(db.session.query(CartItem.product_id, CartItem.quantity).filter_by(user_id=user_id).all())
+
+
+def test_memory_cart_changes_only_when_the_transaction_commits(client, customer, auth_headers, memory_carts, make_product):
+    first, second = make_product(), make_product()
+    _patch(client, auth_headers, {"op": "add", "product_id": first, "quantity": 2})
+
+    cart_store.write(customer.id, {second: 1})
+    db.session.rollback()
+    failed = _patch(client, auth_headers, {"op": "remove", "product_id": first},
+                    {"op": "add", "product_id": second, "quantity": 99}, atomic=True)
+
+    assert failed.status_code == 400
+    assert memory_carts.read(customer.id) == {first: 2}
+    assert [line["product"]["id"] for line in client.get('/cart', headers=auth_headers).get_json()] == [first]
+
+    assert client.post('/cart/checkout', headers=auth_headers).status_code == 201
+    assert memory_carts.read(customer.id) == {}
+
+
+def test_write_behind_copies_changed_carts_and_reloads_expired_ones(client, customer, auth_headers, memory_carts, make_product):
+    # flush() ends this thread's session, so ids are read up front
+    user_id, first, second = customer.id, make_product(), make_product()
+    _patch(client, auth_headers, {"op": "add", "product_id": first, "quantity": 2},
+           {"op": "add", "product_id": second, "quantity": 1})
+    assert _rows(user_id) == {}
+
+    assert cart_store.write_behind.flush() == 1
+    assert _rows(user_id) == {first: 2, second: 1}
+    assert cart_store.write_behind.flush() == 0
+
+    # As if the cart had expired from memory
+    memory_carts.client.delete(f'cart:{user_id}')
+    assert cart_store.quantities(user_id) == {first: 2, second: 1}
+
+
+def test_emptied_memory_cart_is_not_reloaded_from_stale_rows(client, customer, auth_headers, memory_carts, make_product):
+    user_id, product_id = customer.id, make_product()
+    _patch(client, auth_headers, {"op": "add", "product_id": product_id, "quantity": 1})
+    cart_store.write_behind.flush()
+
+    _patch(client, auth_headers, {"op": "remove", "product_id": product_id})
+
+    # The rows are only rewritten on the next flush, but the empty cart is still in memory
+    assert _rows(user_id) == {product_id: 1}
+    assert cart_store.quantities(user_id) == {}
+    cart_store.write_behind.flush()
+    assert _rows(user_id) == {}
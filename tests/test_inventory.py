@@ -0,0 +1,47 @@
+import pytest
+from app import db
+from models.product import Product
+from services import inventory
+
+
+@pytest.fixture
+def stocked(make_product):
+    return [make_product(stock=5, name=f'Item {i}') for i in range(3)]
+
+
+def _stock(product_id):
+    return db.session.execute(db.select(Product.stock).where(Product.id == product_id)).scalar()
+
+
+def test_adjust_stock_reports_applied_changes(stocked):
+    first, second, third = stocked
+
+    report = inventory.adjust_stock([
+        {"id": first, "delta": -2},
+        {"id": second, "stock": 0},
+        {"id": third, "delta": -6},
+        {"id": 999, "stock": 1},
+    ], chunk_size=2)
+
+    assert report["updated"] == 2
+    assert report["updated_ids"] == [first, second]
+    assert report["missing"] == [999]
+    assert report["rejected"] == [{"id": third, "reason": "Only 5 in stock"}]
+    assert report["stock_crossed"] is True
+
+
+@pytest.mark.parametrize('batched', [True, False])
+def test_adjust_stock_counts_rows_the_guarded_update_skipped(stocked, monkeypatch, batched):
+    first, lost, third = stocked
+    # As if a concurrent checkout emptied `lost` between the SELECT and the UPDATE
+    monkeypatch.setattr(inventory, '_adjust', inventory._adjust.where(inventory.products.c.id != lost))
+    monkeypatch.setattr(db.engine.dialect, 'supports_sane_multi_rowcount', batched)
+
+    report = inventory.adjust_stock([{"id": product_id, "delta": -1} for product_id in stocked], chunk_size=10)
+
+    assert report["updated"] == 2
+    assert report["updated_ids"] == [first, third]
+    assert [rejected["id"] for rejected in report["rejected"]] == [lost]
+    # Retrying the chunk one statement at a time never applies a change twice
+    db.session.expire_all()
+    assert [_stock(product_id) for product_id in stocked] == [4, 5, 4]
@@ -0,0 +1,64 @@
+from app import db
+from models.product import Product
+from services import ordering
+
+
+def test_order_list(client, customer, auth_headers, max_queries, make_product):
+    product_ids = [make_product() for _ in range(3)]
+    orders, errors, _ = ordering.create_orders(customer.id, [
+        {"items": [{"product_id": product_id, "quantity": 1} for product_id in product_ids]}
+        for _ in range(5)
+    ])
+    db.session.commit()
+    assert not errors
+
+    with max_queries(2, repeats=3):
+        response = client.get('/orders', headers=auth_headers)
+    assert response.status_code == 200
+    assert len(response.get_json()) == 5
+
+
+def test_orders_are_priced_from_the_catalog(client, auth_headers, make_product):
+    product_id = make_product(price=12.5, stock=3)
+
+    response = client.post('/orders/', json={"items": [{"product_id": product_id, "quantity": 2, "price": 0.01}]},
+                           headers=auth_headers)
+
+    assert response.status_code == 201
+    order = response.get_json()
+    assert order["total_amount"] == 25.0
+    assert [item["price"] for item in order["items"]] == [12.5]
+    assert db.session.get(Product, product_id).stock == 1
+
+
+def test_batch_short_of_stock_creates_nothing(client, auth_headers, make_product):
+    plenty, scarce = make_product(stock=10), make_product(stock=3)
+    batch = {"orders": [
+        {"items": [{"product_id": plenty, "quantity": 1}, {"product_id": scarce, "quantity": 2}]},
+        {"items": [{"product_id": plenty, "quantity": 1}]},
+        {"items": [{"product_id": scarce, "quantity": 2}]},
+    ]}
+
+    response = client.post('/orders/', json=batch, headers=auth_headers)
+
+    assert response.status_code == 400
+    assert response.get_json()["errors"] == {
+        "0": [f"Not enough stock for product {scarce}"],
+        "2": [f"Not enough stock for product {scarce}"]
+    }
+    db.session.expire_all()
+    assert [db.session.get(Product, product_id).stock for product_id in (plenty, scarce)] == [10, 3]
+    assert client.get('/orders', headers=auth_headers).get_json() == []
+
+
+def test_cancelling_restores_only_the_stock_taken(client, customer, auth_headers, make_product):
+    product_id = make_product(stock=5)
+    # Created without the endpoint, whose payment worker would mark the order paid
+    orders, _, _ = ordering.create_orders(customer.id, [{"items": [{"product_id": product_id, "quantity": 2}]}])
+    db.session.commit()
+    assert db.session.get(Product, product_id).stock == 3
+
+    assert client.post(f'/orders/{orders[0].id}/cancel', headers=auth_headers).status_code == 200
+
+    db.session.expire_all()
+    assert db.session.get(Product, product_id).stock == 5
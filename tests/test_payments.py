@@ -0,0 +1,170 @@
+import importlib
+import json
+import time
+from datetime import datetime, timedelta
+import pytest
+import stripe
+from app import config, db
+from models.order import Order
+from models.product import Product
+from services import ordering
+from services.payments import payment_pipeline
+
+SECRET = 'whsec_test'
+
+
+@pytest.fixture
+def pending_order(customer, make_product):
+    orders, _, _ = ordering.create_orders(customer.id, [{"items": [{"product_id": make_product(), "quantity": 1}]}])
+    db.session.commit()
+    return orders[0].id
+
+
+@pytest.fixture
+def signed(monkeypatch):
+    # As if the Stripe provider were configured with its secret
+    monkeypatch.setattr(payment_pipeline, 'webhook_secret', SECRET)
+
+
+def _succeeded(order_id):
+    return {
+        "type": "payment_intent.succeeded",
+        "data": {"object": {"id": "pi_test", "metadata": {"order_id": str(order_id)}}}
+    }
+
+
+def test_stripe_provider_requires_webhook_secret(make_app, monkeypatch):
+    monkeypatch.delenv('STRIPE_WEBHOOK_SECRET', raising=False)
+    with pytest.raises(RuntimeError):
+        make_app('stripe', PAYMENT_PROVIDER='stripe', STRIPE_WEBHOOK_SECRET=None)
+
+
+def test_unsigned_event_is_rejected(client, pending_order, signed):
+    response = client.post('/payments/webhook', json=_succeeded(pending_order))
+
+    assert response.status_code == 400
+    assert db.session.get(Order, pending_order).status == 'pending'
+
+
+def test_signed_event_marks_order_paid(client, pending_order, signed):
+    payload = json.dumps(_succeeded(pending_order))
+    timestamp = int(time.time())
+    signature = stripe.WebhookSignature._compute_signature(f'{timestamp}.{payload}', SECRET)
+
+    response = client.post('/payments/webhook', data=payload, headers={
+        'Content-Type': 'application/json',
+        'Stripe-Signature': f't={timestamp},v1={signature}'
+    })
+
+    assert response.status_code == 200
+    db.session.expire_all()
+    assert db.session.get(Order, pending_order).status == 'paid'
+
+
+@pytest.mark.parametrize('event', [
+    {"type": "payment_intent.succeeded", "data": {"object": {"id": "pi_1", "metadata": None}}},
+    {"type": "payment_intent.succeeded", "data": {"object": {"id": "pi_1", "metadata": {"order_id": "1; x"}}}},
+    {"type": "payment_intent.succeeded", "data": None},
+    {"type": "payment_intent.succeeded"},
+    [],
+])
+def test_malformed_event_is_rejected(client, event):
+    assert client.post('/payments/webhook', json=event).status_code == 400
+
+
+def _age(order_id, seconds):
+    Order.query.filter_by(id=order_id).update({"created_at": datetime.utcnow() - timedelta(seconds=seconds)})
+    db.session.commit()
+
+
+def test_sweep_resubmits_orders_without_intent(pending_order):
+    _age(pending_order, 600)
+
+    futures = payment_pipeline.sweep(older_than=300)
+
+    assert [future.result()["id"] is not None for future in futures] == [True]
+    db.session.expire_all()
+    order = db.session.get(Order, pending_order)
+    assert order.status == 'paid' and order.payment_intent_id
+    assert payment_pipeline.sweep(older_than=300) == []
+
+
+def test_sweep_skips_recent_orders(pending_order):
+    assert payment_pipeline.sweep(older_than=300) == []
+
+
+def test_payment_is_pending_until_intent_exists(client, pending_order, auth_headers, admin_headers):
+    response = client.get(f'/orders/{pending_order}/payment', headers=auth_headers)
+    assert response.status_code == 202
+    assert response.get_json()["client_secret"] is None
+
+    # Other users can't see it
+    assert client.get(f'/orders/{pending_order}/payment', headers=admin_headers).status_code == 404
+
+
+def test_payment_exposes_client_secret_to_owner(client, pending_order, auth_headers, monkeypatch):
+    Order.query.filter_by(id=pending_order).update({"payment_intent_id": "pi_test"})
+    db.session.commit()
+    monkeypatch.setattr(payment_pipeline.provider, 'client_secret', lambda intent_id: f'{intent_id}_secret')
+
+    response = client.get(f'/orders/{pending_order}/payment', headers=auth_headers)
+
+    assert response.status_code == 200
+    assert response.get_json()["client_secret"] == 'pi_test_secret'
+
+
+def test_created_orders_are_submitted_for_payment(client, auth_headers, make_product, monkeypatch):
+    futures = []
+    submit = payment_pipeline.submit
+
+    def tracked(order_id, amount):
+        futures.append(submit(order_id, amount))
+        return futures[-1]
+
+    monkeypatch.setattr(payment_pipeline, 'submit', tracked)
+
+    response = client.post('/orders/', json={"items": [{"product_id": make_product(), "quantity": 1}]},
+                           headers=auth_headers)
+
+    assert response.status_code == 201
+    assert [future.result()["id"] is not None for future in futures] == [True]
+    db.session.expire_all()
+    assert db.session.get(Order, response.get_json()["id"]).status == 'paid'
+
+
+def test_failed_sweep_returns_only_the_stock_taken(customer, make_product, monkeypatch):
+    product_id = make_product(stock=5)
+    orders, _, _ = ordering.create_orders(customer.id, [{"items": [{"product_id": product_id, "quantity": 2}]}])
+    db.session.commit()
+    _age(orders[0].id, 600)
+    monkeypatch.setattr(payment_pipeline.provider, 'failure_rate', 1.0)
+    monkeypatch.setattr(payment_pipeline, 'max_retries', 0)
+
+    assert [future.result() for future in payment_pipeline.sweep(older_than=300)] == [None]
+
+    db.session.expire_all()
+    assert db.session.get(Order, orders[0].id).status == 'cancelled'
+    assert db.session.get(Product, product_id).stock == 5
+
+
+def test_development_profile_starts_without_stripe(monkeypatch):
+    monkeypatch.delenv('PAYMENT_PROVIDER', raising=False)
+    monkeypatch.delenv('STRIPE_WEBHOOK_SECRET', raising=False)
+    importlib.reload(config)
+    try:
+        assert config.Config.PAYMENT_PROVIDER == 'fake'
+        assert config.ProductionConfig.PAYMENT_PROVIDER == 'stripe'
+    finally:
+        monkeypatch.undo()
+        importlib.reload(config)
+
+
+def test_unexpected_processing_errors_are_logged(pending_order, monkeypatch, caplog):
+    def broken(order_id, intent_id):
+        raise RuntimeError('database went away')
+    monkeypatch.setattr(payment_pipeline, '_attach', broken)
+
+    with pytest.raises(RuntimeError):
+        payment_pipeline.submit(pending_order, 10.0).result()
+
+    assert f'Payment processing failed for order {pending_order}' in caplog.text
@@ -0,0 +1,61 @@
+import pytest
+from resources import product as product_resource
+from services.cache import product_cache
+from services.facets import category_facets
+
+
+@pytest.mark.parametrize('path', ['/products/{id}', '/products?limit=5'])
+def test_unchanged_response_is_not_modified(client, make_product, path):
+    url = path.format(id=make_product())
+    first = client.get(url)
+    assert first.status_code == 200 and first.headers['ETag']
+
+    response = client.get(url, headers={'If-None-Match': first.headers['ETag']})
+
+    assert response.status_code == 304
+    assert response.data == b''
+
+
+def test_update_invalidates_cached_product(client, admin_headers, make_product):
+    product_id = make_product(price=10.0)
+    first = client.get(f'/products/{product_id}')
+
+    assert client.put(f'/products/{product_id}', json={"price": 12.0}, headers=admin_headers).status_code == 200
+
+    response = client.get(f'/products/{product_id}', headers={'If-None-Match': first.headers['ETag']})
+    assert response.status_code == 200
+    assert response.get_json()["price"] == 12.0
+
+
+def test_read_racing_a_write_is_not_cached(client, make_product, monkeypatch):
+    product_id = make_product()
+    dump = product_resource.product_serializer.dump
+
+    def dump_during_write(product):
+        # A write commits and invalidates while this read is still building its response
+        product_cache.invalidate(product_id)
+        return dump(product)
+
+    monkeypatch.setattr(product_resource.product_serializer, 'dump', dump_during_write)
+    assert client.get(f'/products/{product_id}').status_code == 200
+
+    assert product_cache.get_product(product_id) is None
+
+
+def test_facet_load_racing_a_write_is_not_cached(app, make_product, monkeypatch):
+    make_product()
+    loads = []
+    load = category_facets._load
+
+    def load_during_write():
+        loads.append(load())
+        if len(loads) == 1:
+            category_facets.invalidate()
+        return loads[-1]
+
+    monkeypatch.setattr(category_facets, '_load', load_during_write)
+    category_facets.get()
+    category_facets.get()
+
+    # The first result was served but not kept, so the second call loaded again
+    assert len(loads) == 2
@@ -0,0 +1,17 @@
+from services import query_plans, seeding
+
+
+def test_hot_endpoints_use_indexes(app):
+    seeding.seed(20, 200, 5, 50)
+
+    offenders, skipped = query_plans.check(app)
+
+    assert skipped == []
+    assert offenders == [], '\n'.join(f'{path}: {statement}\n  {plan}' for path, statement, plan in offenders)
+
+
+def test_empty_database_reports_skipped_endpoints(app):
+    offenders, skipped = query_plans.check(app)
+
+    assert offenders == []
+    assert {reason for _, reason in skipped} == {'no products', 'no users', 'no orders', 'no admin user'}
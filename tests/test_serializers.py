@@ -0,0 +1,131 @@
+from datetime import datetime, timedelta, timezone
+import pytest
+from marshmallow import Schema, fields
+import schemas
+import serializers
+from app import db
+from models.cart import CartItem
+from models.order import Order, OrderItem
+from models.product import Product
+from models.user import User
+from services.cart_store import CartLine
+from services.projection import OrderProjection, order_options
+from services.serialization import CompiledSerializer, find_mismatch
+
+NOW = datetime(2026, 10, 17, 6, 14, 39, 332982)
+
+
+def _match(schema, serializer, objects):
+    assert objects, 'nothing to compare'
+    assert find_mismatch(schema, serializer, objects) is None
+
+
+@pytest.fixture
+def products():
+    return [
+        Product(id=1, name='Full', description='Text', price=9.5, stock=3, image_url='https://example.com/1.png',
+                category='books', created_at=NOW),
+        # Every nullable column left empty
+        Product(id=2, name='Bare', price=0.0, stock=0, description=None, image_url=None, category=None, created_at=None),
+        Product(id=3, name=b'bytes', price=1, stock=1, created_at=NOW.replace(tzinfo=timezone.utc)),
+        Product(id=4, name='Unicode é漢', price=1e-9, stock=10 ** 12, created_at=NOW.replace(microsecond=0)),
+    ]
+
+
+@pytest.fixture
+def orders(products):
+    return [
+        Order(id=1, user_id=1, status='paid', total_amount=19.0, created_at=NOW, payment_intent_id='pi_1',
+              items=[OrderItem(id=1, order_id=1, product_id=1, quantity=2, price=9.5, product=products[0]),
+                     OrderItem(id=2, order_id=1, product_id=2, quantity=1, price=0.0, product=products[1])]),
+        # Pending, without an intent, and an item whose product was deleted
+        Order(id=2, user_id=1, status='pending', total_amount=1.0, created_at=NOW, payment_intent_id=None,
+              items=[OrderItem(id=3, order_id=2, product_id=9, quantity=1, price=1.0, product=None)]),
+        Order(id=3, user_id=2, status=None, total_amount=0.0, created_at=None, items=[]),
+    ]
+
+
+def test_users():
+    users = [
+        User(id=1, username='admin', email='admin@example.com', is_admin=True),
+        User(id=2, username='customer', email='customer@example.com', is_admin=False),
+        # is_admin has a dump default, so an unset value is not the same as None
+        User(id=3, username='unset', email='unset@example.com'),
+        User(id=4, username='null', email='null@example.com', is_admin=None),
+    ]
+    _match(schemas.user_schema, serializers.user_serializer, users)
+
+
+def test_products(products):
+    _match(schemas.product_schema, serializers.product_serializer, products)
+
+
+def test_product_rows(app, products):
+    db.session.add_all(products[:2] + products[3:])
+    db.session.commit()
+    rows = db.session.execute(Product.__table__.select()).all()
+
+    _match(schemas.product_schema, serializers.product_serializer, rows)
+    # Mappings, as the product cache stores them
+    _match(schemas.product_schema, serializers.product_serializer, [dict(row._mapping) for row in rows])
+
+
+def test_cart_items(products):
+    lines = [
+        CartItem(id=1, user_id=1, product_id=1, quantity=2, product=products[0]),
+        CartItem(id=2, user_id=1, product_id=9, quantity=1, product=None),
+        CartLine(1, 1, 3, products[1]),
+        CartLine(1, 9, 1),
+    ]
+    _match(schemas.cart_item_schema, serializers.cart_item_serializer, lines)
+
+
+def test_orders(orders):
+    _match(schemas.order_schema, serializers.order_serializer, orders)
+
+
+def test_loaded_orders(app, customer, products, orders):
+    # The deleted product's item can't be stored, its product_id would be nulled
+    db.session.add_all(products + [orders[0], orders[2]])
+    db.session.commit()
+    # Expired after the commit, so values come through SQLAlchemy's attribute loading
+    _match(schemas.order_schema, serializers.order_serializer, Order.query.options(*order_options()).all())
+
+
+@pytest.mark.parametrize('fields, expand', [
+    (('id', 'status'), ()),
+    (('id', 'total_amount'), ('items',)),
+    (('id', 'created_at', 'payment_intent_id'), ('items', 'items.product')),
+])
+def test_order_projections(orders, fields, expand):
+    serializer = OrderProjection(fields, expand).serializer()
+    _match(serializer.schema, serializer, orders)
+
+
+class _LineSchema(Schema):
+    sku = fields.Str(attribute='product_id', data_key='SKU')
+    count = fields.Int(data_key='qty', dump_default=1)
+    note = fields.Str(dump_default=lambda: 'none')
+
+
+class _DocumentSchema(Schema):
+    id = fields.Int(data_key='documentId')
+    title = fields.Str(dump_default='untitled')
+    at = fields.DateTime(data_key='timestamp')
+    lines = fields.Nested(_LineSchema, many=True)
+    main = fields.Nested(_LineSchema, data_key='mainLine', allow_none=True)
+    owner = fields.Str(attribute='meta.owner')
+    tags = fields.List(fields.Str())
+
+
+def test_data_keys_and_defaults():
+    documents = [
+        {"id": 1, "title": "Full", "at": NOW, "lines": [{"product_id": 7, "count": 2, "note": "x"}],
+         "main": {"product_id": 7}, "meta": {"owner": "me"}, "tags": ["a", None]},
+        # Missing keys fall back to dump defaults or are left out
+        {"id": 2, "lines": [{}], "main": None},
+        {"id": None, "title": None, "at": None, "lines": None, "tags": []},
+        {},
+    ]
+    schema = _DocumentSchema()
+    _match(schema, CompiledSerializer(schema), documents)